@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Compares evaluating compiled expressions with casadi's virtual machine to evaluating them as generated and compiled
+C code, see casadi_wrapper.compile_function.
+Builds a whole body controller for the PR2, which moves both grippers to a goal pose, and measures the time to create
+it and the time per evaluation of its big_ass_M and of the forward kinematics of the grippers.
+The generated libraries are cached in a temporary folder, such that the first compilation is measured.
+
+usage: benchmark_codegen.py [--urdf test/urdfs/pr2_with_base.urdf] [--backends vm gcc] [--ticks 1000]
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import tempfile
+from collections import OrderedDict
+from time import time
+
+import numpy as np
+
+from giskardpy import cas_wrapper as w
+from giskardpy.data_types import JointConstraint, SoftConstraint
+from giskardpy.qp_problem_builder import QProblemBuilder
+from giskardpy.robot import Robot
+
+default_urdf = os.path.join(os.path.dirname(os.path.abspath(__file__)), u'..', u'test', u'urdfs',
+                            u'pr2_with_base.urdf')
+
+
+def make_controller_constraints(robot, root, tips):
+    """
+    :return: joint constraints, soft constraints and joint symbols of a controller that moves tips to a goal pose,
+             which is given by symbols
+    :rtype: tuple
+    """
+    joint_constraints = OrderedDict()
+    joint_symbols = []
+    for joint_name in robot.controlled_joints:
+        joint_symbol = robot.get_joint_position_symbol(joint_name)
+        joint_symbols.append(joint_symbol)
+        velocity_limit = w.Symbol(u'velocity_limit')
+        if robot.is_joint_continuous(joint_name):
+            lower, upper = -velocity_limit, velocity_limit
+        else:
+            lower_limit, upper_limit = robot.get_joint_limits(joint_name)
+            lower = w.Max(-velocity_limit, lower_limit - joint_symbol)
+            upper = w.Min(velocity_limit, upper_limit - joint_symbol)
+        joint_constraints[joint_name] = JointConstraint(lower, upper, w.Symbol(u'joint_weight'), 0)
+    soft_constraints = OrderedDict()
+    for tip in tips:
+        fk = robot.get_fk_expression(root, tip)
+        position = w.position_of(fk)
+        axis, angle = w.axis_angle_from_matrix(w.rotation_of(fk))
+        for i, expression in enumerate([position[0], position[1], position[2],
+                                        axis[0] * angle, axis[1] * angle, axis[2] * angle]):
+            name = u'{}/{}'.format(tip, i)
+            error = w.Symbol(u'goal_{}_{}'.format(tip, i)) - expression
+            soft_constraints[name] = SoftConstraint(error, error, w.Symbol(u'goal_weight'), expression, True,
+                                                    -1e9, 1e9, 0)
+    return joint_constraints, soft_constraints, joint_symbols
+
+
+def measure_evaluation(compiled_function, substitutions):
+    t = time()
+    for s in substitutions:
+        compiled_function.call2(s)
+    return (time() - t) / len(substitutions)
+
+
+def benchmark(robot, root, tips, backend, ticks):
+    w.set_codegen_options(backend)
+    joint_constraints, soft_constraints, joint_symbols = make_controller_constraints(robot, root, tips)
+    t = time()
+    builder = QProblemBuilder(joint_constraints, OrderedDict(), soft_constraints, joint_symbols)
+    creation_time = time() - t
+    substitutions = np.random.random((ticks, len(builder.get_expr())))
+    controller_time = measure_evaluation(builder.compiled_big_ass_M, substitutions)
+    result = builder.compiled_big_ass_M.call2(substitutions[0]).copy()
+
+    fk_time = 0
+    for tip in tips:
+        fk = robot.get_fk_expression(root, tip)
+        compiled_fk = w.speed_up(fk, w.free_symbols(fk))
+        fk_time += measure_evaluation(compiled_fk, np.random.random((ticks, len(compiled_fk.str_params))))
+    return creation_time, controller_time, fk_time, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=u'Benchmarks the backends of casadi_wrapper.speed_up.')
+    parser.add_argument(u'--urdf', default=default_urdf)
+    parser.add_argument(u'--root', default=u'odom_combined')
+    parser.add_argument(u'--tips', nargs=u'+', default=[u'r_gripper_tool_frame', u'l_gripper_tool_frame'])
+    parser.add_argument(u'--backends', nargs=u'+', default=[u'vm', u'gcc'])
+    parser.add_argument(u'--ticks', type=int, default=1000)
+    args = parser.parse_args()
+
+    with open(args.urdf, u'r') as f:
+        robot = Robot(f.read())
+    w.set_codegen_options(folder=tempfile.mkdtemp(prefix=u'giskardpy_codegen_'))
+    print(u'{} controlled joints, tips: {}'.format(len(robot.controlled_joints), u', '.join(args.tips)))
+    print(u'{:>10} {:>12} {:>16} {:>12} {:>10}'.format(u'backend', u'create [s]', u'controller [us]', u'fk [us]',
+                                                       u'max diff'))
+    reference = None
+    for backend in args.backends:
+        np.random.seed(0)
+        creation_time, controller_time, fk_time, result = benchmark(robot, args.root, args.tips, backend,
+                                                                   args.ticks)
+        if reference is None:
+            reference = result
+        print(u'{:>10} {:>12.3f} {:>16.2f} {:>12.2f} {:>10.2e}'.format(backend, creation_time, controller_time * 1e6,
+                                                                      fk_time * 1e6,
+                                                                      np.abs(result - reference).max()))
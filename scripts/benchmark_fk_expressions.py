@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Compares the size of the symbolic graph and the compile time of forward kinematic expressions, which are built like
+for collision avoidance, with and without the fk expression cache of Robot.get_fk_expression.
+Without the cache, every expression multiplies the transformations along its chain again, with the cache, shared parts
+of the chains are only built once and the expressions share their subexpressions.
+The expressions of all fks are stacked into one function, like in the controller.
+
+usage: benchmark_fk_expressions.py [--urdf test/urdfs/pr2_with_base.urdf] [--root odom_combined] [--max_pairs 500]
+"""
+from __future__ import print_function
+
+import argparse
+import os
+from copy import deepcopy
+from itertools import combinations
+from time import time
+
+import casadi as ca
+
+from giskardpy import cas_wrapper as w
+from giskardpy.robot import Robot
+
+default_urdf = os.path.join(os.path.dirname(os.path.abspath(__file__)), u'..', u'test', u'urdfs',
+                            u'pr2_with_base.urdf')
+
+
+def uncached_fk_expression(robot, root_link, tip_link):
+    """
+    How Robot.get_fk_expression built expressions before the cache.
+    """
+    fk = w.eye(4)
+    root_chain, _, tip_chain = robot.get_split_chain(root_link, tip_link, links=False)
+    for joint_name in root_chain:
+        fk = w.dot(fk, w.inverse_frame(robot.get_joint_frame(joint_name)))
+    for joint_name in tip_chain:
+        fk = w.dot(fk, robot.get_joint_frame(joint_name))
+    return deepcopy(fk)
+
+
+def get_fk_pairs(robot, root, max_pairs):
+    """
+    :return: (root, link) for each link with collision, like external collision avoidance,
+             and pairs of links with collision, like self collision avoidance
+    :rtype: list
+    """
+    links = sorted(robot.get_link_names_with_collision())
+    pairs = [(root, link) for link in links]
+    pairs.extend(list(combinations(links, 2))[:max_pairs])
+    return pairs
+
+
+def measure(name, get_fk_expression, pairs):
+    t = time()
+    expressions = [get_fk_expression(root, tip) for root, tip in pairs]
+    build_time = time() - t
+    stacked = ca.vertcat(*expressions)
+    parameters = w.free_symbols(stacked)
+    function = ca.Function(u'fks', [w.Matrix(parameters)], [stacked])
+    t = time()
+    w.speed_up(stacked, parameters)
+    compile_time = time() - t
+    print(u'{:10} {:>10.3f} {:>12} {:>14} {:>12.3f}'.format(name, build_time, function.n_nodes(),
+                                                            function.n_instructions(), compile_time))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=u'Benchmarks the fk expression cache of Robot.')
+    parser.add_argument(u'--urdf', default=default_urdf)
+    parser.add_argument(u'--root', default=u'odom_combined')
+    parser.add_argument(u'--max_pairs', type=int, default=500, help=u'maximum number of self collision pairs')
+    args = parser.parse_args()
+
+    with open(args.urdf, u'r') as f:
+        urdf = f.read()
+    robot = Robot(urdf)
+    pairs = get_fk_pairs(robot, args.root, args.max_pairs)
+    print(u'{} fk expressions'.format(len(pairs)))
+    print(u'{:10} {:>10} {:>12} {:>14} {:>12}'.format(u'', u'build [s]', u'nodes', u'instructions', u'compile [s]'))
+    measure(u'uncached', lambda root, tip: uncached_fk_expression(robot, root, tip), pairs)
+    robot = Robot(urdf)
+    measure(u'cached', robot.get_fk_expression, pairs)
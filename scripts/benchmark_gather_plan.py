@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+Compares GodMap.get_values, which looks up every identifier from the root of the god map, with GodMap.fill_values,
+which fetches objects on shared prefixes of the identifiers only once per call, see god_map.GatherPlan, with and
+without GodMap.track_changes, which only fetches the joint states and closest points again.
+The god map is filled like during planning: a joint state per joint, the last joint state, goal parameters on
+rosparam and the closest points of each link, which are accessed through method calls.
+
+usage: benchmark_gather_plan.py [--joints 45] [--links 20] [--collisions 3] [--ticks 1000]
+"""
+from __future__ import print_function
+
+import argparse
+from time import time
+
+import numpy as np
+
+from giskardpy import identifier
+from giskardpy.data_types import SingleJointState
+from giskardpy.god_map import GodMap
+
+
+class ClosestPoint(object):
+    def __init__(self, distance):
+        self.distance = distance
+        self.position_on_a = [distance, 2 * distance, 3 * distance]
+
+    def get_contact_distance(self):
+        return self.distance
+
+    def get_position_on_a_in_a(self):
+        return self.position_on_a
+
+
+class Collisions(object):
+    """
+    Has the same interface as data_types.Collisions for the identifiers of the collision avoidance constraints.
+    """
+
+    def __init__(self, links, number_of_collisions):
+        self.external = {link: [ClosestPoint(np.random.random()) for _ in range(number_of_collisions)]
+                         for link in links}
+
+    def get_external_collisions(self, link):
+        return self.external[link]
+
+    def get_number_of_external_collisions(self, link):
+        return len(self.external[link])
+
+
+def make_god_map(num_joints, num_links, num_collisions):
+    """
+    :return: god map and the symbols of a controller
+    :rtype: tuple
+    """
+    god_map = GodMap()
+    joints = [u'joint{}'.format(i) for i in range(num_joints)]
+    links = [u'link{}'.format(i) for i in range(num_links)]
+    god_map.set_data([u'world'], {u'robot': {u'joint_state': {}}})
+    god_map.set_data(identifier.joint_states, {j: SingleJointState(j, np.random.random()) for j in joints})
+    god_map.set_data(identifier.last_joint_states, {j: SingleJointState(j, np.random.random()) for j in joints})
+    god_map.set_data(identifier.rosparam, {u'joint_weights': {j: 0.001 for j in joints},
+                                           u'joint_velocity_limit': {j: 1. for j in joints},
+                                           u'goal_params': {u'JointPositionList': {j: np.random.random()
+                                                                                   for j in joints}}})
+    god_map.set_data(identifier.closest_point, Collisions(links, num_collisions))
+    symbols = []
+    for j in joints:
+        symbols.append(god_map.to_symbol(identifier.joint_states + [j, u'position']))
+        symbols.append(god_map.to_symbol(identifier.last_joint_states + [j, u'velocity']))
+        symbols.append(god_map.to_symbol(identifier.rosparam + [u'joint_weights', j]))
+        symbols.append(god_map.to_symbol(identifier.rosparam + [u'joint_velocity_limit', j]))
+        symbols.append(god_map.to_symbol(identifier.rosparam + [u'goal_params', u'JointPositionList', j]))
+    for link in links:
+        symbols.append(god_map.to_symbol(identifier.closest_point + [u'get_number_of_external_collisions',
+                                                                      (link,)]))
+        for idx in range(num_collisions):
+            prefix = identifier.closest_point + [u'get_external_collisions', (link,), idx]
+            symbols.append(god_map.to_symbol(prefix + [u'get_contact_distance', tuple()]))
+            for i in range(3):
+                symbols.append(god_map.to_symbol(prefix + [u'get_position_on_a_in_a', tuple(), i]))
+    return god_map, [str(s) for s in symbols]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=u'Benchmarks GodMap.get_values against GodMap.fill_values.')
+    parser.add_argument(u'--joints', type=int, default=45)
+    parser.add_argument(u'--links', type=int, default=20)
+    parser.add_argument(u'--collisions', type=int, default=3)
+    parser.add_argument(u'--ticks', type=int, default=1000)
+    args = parser.parse_args()
+
+    np.random.seed(0)
+    god_map, str_params = make_god_map(args.joints, args.links, args.collisions)
+    plan = god_map.make_gather_plan(str_params)
+    out = np.zeros(len(plan))
+    print(u'{} symbols, {} identifier members, {} steps in gather plan'.format(
+        len(str_params), sum(len(x) for x in plan.identifiers), len(plan.steps)))
+
+    joint_states = god_map.get_data(identifier.joint_states)
+    last_joint_states = god_map.get_data(identifier.last_joint_states)
+
+    def tick():
+        # the joint states change every control step, the goal parameters and weights do not
+        god_map.set_data(identifier.last_joint_states, joint_states)
+        god_map.set_data(identifier.joint_states, last_joint_states)
+
+    expected = god_map.get_values(str_params)
+    t = time()
+    for _ in range(args.ticks):
+        tick()
+        god_map.get_values(str_params)
+    get_values_time = (time() - t) / args.ticks
+
+    god_map.fill_values(plan, out)
+    t = time()
+    for _ in range(args.ticks):
+        tick()
+        god_map.fill_values(plan, out)
+    fill_values_time = (time() - t) / args.ticks
+    fill_values_result = out.copy()
+
+    god_map.track_changes = True
+    god_map.fill_values(plan, out)
+    t = time()
+    for _ in range(args.ticks):
+        tick()
+        god_map.fill_values(plan, out)
+    track_changes_time = (time() - t) / args.ticks
+
+    expected = np.array(god_map.get_values(str_params), dtype=float)
+    print(u'{:>26} {:>10} {:>10}'.format(u'', u'time [us]', u'max diff'))
+    for name, duration, result in [(u'get_values', get_values_time, expected),
+                                   (u'fill_values', fill_values_time, fill_values_result),
+                                   (u'fill_values track_changes', track_changes_time, out)]:
+        print(u'{:>26} {:>10.2f} {:>10.2e}'.format(name, duration * 1e6, np.abs(result - expected).max()))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Measures time and memory allocations per control step of the qp assembly in QProblemBuilder,
+i.e. everything between evaluating big_ass_M and calling the qp solver.
+Compares the old path, which copies slices of big_ass_M and filters them with boolean masks,
+with the buffer reusing path used by QProblemBuilder.get_cmd.
+Allocations are only measured with python 3, because tracemalloc is required.
+
+usage: benchmark_qp_assembly.py [--joints 45] [--soft 80] [--ticks 1000] [--switch 100]
+"""
+from __future__ import print_function
+
+import argparse
+from collections import OrderedDict
+from time import time
+
+from giskardpy import cas_wrapper as w
+from giskardpy.data_types import JointConstraint, SoftConstraint
+from giskardpy.qp_problem_builder import QProblemBuilder
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def make_builder(num_joints, num_soft_constraints, chain_length=7):
+    """
+    Creates a qp problem similar to collision avoidance, where each soft constraint depends on a small chain of joints.
+    Each soft constraint has its own weight symbol, such that it can be turned off.
+    """
+    joints = [w.Symbol(u'joint{}'.format(i)) for i in range(num_joints)]
+    joint_constraints = OrderedDict()
+    for i, joint in enumerate(joints):
+        joint_constraints[u'joint{}'.format(i)] = JointConstraint(lower=-1, upper=1, weight=0.01, linear_weight=0)
+    soft_constraints = OrderedDict()
+    for i in range(num_soft_constraints):
+        chain = [joints[(i + k) % num_joints] for k in range(chain_length)]
+        expression = w.Sum(w.Matrix([w.sin(joint) for joint in chain]))
+        soft_constraints[u'soft{}'.format(i)] = SoftConstraint(lbA=-1, ubA=1,
+                                                               weight=w.Symbol(u'weight{}'.format(i)),
+                                                               expression=expression,
+                                                               goal_constraint=False,
+                                                               lower_slack_limit=-1e9,
+                                                               upper_slack_limit=1e9,
+                                                               linear_weight=0)
+    return QProblemBuilder(joint_constraints, OrderedDict(), soft_constraints, joints)
+
+
+def old_assembly(builder, np_big_ass_M):
+    np_H = builder.np_H.copy()
+    np_A = builder.np_A.copy()
+    np_lb = builder.np_lb.copy()
+    np_ub = builder.np_ub.copy()
+    np_g = builder.np_g.copy()
+    np_lbA = builder.np_lbA.copy()
+    np_ubA = builder.np_ubA.copy()
+    return builder.filter_zero_weight_constraints(np_H, np_A, np_lb, np_ub, np_lbA, np_ubA, np_g)
+
+
+def new_assembly(builder, np_big_ass_M):
+    return builder.filter_zero_weight_constraints_inplace()
+
+
+def measure(name, f, builder, substitutions, ticks, switch):
+    np_big_ass_M = builder.compiled_big_ass_M.call2(substitutions[0])
+    f(builder, np_big_ass_M)
+    duration = 0
+    if tracemalloc is not None:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+    allocated = 0
+    for i in range(ticks):
+        np_big_ass_M = builder.compiled_big_ass_M.call2(substitutions[(i // switch) % len(substitutions)])
+        if tracemalloc is not None:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        t = time()
+        f(builder, np_big_ass_M)
+        duration += time() - t
+        if tracemalloc is not None:
+            allocated += tracemalloc.get_traced_memory()[1] - before
+    if tracemalloc is not None:
+        tracemalloc.stop()
+        print(u'{:10} {:10.4f}ms per tick, {:10.1f}kB peak allocations per tick'.format(name,
+                                                                                      duration / ticks * 1000,
+                                                                                      allocated / ticks / 1024.))
+    else:
+        print(u'{:10} {:10.4f}ms per tick'.format(name, duration / ticks * 1000))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=u'Benchmarks the qp assembly of QProblemBuilder.')
+    parser.add_argument(u'--joints', type=int, default=45)
+    parser.add_argument(u'--soft', type=int, default=80)
+    parser.add_argument(u'--ticks', type=int, default=1000)
+    parser.add_argument(u'--switch', type=int, default=100,
+                        help=u'number of ticks after which another set of soft constraints gets turned off')
+    args = parser.parse_args()
+
+    builder = make_builder(args.joints, args.soft)
+    str_params = builder.get_expr()
+    substitutions = []
+    for i in range(10):
+        values = {u'weight{}'.format(k): float((k + i) % 4 != 0) for k in range(args.soft)}
+        substitutions.append([values.get(p, 0.1) for p in str_params])
+    print(u'{} joints, {} soft constraints'.format(args.joints, args.soft))
+    measure(u'old', old_assembly, builder, substitutions, args.ticks, args.switch)
+    measure(u'buffered', new_assembly, builder, substitutions, args.ticks, args.switch)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Compares dense and sparse qp solver backends on recorded qp problems.
+Each problem has to be stored as .npz file containing the already filtered arrays H, g, A, lb, ub, lbA and ubA,
+e.g. np.savez(path, H=H, g=g, A=A, lb=lb, ub=ub, lbA=lbA, ubA=ubA) inside of QProblemBuilder.get_cmd.
+H can be the full weight matrix or only its diagonal.
+
+usage: benchmark_qp_solvers.py pr2_problems/*.npz boxy_problems/*.npz [--solvers qpoases osqp] [--repeat 20]
+"""
+from __future__ import print_function
+
+import argparse
+from time import time
+
+import numpy as np
+from scipy import sparse
+
+from giskardpy.qp_solver import get_qp_solver
+
+
+def load_problem(path):
+    data = np.load(path)
+    H = data[u'H']
+    if H.ndim == 2:
+        H = H.diagonal().copy()
+    return H, data[u'g'], data[u'A'], data[u'lb'], data[u'ub'], data[u'lbA'], data[u'ubA']
+
+
+def solve(solver, H, g, A, lb, ub, lbA, ubA):
+    if solver.sparse:
+        A = sparse.csc_matrix(A)
+    return solver.solve(H, g, A, lb.copy(), ub.copy(), lbA.copy(), ubA.copy())
+
+
+def benchmark(solver_name, problem, repeat):
+    """
+    :return: average time of a cold start, average time of a warm start, solution
+    """
+    t = time()
+    for i in range(repeat):
+        x = solve(get_qp_solver(solver_name), *problem).copy()
+    cold = (time() - t) / repeat
+    solver = get_qp_solver(solver_name)
+    solve(solver, *problem)
+    t = time()
+    for i in range(repeat):
+        solve(solver, *problem)
+    warm = (time() - t) / repeat
+    return cold, warm, x
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=u'Compares qp solver backends on recorded qp problems.')
+    parser.add_argument(u'problems', nargs=u'+', help=u'.npz files containing H, g, A, lb, ub, lbA, ubA')
+    parser.add_argument(u'--solvers', nargs=u'+', default=[u'qpoases', u'osqp'])
+    parser.add_argument(u'--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(u'{:40} {:>10} {:>8} {:>8} {:>12} {:>12} {:>10}'.format(u'problem', u'solver', u'rows', u'cols',
+                                                                   u'cold [ms]', u'warm [ms]', u'max diff'))
+    for path in args.problems:
+        problem = load_problem(path)
+        A = problem[2]
+        reference = None
+        for solver_name in args.solvers:
+            cold, warm, x = benchmark(solver_name, problem, args.repeat)
+            if reference is None:
+                reference = x
+            print(u'{:40} {:>10} {:>8} {:>8} {:>12.3f} {:>12.3f} {:>10.2e}'.format(path[-40:], solver_name,
+                                                                                 A.shape[0], A.shape[1],
+                                                                                 cold * 1000, warm * 1000,
+                                                                                 np.abs(reference - x).max()))
+        print(u'density of A: {:.2%}'.format(np.count_nonzero(A) / float(A.size)))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Solves qp problems that were recorded with the QPRecorder plugin again, without a running giskard.
+Prints the time per solve of each solver, the number of failures and the largest difference to the recorded solution.
+Enable the recorder in the config file with plugins/QPRecorder/enabled, the recordings are stored in
+path_to_data_folder/qp_recordings.
+
+usage: replay_qp_problems.py data/qp_recordings/* [--solvers qpoases osqp] [--cold]
+"""
+from __future__ import print_function
+
+import argparse
+from time import time
+
+import numpy as np
+from scipy import sparse
+
+from giskardpy.exceptions import QPSolverException
+from giskardpy.qp_recorder import load_recording, filter_recorded_problem
+from giskardpy.qp_solver import get_qp_solver
+
+
+def replay(path, solver_name, cold):
+    """
+    :param cold: if True, a new solver is used for every control cycle
+    :return: number of cycles, number of failures, total solve time, max difference to the recorded solution
+    """
+    meta, cycles = load_recording(path)
+    qp_solver = get_qp_solver(solver_name)
+    number_of_cycles = 0
+    failures = 0
+    duration = 0
+    max_diff = 0
+    for cycle in cycles:
+        number_of_cycles += 1
+        if cold:
+            qp_solver = get_qp_solver(solver_name)
+        H, g, A, lb, ub, lbA, ubA = filter_recorded_problem(cycle)
+        if qp_solver.sparse:
+            A = sparse.csc_matrix(A)
+        t = time()
+        try:
+            xdot_full = qp_solver.solve(H, g, A, lb, ub, lbA, ubA)
+        except QPSolverException:
+            failures += 1
+            continue
+        finally:
+            duration += time() - t
+        max_diff = max(max_diff, np.abs(xdot_full - cycle[u'xdot_full'][cycle[u'b_mask']]).max())
+    return number_of_cycles, failures, duration, max_diff
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=u'Solves recorded qp problems again.')
+    parser.add_argument(u'recordings', nargs=u'+', help=u'folders created by the QPRecorder plugin')
+    parser.add_argument(u'--solvers', nargs=u'+', default=[u'qpoases'])
+    parser.add_argument(u'--cold', action=u'store_true', help=u'use a new solver for every control cycle')
+    args = parser.parse_args()
+
+    print(u'{:40} {:>10} {:>8} {:>8} {:>12} {:>10}'.format(u'recording', u'solver', u'cycles', u'failed',
+                                                          u'solve [ms]', u'max diff'))
+    for path in args.recordings:
+        for solver_name in args.solvers:
+            number_of_cycles, failures, duration, max_diff = replay(path, solver_name, args.cold)
+            print(u'{:40} {:>10} {:>8} {:>8} {:>12.3f} {:>10.2e}'.format(path[-40:], solver_name, number_of_cycles,
+                                                                         failures,
+                                                                         duration / max(number_of_cycles, 1) * 1000,
+                                                                         max_diff))
@@ -0,0 +1,167 @@
+from collections import namedtuple
+from time import time
+
+import numpy as np
+
+import giskardpy.identifier as identifier
+from giskardpy import logging
+from giskardpy.exceptions import QPSolverException
+from giskardpy.qp_solver import get_qp_solver
+from giskardpy.utils import make_filter_b_mask
+
+ReachabilityResult = namedtuple(u'ReachabilityResult', [u'reachable', u'residual', u'iterations'])
+
+
+class BatchReachabilityCheck(object):
+    """
+    Checks the reachability of many candidate goals at once, e.g. to select grasp or placement poses.
+    Instead of running the behavior tree once per candidate, the compiled controller is evaluated for all candidates
+    together and their joint states are integrated in one loop.
+    All candidates have to use the same constraints and may only differ in the values of their god map entries,
+    e.g. in their goal poses.
+    """
+
+    def __init__(self, god_map, controller, thresholds, reachability_threshold=0.001, max_iterations=200,
+                 nWSR=None):
+        """
+        :type god_map: giskardpy.god_map.GodMap
+        :param controller: compiled controller of the goal
+        :type controller: giskardpy.symengine_controller.InstantaneousController
+        :param thresholds: a candidate has converged, when the commands of all controlled joints are below these
+                           values, see plugin_goal_reached.make_velocity_threshold
+        :type thresholds: np.ndarray
+        :param reachability_threshold: a candidate is reachable, if the slack of all goal constraints is below this
+                                       value after convergence
+        :type reachability_threshold: float
+        :param max_iterations: candidates that have not converged after this many control cycles are unreachable
+        :type max_iterations: int
+        :type nWSR: int
+        """
+        self.god_map = god_map
+        self.controller = controller
+        self.qp_problem_builder = controller.qp_problem_builder
+        self.thresholds = thresholds
+        self.reachability_threshold = reachability_threshold
+        self.max_iterations = max_iterations
+        self.nWSR = nWSR
+        self.str_params = self.controller.get_expr()
+        self.param_index = {str_param: i for i, str_param in enumerate(self.str_params)}
+
+        self.sample_period = god_map.get_data(identifier.sample_period)
+
+        self.controlled_joints = list(controller.joint_to_symbols_str.keys())
+        self.joint_params = []
+        self.joint_columns = []
+        self.velocity_params = []
+        self.velocity_columns = []
+        for i, (joint_name, joint_symbol) in enumerate(controller.joint_to_symbols_str.items()):
+            if str(joint_symbol) in self.param_index:
+                self.joint_params.append(i)
+                self.joint_columns.append(self.param_index[str(joint_symbol)])
+            velocity_symbol = controller.robot.get_joint_velocity_symbol(joint_name)
+            if str(velocity_symbol) in self.param_index:
+                self.velocity_params.append(i)
+                self.velocity_columns.append(self.param_index[str(velocity_symbol)])
+        num_joint_constraints = self.qp_problem_builder.num_joint_constraints
+        self.goal_constraints = np.array([num_joint_constraints + i for i, constraint in
+                                          enumerate(self.qp_problem_builder.soft_constraints_dict.values())
+                                          if constraint.goal_constraint], dtype=int)
+
+    def get_substitutions(self, candidates):
+        """
+        :param candidates: one dict per candidate, which maps god map identifiers to the value of the candidate,
+                           all other values are taken from the god map
+        :type candidates: list
+        :return: one row of substitutions per candidate
+        :rtype: np.ndarray
+        """
+        substitutions = np.tile(np.array(self.god_map.get_values(self.str_params), dtype=float), (len(candidates), 1))
+        for i, candidate in enumerate(candidates):
+            for key, value in candidate.items():
+                str_param = str(self.god_map.to_symbol(key))
+                if str_param in self.param_index:
+                    substitutions[i, self.param_index[str_param]] = value
+        return substitutions
+
+    def solve(self, qp_solver, np_big_ass_M):
+        """
+        :return: solution of the qp problem, with 0 for filtered constraints
+        :rtype: np.ndarray
+        """
+        builder = self.qp_problem_builder
+        H, A, lb, ub, lbA, ubA, g = builder.split_big_ass_M(np_big_ass_M)
+        b_mask = make_filter_b_mask(H)
+        if qp_solver.sparse:
+            H, A, lb, ub, lbA, ubA, g = builder.filter_zero_weight_constraints_sparse(H, A, lb, ub, lbA, ubA, g)
+        else:
+            H, A, lb, ub, lbA, ubA, g = builder.filter_zero_weight_constraints(H, A, lb, ub, lbA, ubA, g)
+        xdot_full = np.zeros(len(b_mask))
+        xdot_full[b_mask] = qp_solver.solve(H, g, A, lb, ub, lbA, ubA, self.nWSR)
+        return xdot_full
+
+    def integrate(self, substitutions, xdot_full):
+        """
+        Applies the commands of one control cycle to the joint states of a candidate, just like KinSimPlugin.
+        :param substitutions: row of the candidate, gets changed in place
+        :type substitutions: np.ndarray
+        :param xdot_full: solution of the qp problem of the candidate
+        :type xdot_full: np.ndarray
+        """
+        # commands are position deltas
+        substitutions[self.joint_columns] += xdot_full[self.joint_params]
+        substitutions[self.velocity_columns] = xdot_full[self.velocity_params] / self.sample_period
+
+    def check(self, candidates):
+        """
+        :param candidates: see get_substitutions
+        :type candidates: list
+        :return: one ReachabilityResult per candidate,
+                 residual is the largest slack of a goal constraint in the last control cycle
+        :rtype: list
+        """
+        return self.check_substitutions(self.get_substitutions(candidates))
+
+    def check_substitutions(self, substitutions):
+        """
+        :param substitutions: one row of values of the symbols of the controller per candidate, in the order of
+                              InstantaneousController.get_expr, gets changed in place
+        :type substitutions: np.ndarray
+        :return: see check
+        :rtype: list
+        """
+        t = time()
+        n = len(substitutions)
+        time_column = self.param_index.get(str(self.god_map.to_symbol(identifier.time)))
+        qp_solvers = [get_qp_solver(self.controller.qp_solver_name) for _ in range(n)]
+        num_joints = len(self.controlled_joints)
+        running = np.ones(n, dtype=bool)
+        failed = np.zeros(n, dtype=bool)
+        residuals = np.full(n, np.inf)
+        iterations = np.zeros(n, dtype=int)
+        for iteration in range(self.max_iterations):
+            active = np.where(running)[0]
+            if len(active) == 0:
+                break
+            if time_column is not None:
+                # the tree starts the time of a goal at 1, see CleanUp
+                substitutions[active, time_column] = iteration + 1
+            big_ass_Ms = self.qp_problem_builder.compiled_big_ass_M.call_batch(substitutions[active])
+            for np_big_ass_M, i in zip(big_ass_Ms, active):
+                try:
+                    xdot_full = self.solve(qp_solvers[i], np_big_ass_M)
+                except QPSolverException:
+                    running[i] = False
+                    failed[i] = True
+                    continue
+                iterations[i] = iteration + 1
+                self.integrate(substitutions[i], xdot_full)
+                if len(self.goal_constraints) > 0:
+                    residuals[i] = np.abs(xdot_full[self.goal_constraints]).max()
+                else:
+                    residuals[i] = 0
+                if np.all(np.abs(xdot_full[:num_joints]) < self.thresholds):
+                    running[i] = False
+        reachable = ~running & ~failed & (residuals <= self.reachability_threshold)
+        logging.loginfo(u'checked reachability of {} candidates in {:.3f}s; {} are reachable'.format(
+            n, time() - t, reachable.sum()))
+        return [ReachabilityResult(bool(reachable[i]), residuals[i], iterations[i]) for i in range(n)]
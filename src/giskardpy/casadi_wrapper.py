@@ -1,5 +1,10 @@
+import hashlib
+import multiprocessing
 import os
 import pickle
+import subprocess
+import tempfile
+from time import time
 
 import casadi as ca
 import errno
@@ -9,8 +14,30 @@ from numpy import pi
 
 from giskardpy import logging
 
+try:
+    from shutil import which
+except ImportError:
+    from distutils.spawn import find_executable as which
+
 pathSeparator = '_'
 
+# default backend of speed_up, u'vm' evaluates functions with the virtual machine of casadi,
+# the name of a C compiler, e.g. u'gcc' or u'clang', compiles them into shared libraries
+codegen_backend = u'vm'
+# compiled shared libraries are cached in this folder under the hash of their code
+codegen_folder = os.path.join(tempfile.gettempdir(), u'giskardpy_codegen')
+# big functions take very long to compile with higher optimization levels, without being much faster
+codegen_flags = [u'-O1', u'-fPIC', u'-shared']
+# backends that are not available, such that the warning is only printed once
+unavailable_backends = set()
+
+# number of processes used by parallel_jacobian, 0 uses one per cpu, 1 disables it
+jacobian_processes = 1
+# the expressions are only split between processes, if each one gets at least this many
+min_expressions_per_process = 10
+# created on first use and then reused, because starting processes is expensive
+jacobian_pool = None
+
 # VERY_SMALL_NUMBER = 2.22507385851e-308
 VERY_SMALL_NUMBER = 1e-100
 SMALL_NUMBER = 1e-10
@@ -30,6 +57,82 @@ def jacobian(expressions, symbols):
     return ca.jacobian(expressions, Matrix(symbols))
 
 
+def set_jacobian_options(processes=None, min_expressions=None):
+    """
+    :param processes: see jacobian_processes
+    :type processes: int
+    :param min_expressions: see min_expressions_per_process
+    :type min_expressions: int
+    """
+    global jacobian_processes, min_expressions_per_process, jacobian_pool
+    if processes is not None and processes != jacobian_processes:
+        jacobian_processes = processes
+        if jacobian_pool is not None:
+            jacobian_pool.terminate()
+            jacobian_pool = None
+    if min_expressions is not None:
+        min_expressions_per_process = min_expressions
+
+
+def get_jacobian_pool():
+    global jacobian_pool
+    if jacobian_pool is None:
+        jacobian_pool = multiprocessing.Pool(jacobian_processes or None)
+    return jacobian_pool
+
+
+def jacobian_of_serialized_function(serialized_function):
+    """
+    Runs in the processes of parallel_jacobian.
+    :param serialized_function: function of the symbols to derive by and the other symbols of the expressions
+    :type serialized_function: str
+    :return: serialized function of the same inputs, that returns the jacobian, time needed for the jacobian
+    :rtype: tuple
+    """
+    f = ca.Function.deserialize(serialized_function)
+    t = time()
+    inputs = f.sx_in()
+    jac = ca.jacobian(f.call(inputs)[0], inputs[0])
+    jacobian_time = time() - t
+    return ca.Function('jacobian', inputs, [jac]).serialize(), jacobian_time
+
+
+def parallel_jacobian(expressions, symbols):
+    """
+    Same as jacobian, but groups of consecutive rows are computed in a process pool, see jacobian_processes.
+    Expressions can't be send to other processes directly, because their symbols would be different objects after
+    deserialization. Therefore each group is wrapped into a function, whose jacobian function gets send back and
+    called with the original symbols.
+    :type expressions: Matrix
+    :param symbols: symbols to derive by
+    :type symbols: list
+    :return: jacobian, time the jacobians of all groups took in the other processes, number of groups
+    :rtype: tuple
+    """
+    processes = jacobian_processes or multiprocessing.cpu_count()
+    number_of_groups = min(processes, expressions.shape[0] // max(min_expressions_per_process, 1))
+    if number_of_groups <= 1:
+        t = time()
+        result = jacobian(expressions, symbols)
+        return result, time() - t, 1
+    symbols = Matrix(symbols)
+    symbol_names = set(str(x) for x in free_symbols(symbols))
+    group_size = int(np.ceil(expressions.shape[0] / float(number_of_groups)))
+    groups = []
+    for start in range(0, expressions.shape[0], group_size):
+        group = expressions[start:start + group_size, :]
+        other_symbols = [x for x in free_symbols(group) if str(x) not in symbol_names]
+        other_symbols = ca.vertcat(*other_symbols) if other_symbols else ca.SX(0, 1)
+        groups.append((group, other_symbols))
+    results = get_jacobian_pool().map(jacobian_of_serialized_function,
+                                      [ca.Function('f', [symbols, other_symbols], [group]).serialize()
+                                       for group, other_symbols in groups])
+    jacobians = []
+    for (group, other_symbols), (serialized_jacobian, _) in zip(groups, results):
+        jacobians.append(ca.Function.deserialize(serialized_jacobian)(symbols, other_symbols))
+    return ca.vertcat(*jacobians), sum(jacobian_time for _, jacobian_time in results), len(groups)
+
+
 def equivalent(expression1, expression2):
     return ca.is_equal(ca.simplify(expression1), ca.simplify(expression2), 1)
 
@@ -38,6 +141,23 @@ def free_symbols(expression):
     return ca.symvar(expression)
 
 
+def number_of_nodes(expression):
+    """
+    :return: number of nodes of the symbolic graph of expression, shared subexpressions are counted once
+    :rtype: int
+    """
+    return ca.Function(u'f', free_symbols(expression), [expression]).n_nodes()
+
+
+def nonzero_indices(expression):
+    """
+    :return: row and column indices of the structural non zeros of expression
+    :rtype: tuple
+    """
+    rows, cols = expression.sparsity().get_triplet()
+    return np.array(rows, dtype=int), np.array(cols, dtype=int)
+
+
 def is_matrix(expression):
     return hasattr(expression, 'shape') and expression.shape[0] * expression.shape[1] > 1
 
@@ -216,12 +336,7 @@ def if_eq(a, b, if_result, else_result):
 
 
 def safe_compiled_function(f, file_name):
-    if not os.path.exists(os.path.dirname(file_name)):
-        try:
-            os.makedirs(os.path.dirname(file_name))
-        except OSError as exc:  # Guard against race condition
-            if exc.errno != errno.EEXIST:
-                raise
+    create_folder(os.path.dirname(file_name))
     with open(file_name, 'w') as file:
         pickle.dump(f, file)
         logging.loginfo(u'saved {}'.format(file_name))
@@ -238,14 +353,106 @@ def load_compiled_function(file_name):
             logging.logerr(u'{} deleted because it was corrupted'.format(file_name))
 
 
+def set_codegen_options(backend=None, folder=None):
+    """
+    :param backend: new default backend of speed_up, see codegen_backend
+    :type backend: str
+    :param folder: where the compiled shared libraries are cached
+    :type folder: str
+    """
+    global codegen_backend, codegen_folder
+    if backend is not None:
+        codegen_backend = backend
+    if folder is not None:
+        codegen_folder = folder
+
+
+def compile_function(f, backend):
+    """
+    Generates C code for f, compiles it with the compiler backend into a shared library and loads it.
+    The libraries are cached in codegen_folder, such that each function is compiled only once.
+    :type f: ca.Function
+    :param backend: u'vm' or the name of a C compiler
+    :type backend: str
+    :return: function with the same interface as f, f itself if backend is u'vm' or compilation is not possible
+    :rtype: ca.Function
+    """
+    if backend == u'vm' or backend in unavailable_backends:
+        return f
+    compiler = which(backend)
+    if compiler is None:
+        logging.logwarn(u'compiler \'{}\' not found, using casadi\'s virtual machine instead'.format(backend))
+        unavailable_backends.add(backend)
+        return f
+    generator = ca.CodeGenerator(f.name())
+    generator.add(f)
+    code = generator.dump()
+    code_hash = hashlib.md5((u' '.join([backend] + codegen_flags) + code).encode(u'utf-8')).hexdigest()
+    library = os.path.join(codegen_folder, u'{}.so'.format(code_hash))
+    if not os.path.isfile(library):
+        t = time()
+        create_folder(codegen_folder)
+        fd, c_file = tempfile.mkstemp(dir=codegen_folder, prefix=u'.tmp_', suffix=u'.c')
+        tmp_library = c_file[:-2] + u'.so'
+        try:
+            with os.fdopen(fd, u'w') as f_code:
+                f_code.write(code)
+            subprocess.check_call([compiler] + codegen_flags + [c_file, u'-o', tmp_library])
+            # renaming is atomic, other processes never load half written libraries
+            os.rename(tmp_library, library)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logging.logwarn(u'failed to compile function with {}: {}; using casadi\'s virtual machine instead'.format(
+                backend, e))
+            return f
+        finally:
+            for file_name in [c_file, tmp_library]:
+                if os.path.isfile(file_name):
+                    os.remove(file_name)
+        logging.loginfo(u'compiled function with {} {} entries in {:.5f}s'.format(backend, f.nnz_out(),
+                                                                                 time() - t))
+    return ca.external(f.name(), library)
+
+
+def create_folder(folder):
+    if not os.path.exists(folder):
+        try:
+            os.makedirs(folder)
+        except OSError as exc:  # Guard against race condition
+            if exc.errno != errno.EEXIST:
+                raise
+
+
 class CompiledFunction(object):
-    def __init__(self, str_params, fast_f, l, shape):
+    def __init__(self, str_params, fast_f, l, shape, backend=u'vm'):
+        """
+        :param fast_f: function that gets evaluated, or compiled first, depending on backend
+        :type fast_f: ca.Function
+        :param backend: see compile_function
+        :type backend: str
+        """
         self.str_params = str_params
         self.fast_f = fast_f
         self.shape = shape
-        self.buf, self.f_eval = fast_f.buffer()
+        self.backend = backend
+        self.eval_f = compile_function(fast_f, backend)
+        self.buf, self.f_eval = self.eval_f.buffer()
+        # input and output are bound to the buffer once, the parameter values can be written into self.args in place
+        self.args = np.zeros(len(str_params))
+        self.buf.set_arg(0, memoryview(self.args))
         self.out = np.zeros(self.shape, order='F')
         self.buf.set_res(0, memoryview(self.out))
+        self.batch_functions = {}
+
+    def __getstate__(self):
+        # the buffers point into numpy arrays and can't be pickled, they are recreated in __setstate__
+        return {u'str_params': self.str_params,
+                u'fast_f': self.fast_f.serialize(),
+                u'shape': self.shape,
+                u'backend': self.backend}
+
+    def __setstate__(self, state):
+        self.__init__(state[u'str_params'], ca.Function.deserialize(state[u'fast_f']), 0, state[u'shape'],
+                      state[u'backend'])
 
     def __call__(self, **kwargs):
         filtered_args = [kwargs[k] for k in self.str_params]
@@ -257,15 +464,162 @@ class CompiledFunction(object):
         :type filtered_args: list
         :return:
         """
+        self.args[:] = filtered_args
+        return self.evaluate()
 
-        filtered_args = np.array(filtered_args, dtype=float)
-        self.buf.set_arg(0, memoryview(filtered_args))
+    def evaluate(self):
+        """
+        Evaluates the function with the parameter values that are currently in self.args,
+        e.g. after GodMap.fill_values wrote them into it.
+        :rtype: np.ndarray
+        """
         self.f_eval()
         return self.out
 
+    def get_batch_function(self, n):
+        """
+        :return: fast_f mapped over n parameter vectors, they are cached, because creating them is expensive
+        :rtype: ca.Function
+        """
+        if n not in self.batch_functions:
+            self.batch_functions[n] = self.eval_f.map(n)
+        return self.batch_functions[n]
 
-def speed_up(function, parameters, backend=u'clang'):
+    def evaluate_batch(self, filtered_args):
+        """
+        :param filtered_args: one row of parameter values per evaluation
+        :type filtered_args: np.ndarray
+        :return: one column of flattened (column major) results per row of filtered_args
+        :rtype: np.ndarray
+        """
+        filtered_args = np.asarray(filtered_args, dtype=float)
+        f = self.get_batch_function(filtered_args.shape[0])
+        return np.array(f(filtered_args.T)).reshape(-1, filtered_args.shape[0], order='F')
+
+    def call_batch(self, filtered_args):
+        """
+        Evaluates the function for many parameter vectors at once.
+        :param filtered_args: one row of parameter values per evaluation, columns in the same order as in self.str_params
+        :type filtered_args: np.ndarray
+        :return: results stacked along the first axis, shape = (len(filtered_args),) + self.shape
+        :rtype: np.ndarray
+        """
+        n = len(filtered_args)
+        result = self.evaluate_batch(filtered_args)
+        return result.T.reshape(n, self.shape[1], self.shape[0]).transpose(0, 2, 1)
+
+
+class CompiledSplitFunction(CompiledFunction):
+    """
+    Only evaluates the entries of an expression that are not constant.
+    The constant entries are written into self.out once, the others get scattered into it after each evaluation.
+    """
+
+    def __init__(self, str_params, fast_f, template, indices, backend=u'vm'):
+        """
+        :param fast_f: function that returns the non constant entries as vector
+        :type fast_f: ca.Function
+        :param backend: see compile_function
+        :type backend: str
+        :param template: matrix containing the values of the constant entries
+        :type template: np.ndarray
+        :param indices: indices of the non constant entries in the column major flattened self.out
+        :type indices: np.ndarray
+        """
+        self.str_params = str_params
+        self.fast_f = fast_f
+        self.shape = template.shape
+        self.out = np.asfortranarray(template)
+        self.flat_out = self.out.reshape(-1, order='F')
+        self.indices = indices
+        self.out_nz = np.zeros(len(indices))
+        self.batch_functions = {}
+        self.backend = backend
+        if len(indices) > 0:
+            self.eval_f = compile_function(fast_f, backend)
+        else:
+            self.eval_f = fast_f
+        self.buf, self.f_eval = self.eval_f.buffer()
+        self.args = np.zeros(len(str_params))
+        self.buf.set_arg(0, memoryview(self.args))
+        if len(indices) > 0:
+            self.buf.set_res(0, memoryview(self.out_nz))
+        else:
+            self.f_eval = lambda: None
+
+    def __getstate__(self):
+        return {u'str_params': self.str_params,
+                u'fast_f': self.fast_f.serialize(),
+                u'template': self.out,
+                u'indices': self.indices,
+                u'backend': self.backend}
+
+    def __setstate__(self, state):
+        self.__init__(state[u'str_params'], ca.Function.deserialize(state[u'fast_f']), state[u'template'],
+                      state[u'indices'], state[u'backend'])
+
+    def call2(self, filtered_args):
+        """
+        :param filtered_args: parameter values in the same order as in self.str_params
+        :type filtered_args: list
+        :return:
+        """
+        self.args[:] = filtered_args
+        return self.evaluate()
+
+    def evaluate(self):
+        self.f_eval()
+        self.flat_out[self.indices] = self.out_nz
+        return self.out
+
+    def call_batch(self, filtered_args):
+        n = len(filtered_args)
+        flat_out = np.tile(self.flat_out, (n, 1))
+        if len(self.indices) > 0:
+            flat_out[:, self.indices] = self.evaluate_batch(filtered_args).T
+        return flat_out.reshape(n, self.shape[1], self.shape[0]).transpose(0, 2, 1)
+
+
+def split_constants(function):
+    """
+    :type function: Matrix
+    :return: matrix with the values of all constant entries and 0 elsewhere,
+             column major indices of the non constant entries,
+             vector expression of the non constant entries
+    :rtype: tuple
+    """
+    template = np.zeros(function.shape, order='F')
+    rows, cols = function.sparsity().get_triplet()
+    indices = []
+    varying = []
+    for row, col, entry in zip(rows, cols, function.nonzeros()):
+        if entry.is_constant():
+            template[row, col] = float(entry)
+        else:
+            indices.append(row + col * function.shape[0])
+            varying.append(entry)
+    if varying:
+        varying = ca.vertcat(*varying)
+    else:
+        varying = ca.SX(0, 1)
+    return template, np.array(indices, dtype=int), varying
+
+
+def speed_up(function, parameters, backend=None, split=False):
+    """
+    :param backend: u'vm' or the name of a C compiler, see compile_function, None uses codegen_backend
+    :type backend: str
+    :param split: if True, constant entries of function are evaluated only once, see CompiledSplitFunction
+    :type split: bool
+    :rtype: CompiledFunction
+    """
+    if backend is None:
+        backend = codegen_backend
     str_params = [str(x) for x in parameters]
+    if split:
+        template, indices, varying = split_constants(function)
+        f = ca.Function('f', [Matrix(parameters)], [varying])
+        return CompiledSplitFunction(str_params, f, template, indices, backend)
     try:
         f = ca.Function('f', [Matrix(parameters)], [ca.densify(function)])
     except:
@@ -273,7 +627,7 @@ def speed_up(function, parameters, backend=u'clang'):
         f = ca.Function('f', [Matrix(parameters)], ca.densify(function))
         # except:
         #     f = ca.Function('f', parameters, [ca.densify(function)])
-    return CompiledFunction(str_params, f, 0, function.shape)
+    return CompiledFunction(str_params, f, 0, function.shape, backend)
 
 
 def cross(u, v):
@@ -477,6 +831,14 @@ def eye(size):
     return ca.SX.eye(size)
 
 
+def horzcat(*matrices):
+    """
+    :return: the matrices next to each other
+    :rtype: Matrix
+    """
+    return ca.horzcat(*matrices)
+
+
 def inverse_frame(frame):
     """
     :param frame: 4x4 Matrix
@@ -0,0 +1,161 @@
+from collections import OrderedDict, namedtuple
+
+from giskardpy import cas_wrapper as w
+from giskardpy.utils import create_path
+
+ConstraintComplexity = namedtuple(u'ConstraintComplexity', [u'name', u'goal', u'nodes', u'free_symbols',
+                                                            u'jacobian_nonzeros', u'jacobian_density'])
+GoalComplexity = namedtuple(u'GoalComplexity', [u'name', u'type', u'soft_constraint_names', u'build_time'])
+BlockComplexity = namedtuple(u'BlockComplexity', [u'name', u'number_of_constraints', u'nodes', u'compile_time'])
+
+
+class ComplexityReport(object):
+    """
+    Collects the size of the symbolic expressions of each soft constraint and how long it took to build and compile
+    them, to find the goals that make creating or evaluating a controller slow.
+    GoalToConstraints adds the goals and QProblemBuilder the constraints and compiled blocks.
+    """
+    joint_and_hard_constraints = u'joint and hard constraints'
+    other_soft_constraints = u'other soft constraints'
+
+    def __init__(self):
+        self.goals = OrderedDict()
+        self.constraints = []
+        self.blocks = []
+        self.goal_of_constraint = {}
+
+    def add_goal(self, name, goal_type, soft_constraint_names, build_time):
+        """
+        :param name: name of the goal, e.g. str of the constraint object, also the name of its block
+        :type name: str
+        :param goal_type: e.g. the class name of the constraint
+        :type goal_type: str
+        :param soft_constraint_names: names of the soft constraints of the goal
+        :type soft_constraint_names: list
+        :param build_time: time it took to create the soft constraints in s
+        :type build_time: float
+        """
+        soft_constraint_names = list(soft_constraint_names)
+        if name in self.goals:
+            goal = self.goals[name]
+            soft_constraint_names = goal.soft_constraint_names + soft_constraint_names
+            build_time += goal.build_time
+        self.goals[name] = GoalComplexity(name, goal_type, soft_constraint_names, build_time)
+        for constraint_name in soft_constraint_names:
+            self.goal_of_constraint[constraint_name] = name
+
+    def get_goal_name(self, soft_constraint_names):
+        """
+        :return: name of the goal of the first soft constraint or name for a block without soft constraints
+        :rtype: str
+        """
+        if not soft_constraint_names:
+            return self.joint_and_hard_constraints
+        return self.goal_of_constraint.get(soft_constraint_names[0], self.other_soft_constraints)
+
+    def add_soft_constraints(self, soft_constraints, controlled_joints):
+        """
+        :param soft_constraints: name -> SoftConstraint
+        :type soft_constraints: dict
+        :param controlled_joints: joint symbols, the jacobian is computed with respect to them
+        :type controlled_joints: list
+        """
+        for name, constraint in soft_constraints.items():
+            expressions = w.Matrix([constraint.lbA, constraint.ubA, constraint.weight, constraint.expression,
+                                    constraint.lower_slack_limit, constraint.upper_slack_limit,
+                                    constraint.linear_weight])
+            jacobian = w.jacobian(w.Matrix([constraint.expression]), controlled_joints)
+            jacobian_nonzeros = len(w.nonzero_indices(jacobian)[0])
+            self.constraints.append(ConstraintComplexity(name, self.get_goal_name([name]),
+                                                         w.number_of_nodes(expressions),
+                                                         len(w.free_symbols(expressions)),
+                                                         jacobian_nonzeros,
+                                                         jacobian_nonzeros / float(max(len(controlled_joints), 1))))
+
+    def add_block(self, name, number_of_constraints, compile_time, nodes=None):
+        """
+        :param compile_time: in s, None if the block was taken from a cache
+        :type compile_time: float
+        :param nodes: number of nodes of the compiled function
+        :type nodes: int
+        """
+        self.blocks.append(BlockComplexity(name, number_of_constraints, nodes, compile_time))
+
+    def get_goal_table(self):
+        """
+        :return: one row (goal, type, number of constraints, nodes, build time, compile time) per goal,
+                 sorted by nodes, the compile time is None, if the block of the goal was cached and u'-', if the goal
+                 was not compiled as separate block
+        :rtype: list
+        """
+        nodes = OrderedDict()
+        for constraint in self.constraints:
+            nodes[constraint.goal] = nodes.get(constraint.goal, 0) + constraint.nodes
+        compile_times = {block.name: block.compile_time for block in self.blocks}
+        rows = []
+        for goal in self.goals.values():
+            rows.append((goal.name, goal.type, len(goal.soft_constraint_names), nodes.get(goal.name, 0),
+                         goal.build_time, compile_times.get(goal.name, u'-')))
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def to_table(self):
+        """
+        :return: the goals, constraints and blocks as tables, sorted by the number of nodes or compile time
+        :rtype: str
+        """
+        lines = [u'goals',
+                 u'{:60} {:30} {:>12} {:>10} {:>10} {:>12}'.format(u'name', u'type', u'constraints', u'nodes',
+                                                                   u'build [s]', u'compile [s]')]
+        for name, goal_type, number_of_constraints, nodes, build_time, compile_time in self.get_goal_table():
+            lines.append(u'{:60} {:30} {:>12} {:>10} {:>10.5f} {:>12}'.format(
+                name, goal_type, number_of_constraints, nodes, build_time, format_time(compile_time)))
+        lines.extend([u'',
+                      u'soft constraints',
+                      u'{:80} {:40} {:>8} {:>13} {:>12} {:>16}'.format(u'name', u'goal', u'nodes', u'free symbols',
+                                                                      u'jacobian nnz', u'jacobian density')])
+        for c in sorted(self.constraints, key=lambda c: c.nodes, reverse=True):
+            lines.append(u'{:80} {:40} {:>8} {:>13} {:>12} {:>16.3f}'.format(
+                str(c.name), c.goal, c.nodes, c.free_symbols, c.jacobian_nonzeros, c.jacobian_density))
+        lines.extend([u'',
+                      u'blocks',
+                      u'{:60} {:>12} {:>10} {:>12}'.format(u'name', u'constraints', u'nodes', u'compile [s]')])
+        for block in sorted(self.blocks, key=lambda b: b.compile_time or 0, reverse=True):
+            lines.append(u'{:60} {:>12} {:>10} {:>12}'.format(block.name, block.number_of_constraints,
+                                                              block.nodes if block.nodes is not None else u'-',
+                                                              format_time(block.compile_time)))
+        return u'\n'.join(lines) + u'\n'
+
+    def summary(self, number_of_rows=5):
+        """
+        :param number_of_rows: number of goals and constraints that are listed
+        :rtype: str
+        """
+        nodes = sum(c.nodes for c in self.constraints)
+        compile_time = sum(b.compile_time for b in self.blocks if b.compile_time is not None)
+        lines = [u'{} soft constraints with {} nodes in {} goals, compiled in {:.5f}s'.format(
+            len(self.constraints), nodes, len(self.goals), compile_time)]
+        for name, goal_type, number_of_constraints, goal_nodes, build_time, goal_compile_time in \
+                self.get_goal_table()[:number_of_rows]:
+            lines.append(u'  goal {}: {} constraints, {} nodes, build time {:.5f}s, compile time {}'.format(
+                name, number_of_constraints, goal_nodes, build_time, format_time(goal_compile_time, u's')))
+        for c in sorted(self.constraints, key=lambda c: c.nodes, reverse=True)[:number_of_rows]:
+            lines.append(u'  constraint {}: {} nodes, {} free symbols, jacobian density {:.3f}'.format(
+                c.name, c.nodes, c.free_symbols, c.jacobian_density))
+        return u'\n'.join(lines)
+
+    def save(self, file_name):
+        """
+        :param file_name: the folder gets created
+        :type file_name: str
+        """
+        create_path(file_name)
+        with open(file_name, u'w') as f:
+            f.write(self.to_table())
+
+
+def format_time(t, unit=u''):
+    if t is None:
+        return u'cached'
+    if isinstance(t, float):
+        return u'{:.5f}{}'.format(t, unit)
+    return t
@@ -0,0 +1,180 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from giskardpy.utils import LRUCache
+
+
+class ControllerBlock(object):
+    """
+    A compiled part of big_ass_M, that belongs to a group of constraints, e.g. the collision avoidance or one goal,
+    see QProblemBuilder.compile_block.
+    Its entries are stored in a local layout, which does not depend on the other constraints of the controller.
+    It has one row per constraint, first the joint constraints, then the hard and then the soft constraints,
+    and the columns A (one per controlled joint), lbA, ubA, weight, lb, ub and g.
+    Entries that don't exist for a type of constraint, e.g. A of joint constraints, are 0.
+    """
+
+    def __init__(self, compiled, num_joint_constraints, num_hard_constraints, num_soft_constraints, A_nonzeros):
+        """
+        :param compiled: the local matrix
+        :type compiled: giskardpy.casadi_wrapper.CompiledSplitFunction
+        :param A_nonzeros: rows and columns of the structural non zeros of the jacobian of the hard and soft
+                           constraints, rows start with the first hard constraint
+        :type A_nonzeros: tuple
+        """
+        self.compiled = compiled
+        self.num_joint_constraints = num_joint_constraints
+        self.num_hard_constraints = num_hard_constraints
+        self.num_soft_constraints = num_soft_constraints
+        self.A_nonzeros = A_nonzeros
+
+    def get_targets(self, joint_indices, hard_indices, soft_indices, h, s, j):
+        """
+        :param joint_indices: indices of the joint constraints of this block in the controller
+        :type joint_indices: list
+        :param hard_indices: indices of the hard constraints of this block in the controller
+        :type hard_indices: list
+        :param soft_indices: indices of the soft constraints of this block in the controller
+        :type soft_indices: list
+        :param h: number of hard constraints of the controller
+        :param s: number of soft constraints of the controller
+        :param j: number of joint constraints of the controller
+        :return: for each entry of the column major flattened local matrix,
+                 its index in the column major flattened big_ass_M or -1 if it is not used
+        :rtype: np.ndarray
+        """
+        rows = h + s + 4
+        targets = np.full(self.compiled.shape, -1, dtype=int)
+        weight_rows = np.arange(h + s, h + s + 4)
+        r = 0
+        for k in joint_indices:
+            targets[r, j + 2:] = weight_rows + k * rows
+            r += 1
+        for m in hard_indices:
+            targets[r, :j] = m + np.arange(j) * rows
+            targets[r, j:j + 2] = m + np.arange(j + s, j + s + 2) * rows
+            r += 1
+        for i in soft_indices:
+            targets[r, :j] = h + i + np.arange(j) * rows
+            targets[r, j:j + 2] = h + i + np.arange(j + s, j + s + 2) * rows
+            targets[r, j + 2:] = weight_rows + (j + i) * rows
+            r += 1
+        return targets.reshape(-1, order='F')
+
+
+class BlockedBigAssM(object):
+    """
+    Evaluates the blocks of a controller into one big_ass_M.
+    Has the same interface as CompiledSplitFunction, such that QProblemBuilder can use it instead.
+    """
+
+    def __init__(self, shape, template, parts):
+        """
+        :param shape: shape of big_ass_M
+        :type shape: tuple
+        :param template: big_ass_M with all constant entries
+        :type template: np.ndarray
+        :param parts: one tuple (ControllerBlock, indices of its local non constant entries in the flattened
+                      big_ass_M) per block
+        :type parts: list
+        """
+        self.shape = shape
+        self.out = np.asfortranarray(template)
+        self.flat_out = self.out.reshape(-1, order='F')
+        self.parts = parts
+        str_params = OrderedDict()
+        for block, _ in parts:
+            for str_param in block.compiled.str_params:
+                str_params.setdefault(str_param, len(str_params))
+        self.str_params = list(str_params.keys())
+        self.param_indices = [np.array([str_params[x] for x in block.compiled.str_params], dtype=int)
+                              for block, _ in parts]
+        # the parameter values of all blocks, see CompiledFunction.args
+        self.args = np.zeros(len(self.str_params))
+        if parts:
+            self.indices = np.concatenate([indices for _, indices in parts])
+        else:
+            self.indices = np.zeros(0, dtype=int)
+
+    @classmethod
+    def from_blocks(cls, blocks, h, s, j):
+        """
+        :param blocks: one tuple (ControllerBlock, joint indices, hard indices, soft indices) per block,
+                       see ControllerBlock.get_targets
+        :type blocks: list
+        :rtype: BlockedBigAssM
+        """
+        shape = (h + s + 4, j + s + 2)
+        template = np.zeros(shape, order='F')
+        flat_template = template.reshape(-1, order='F')
+        # identity of the slack variables
+        slack = np.arange(s)
+        flat_template[h + slack + (j + slack) * shape[0]] = 1
+        parts = []
+        for block, joint_indices, hard_indices, soft_indices in blocks:
+            targets = block.get_targets(joint_indices, hard_indices, soft_indices, h, s, j)
+            used = targets >= 0
+            flat_template[targets[used]] = block.compiled.flat_out[used]
+            parts.append((block, targets[block.compiled.indices]))
+        return cls(shape, template, parts)
+
+    def __getstate__(self):
+        return {u'shape': self.shape,
+                u'template': self.out,
+                u'parts': self.parts}
+
+    def __setstate__(self, state):
+        self.__init__(state[u'shape'], state[u'template'], state[u'parts'])
+
+    def call2(self, filtered_args):
+        """
+        :param filtered_args: parameter values in the same order as in self.str_params
+        :type filtered_args: list
+        :return: evaluated big_ass_M
+        :rtype: np.ndarray
+        """
+        self.args[:] = filtered_args
+        return self.evaluate()
+
+    def evaluate(self):
+        """
+        Evaluates all blocks with the parameter values that are currently in self.args.
+        :rtype: np.ndarray
+        """
+        for (block, indices), param_indices in zip(self.parts, self.param_indices):
+            compiled = block.compiled
+            np.take(self.args, param_indices, out=compiled.args)
+            compiled.f_eval()
+            self.flat_out[indices] = compiled.out_nz
+        return self.out
+
+    def call_batch(self, filtered_args):
+        """
+        :param filtered_args: one row of parameter values per evaluation
+        :type filtered_args: np.ndarray
+        :return: results stacked along the first axis
+        :rtype: np.ndarray
+        """
+        filtered_args = np.asarray(filtered_args, dtype=float)
+        n = len(filtered_args)
+        flat_out = np.tile(self.flat_out, (n, 1))
+        for (block, indices), param_indices in zip(self.parts, self.param_indices):
+            if len(indices) > 0:
+                flat_out[:, indices] = block.compiled.evaluate_batch(filtered_args[:, param_indices]).T
+        return flat_out.reshape(n, self.shape[1], self.shape[0]).transpose(0, 2, 1)
+
+
+class BlockCache(LRUCache):
+    """
+    Keeps the least recently used compiled ControllerBlocks in memory, such that a new goal only has to compile
+    the blocks of the constraints that changed.
+    Keys are tuples, values ControllerBlocks.
+    """
+
+    def __init__(self, max_size=100):
+        """
+        :param max_size: maximum number of blocks
+        :type max_size: int
+        """
+        super(BlockCache, self).__init__(max_size)
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from glob import glob
+
+import casadi as ca
+
+from giskardpy import logging
+
+CACHE_VERSION = 1
+# the compiled controllers depend on the code of these modules, not only on the constraint signature
+CODE_MODULES = [u'casadi_wrapper.py', u'constraints.py', u'controller_blocks.py', u'qp_problem_builder.py',
+                u'robot.py', u'symengine_controller.py']
+
+
+def get_code_hash():
+    """
+    :return: hash of the source code of CODE_MODULES, such that entries of other giskardpy versions are not used
+    :rtype: str
+    """
+    if get_code_hash.code_hash is None:
+        md5 = hashlib.md5()
+        folder = os.path.dirname(os.path.abspath(__file__))
+        for module in CODE_MODULES:
+            with open(os.path.join(folder, module), u'rb') as f:
+                md5.update(f.read())
+        get_code_hash.code_hash = md5.hexdigest()[:10]
+    return get_code_hash.code_hash
+
+
+get_code_hash.code_hash = None
+
+
+class ControllerCache(object):
+    """
+    Stores compiled controllers on disk, such that goals with the same constraints on the same robot don't have to be
+    compiled again, see QProblemBuilder.
+    An entry is a pickled dict, which is saved under the hash of the qp problem structure.
+    Entries are written into a temporary file first and then renamed, such that other processes never read half
+    written files. Entries of other versions of the file format, casadi or the giskardpy code are ignored.
+    When a folder gets bigger than max_size_in_mb, its least recently used entries are deleted.
+    """
+    suffix = u'.controller'
+
+    def __init__(self, max_size_in_mb=500):
+        """
+        :param max_size_in_mb: maximum size of all entries in one folder
+        :type max_size_in_mb: float
+        """
+        self.max_size = max_size_in_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+
+    def get_version_suffix(self):
+        return u'.v{}.{}{}'.format(CACHE_VERSION, get_code_hash(), self.suffix)
+
+    def get_file_name(self, path):
+        return path + self.get_version_suffix()
+
+    def load(self, path):
+        """
+        :param path: location of the entry without file ending
+        :type path: str
+        :return: the saved dict or None, if there is no valid entry
+        :rtype: dict
+        """
+        file_name = self.get_file_name(path)
+        if not os.path.isfile(file_name):
+            self.misses += 1
+            return None
+        try:
+            with open(file_name, u'rb') as f:
+                data = pickle.load(f)
+            if data.pop(u'casadi_version') != ca.__version__:
+                raise ValueError(u'saved with another casadi version')
+        except Exception as e:
+            logging.logwarn(u'failed to load {}: {}; deleting it'.format(file_name, e))
+            self.remove(file_name)
+            self.misses += 1
+            return None
+        # the modification time is used to find the least recently used entries
+        os.utime(file_name, None)
+        self.hits += 1
+        return data
+
+    def save(self, path, data):
+        """
+        :param path: location of the entry without file ending, the folder gets created
+        :type path: str
+        :param data: gets pickled
+        :type data: dict
+        """
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                # another process might have created it in the meantime
+                if not os.path.isdir(folder):
+                    raise
+        data = dict(data)
+        data[u'casadi_version'] = ca.__version__
+        fd, tmp_file_name = tempfile.mkstemp(dir=folder or None, prefix=u'.tmp_', suffix=self.suffix)
+        try:
+            with os.fdopen(fd, u'wb') as f:
+                pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_file_name, self.get_file_name(path))
+        except Exception as e:
+            logging.logwarn(u'failed to save {}: {}'.format(self.get_file_name(path), e))
+            self.remove(tmp_file_name)
+            return
+        self.evict(folder)
+
+    def evict(self, folder):
+        """
+        Deletes entries of outdated versions and the least recently used entries, until all entries in folder
+        together are smaller than max_size_in_mb.
+        """
+        current_suffix = self.get_version_suffix()
+        entries = []
+        for file_name in glob(os.path.join(folder, u'*' + self.suffix)):
+            if not file_name.endswith(current_suffix):
+                self.remove(file_name)
+                continue
+            try:
+                stat = os.stat(file_name)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file_name))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, file_name in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self.remove(file_name)
+            total_size -= size
+            logging.loginfo(u'deleted {} from controller cache'.format(file_name))
+
+    def remove(self, file_name):
+        try:
+            os.remove(file_name)
+        except OSError:
+            pass
@@ -4,6 +4,11 @@ import numpy as np
 from sortedcontainers import SortedKeyList
 from giskardpy.tfwrapper import kdl_to_np, np_vector, np_point
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 SoftConstraint = namedtuple(u'SoftConstraint', [u'lbA', u'ubA',
                                                 u'weight', u'expression', u'goal_constraint',
                                                 u'lower_slack_limit',
@@ -13,6 +18,18 @@ HardConstraint = namedtuple(u'HardConstraint', [u'lower', u'upper', u'expression
 JointConstraint = namedtuple(u'JointConstraint', [u'lower', u'upper', u'weight', u'linear_weight'])
 
 
+def constraint_to_str(name, constraint):
+    """
+    Used by the controller caches to identify constraints, because constraints with the same name can have other
+    expressions or constants, e.g. those of the reachability check or of a hard and a soft CartesianVelocityLimit.
+    :type name: str
+    :param constraint: JointConstraint, HardConstraint or SoftConstraint
+    :return: name and content of the constraint
+    :rtype: str
+    """
+    return u'{}: {}'.format(name, constraint)
+
+
 class SingleJointState(object):
     def __init__(self, name='', position=0.0, velocity=0.0, effort=0.0):
         self.name = name
@@ -24,6 +41,138 @@ class SingleJointState(object):
         return u'{}: {}, {}, {}'.format(self.name, self.position, self.velocity, self.effort)
 
 
+class JointStateView(object):
+    """
+    Has the interface of SingleJointState, but reads and writes the entries of one joint in the arrays of JointStates.
+    """
+
+    def __init__(self, joint_states, index, name):
+        """
+        :type joint_states: JointStates
+        :type index: int
+        :type name: str
+        """
+        self._joint_states = joint_states
+        self.index = index
+        self.name = name
+
+    @property
+    def position(self):
+        return self._joint_states.position[self.index]
+
+    @position.setter
+    def position(self, value):
+        self._joint_states.position[self.index] = value
+
+    @property
+    def velocity(self):
+        return self._joint_states.velocity[self.index]
+
+    @velocity.setter
+    def velocity(self, value):
+        self._joint_states.velocity[self.index] = value
+
+    @property
+    def effort(self):
+        return self._joint_states.effort[self.index]
+
+    @effort.setter
+    def effort(self, value):
+        self._joint_states.effort[self.index] = value
+
+    def __str__(self):
+        return u'{}: {}, {}, {}'.format(self.name, self.position, self.velocity, self.effort)
+
+
+class JointStates(Mapping):
+    """
+    Joint states of a robot, stored in one position, velocity and effort array, such that they can be updated with
+    vector operations.
+    It is a mapping joint name -> JointStateView, such that it can be used like a dict of SingleJointStates.
+    The names are fixed, copies share them.
+    """
+
+    def __init__(self, names, position=None, velocity=None, effort=None):
+        """
+        :type names: list
+        :param position: 0 if None
+        :type position: Union[np.ndarray, list]
+        :param velocity: 0 if None
+        :type velocity: Union[np.ndarray, list]
+        :param effort: 0 if None
+        :type effort: Union[np.ndarray, list]
+        """
+        if isinstance(names, OrderedDict):
+            self.name_to_index = names
+        else:
+            self.name_to_index = OrderedDict((name, i) for i, name in enumerate(names))
+        n = len(self.name_to_index)
+        self.position = np.zeros(n) if position is None else np.array(position, dtype=float)
+        self.velocity = np.zeros(n) if velocity is None else np.array(velocity, dtype=float)
+        self.effort = np.zeros(n) if effort is None else np.array(effort, dtype=float)
+        # views are only created for joints that are accessed
+        self._views = {}
+
+    @classmethod
+    def from_msg(cls, msg):
+        """
+        :param msg: missing velocities and efforts are 0
+        :type msg: sensor_msgs.msg.JointState
+        :rtype: JointStates
+        """
+        n = len(msg.name)
+        velocity = np.zeros(n)
+        velocity[:len(msg.velocity)] = msg.velocity
+        effort = np.zeros(n)
+        effort[:len(msg.effort)] = msg.effort
+        return cls(msg.name, msg.position, velocity, effort)
+
+    @classmethod
+    def from_dict(cls, joint_state_dict):
+        """
+        :param joint_state_dict: joint name -> SingleJointState
+        :type joint_state_dict: dict
+        :rtype: JointStates
+        """
+        values = joint_state_dict.values()
+        return cls(list(joint_state_dict.keys()),
+                   [x.position for x in values],
+                   [x.velocity for x in values],
+                   [x.effort for x in values])
+
+    def copy(self):
+        """
+        :return: joint states with the same names and copies of the arrays
+        :rtype: JointStates
+        """
+        return JointStates(self.name_to_index, self.position, self.velocity, self.effort)
+
+    def get_indices(self, joint_names):
+        """
+        :type joint_names: list
+        :return: index of each joint in the arrays
+        :rtype: np.ndarray
+        """
+        return np.array([self.name_to_index[name] for name in joint_names], dtype=int)
+
+    def __getitem__(self, joint_name):
+        try:
+            return self._views[joint_name]
+        except KeyError:
+            view = JointStateView(self, self.name_to_index[joint_name], joint_name)
+            self._views[joint_name] = view
+            return view
+
+    def __contains__(self, joint_name):
+        return joint_name in self.name_to_index
+
+    def __iter__(self):
+        return iter(self.name_to_index)
+
+    def __len__(self):
+        return len(self.name_to_index)
+
+
 class Trajectory(object):
     def __init__(self):
         self._points = OrderedDict()
@@ -13,7 +13,7 @@ from rospy import ROSException
 
 import giskardpy.identifier as identifier
 import giskardpy.pybullet_wrapper as pbw
-from giskardpy import logging
+from giskardpy import logging, cas_wrapper as w
 from giskardpy.god_map import GodMap
 from giskardpy.input_system import JointStatesInput
 from giskardpy.plugin import PluginBehavior
@@ -39,6 +39,7 @@ from giskardpy.plugin_set_cmd import SetCmd
 from giskardpy.plugin_time import TimePlugin
 from giskardpy.plugin_update_constraints import GoalToConstraints
 from giskardpy.plugin_visualization import VisualizationBehavior
+from giskardpy.prewarm import ControllerPrewarmer
 from giskardpy.pybullet_world import PyBulletWorld
 from giskardpy.tree_manager import TreeManager
 from giskardpy.utils import create_path, render_dot_tree, KeyDefaultDict
@@ -63,6 +64,20 @@ def initialize_god_map():
         nWSR = None
     god_map.set_data(identifier.nWSR, nWSR)
 
+    # fix time budget
+    time_budget = god_map.get_data(identifier.qp_solver_time_budget)
+    if time_budget == u'None':
+        time_budget = None
+    god_map.set_data(identifier.qp_solver_time_budget, time_budget)
+
+    god_map.track_changes = bool(god_map.get_data(identifier.enable_change_tracking))
+    god_map.set_concurrency(bool(god_map.get_data(identifier.enable_read_write_lock)),
+                            bool(god_map.get_data(identifier.enable_lock_statistics)))
+
+    w.set_codegen_options(god_map.get_data(identifier.codegen_backend), path_to_data_folder + u'codegen/')
+    w.set_jacobian_options(god_map.get_data(identifier.jacobian_processes),
+                           god_map.get_data(identifier.jacobian_min_constraints_per_process))
+
     pbw.start_pybullet(god_map.get_data(identifier.gui))
     while not rospy.is_shutdown():
         try:
@@ -249,4 +264,14 @@ def grow_tree():
     tree.setup(30)
     tree_m = TreeManager(tree)
     god_map.set_data(identifier.tree_manager, tree_m)
+    god_map.set_data(identifier.controller_prewarmer, None)
+    if god_map.get_data(identifier.enable_prewarm):
+        prewarmer = ControllerPrewarmer(god_map, action_server_name,
+                                        tree_m.get_node(u'planning III').get_plugins()[u'controller'])
+        if god_map.get_data(identifier.prewarm_block_startup):
+            prewarmer.run()
+        else:
+            # CleanUp stops it, when the first goal arrives
+            god_map.set_data(identifier.controller_prewarmer, prewarmer)
+            prewarmer.start()
     return tree
@@ -1,8 +1,14 @@
 import copy
+from bisect import bisect_left
+from collections import OrderedDict
 from copy import copy
 from multiprocessing import Lock
 
+import numpy as np
+
 from giskardpy import cas_wrapper as w
+from giskardpy.data_types import JointStates
+from giskardpy.god_map_lock import ReadWriteLock, LockStatistics, TimedLock
 
 
 def get_member(identifier, member):
@@ -180,6 +186,271 @@ def get_data(identifier, data, default_value=0.0):
     return result, shortcut
 
 
+# marks objects of a GatherPlan that could not be fetched
+MISSING = object()
+
+
+class JointStatesGather(object):
+    """
+    Fetches the leaves of a subtree of a GatherPlan of the form <joint name>/<position|velocity|effort> from the
+    arrays of JointStates with one index array per field, instead of one accessor per joint and field.
+    The indices are resolved once per set of joint names, copies of JointStates share them.
+    """
+    fields = (u'position', u'velocity', u'effort')
+
+    def __init__(self, leaves):
+        """
+        :param leaves: (joint name, field, index of the identifier) per leaf of the subtree
+        :type leaves: list
+        """
+        joint_names = OrderedDict((field, []) for field in self.fields)
+        out_indices = OrderedDict((field, []) for field in self.fields)
+        for joint_name, field, i in leaves:
+            joint_names[field].append(joint_name)
+            out_indices[field].append(i)
+        self.joint_names = [(field, names, np.array(out_indices[field], dtype=int))
+                            for field, names in joint_names.items() if names]
+        self.name_to_index = None
+        # (field, indices in its array, indices in the output, indices in the output of missing joints) per field
+        self.indices = []
+
+    @classmethod
+    def is_joint_states_subtree(cls, node):
+        """
+        :param node: node of the trie of GatherPlan
+        :type node: tuple
+        """
+        if node[1] or not node[0]:
+            return False
+        for joint_node in node[0].values():
+            if joint_node[1] or not joint_node[0]:
+                return False
+            for field, field_node in joint_node[0].items():
+                if field not in cls.fields or field_node[0]:
+                    return False
+        return True
+
+    def resolve(self, name_to_index):
+        self.name_to_index = name_to_index
+        self.indices = []
+        for field, names, out_indices in self.joint_names:
+            found = np.array([name in name_to_index for name in names], dtype=bool)
+            array_indices = np.array([name_to_index[name] for name in names if name in name_to_index], dtype=int)
+            self.indices.append((field, array_indices, out_indices[found], out_indices[~found].tolist()))
+
+    def fill(self, joint_states, out, slow_path, identifiers):
+        """
+        :type joint_states: JointStates
+        :type out: np.ndarray
+        :param slow_path: used for joints that are not in joint_states
+        :type slow_path: function
+        """
+        if joint_states.name_to_index is not self.name_to_index:
+            self.resolve(joint_states.name_to_index)
+        for field, array_indices, out_indices, missing in self.indices:
+            out[out_indices] = getattr(joint_states, field)[array_indices]
+            for i in missing:
+                out[i] = slow_path(identifiers[i])
+
+
+class GatherPlan(object):
+    """
+    Compiled list of identifiers, GodMap.fill_values uses it to write the values of symbols into an array.
+    The identifiers are merged into a trie, such that objects on a shared prefix, e.g. the joint state dict, are only
+    fetched once per call. The trie is stored as list of steps in depth first order, each step fetches one member
+    of the object of a previous step, such that the steps of a subtree are consecutive.
+    If the god map tracks changes, fill_changed only fetches the subtrees of the objects that were set since the last
+    call and of function calls, the other values of out are kept.
+    Subtrees of the form <joint name>/<position|velocity|effort> are read from fixed slots of the arrays, if their
+    object is JointStates, see JointStatesGather.
+    """
+
+    def __init__(self, identifiers, default_value=0.0):
+        """
+        :param identifiers: one identifier per symbol
+        :type identifiers: list
+        """
+        self.identifiers = identifiers
+        self.default_value = default_value
+        # node of the trie: (member -> child node, indices of the identifiers that end in it)
+        root = (OrderedDict(), [])
+        for i, identifier in enumerate(identifiers):
+            node = root
+            for member in identifier:
+                node = node[0].setdefault(member, (OrderedDict(), []))
+            node[1].append(i)
+        # slot 0 is the data of the god map, step i writes into slot i + 1
+        self.parents = []
+        self.members = []
+        # (slot, index in the output) per identifier, sorted by slot
+        self.leaves = []
+        # identifier prefix -> slot
+        self.slots = {}
+        # first slot after the subtree of each slot
+        self.subtree_ends = [None]
+        # subtrees of function calls, they are fetched in every call of fill_changed
+        self.volatile_subtrees = []
+        # slot -> JointStatesGather of the subtrees that might contain joint states
+        self.joint_states_gathers = {}
+        self.add_children(root, 0, (), False)
+        self.subtree_ends[0] = len(self.subtree_ends)
+        self.volatile_subtrees = self.merge_subtrees(self.volatile_subtrees)
+        self.leaf_slots = [slot for slot, _ in self.leaves]
+        # slot -> range of its leaves in self.leaves
+        self.joint_states_leaves = {slot: (bisect_left(self.leaf_slots, slot),
+                                           bisect_left(self.leaf_slots, self.subtree_ends[slot]))
+                                    for slot in self.joint_states_gathers}
+        self.objects = [None] * (len(self.parents) + 1)
+        self.cache_version = -1
+        # the god map version and output array of the last call, see GodMap.unsafe_fill_values
+        self.version = -1
+        self.out = None
+        self.reset()
+
+    def add_children(self, node, slot, prefix, volatile):
+        for member, child in node[0].items():
+            self.parents.append(slot)
+            self.members.append(member)
+            self.subtree_ends.append(None)
+            child_slot = len(self.parents)
+            child_prefix = prefix + (member,)
+            self.slots[child_prefix] = child_slot
+            self.leaves.extend((child_slot, i) for i in child[1])
+            child_volatile = volatile or isinstance(member, tuple)
+            if not child_volatile and JointStatesGather.is_joint_states_subtree(child):
+                self.joint_states_gathers[child_slot] = JointStatesGather(
+                    [(joint_name, field, i)
+                     for joint_name, joint_node in child[0].items()
+                     for field, field_node in joint_node[0].items()
+                     for i in field_node[1]])
+            self.add_children(child, child_slot, child_prefix, child_volatile)
+            self.subtree_ends[child_slot] = len(self.subtree_ends)
+            if child_volatile and not volatile:
+                self.volatile_subtrees.append((child_slot, self.subtree_ends[child_slot]))
+
+    def reset(self):
+        """
+        Creates new accessors, e.g. because the type of an object on the god map has changed.
+        """
+        self.steps = []
+        for slot, (parent, member) in enumerate(zip(self.parents, self.members), 1):
+            accessor = GetMemberLeaf(self.default_value)
+            accessor.member = member
+            self.steps.append((slot, parent, accessor))
+
+    def __len__(self):
+        return len(self.identifiers)
+
+    def fill(self, data, out, slow_path):
+        """
+        :param data: root object of the identifiers
+        :param out: gets the value of the i-th identifier at index i
+        :type out: np.ndarray
+        :param slow_path: used for identifiers whose objects could not be fetched, e.g. GodMap.unsafe_get_data
+        :type slow_path: function
+        :rtype: np.ndarray
+        """
+        self.objects[0] = data
+        self.fetch(self.steps, 0, len(self.leaves), out, slow_path)
+        return out
+
+    def fill_changed(self, data, out, slow_path, changed_identifiers):
+        """
+        Like fill, but only updates the values in the subtrees of changed_identifiers and function calls.
+        :param out: has to contain the values of the last call
+        :type out: np.ndarray
+        :param changed_identifiers: identifiers that were set since the last call
+        :type changed_identifiers: list
+        :rtype: np.ndarray
+        """
+        subtrees = list(self.volatile_subtrees)
+        for identifier in changed_identifiers:
+            # the longest prefix that is in the trie, a change deeper than a leaf may have changed the leaf
+            for i in range(len(identifier), 0, -1):
+                slot = self.slots.get(identifier[:i])
+                if slot is not None:
+                    slot = self.get_joint_states_ancestor(identifier[:i], slot)
+                    subtrees.append((slot, self.subtree_ends[slot]))
+                    break
+        self.objects[0] = data
+        for start, end in self.merge_subtrees(subtrees):
+            self.fetch(self.steps[start - 1:end - 1],
+                       bisect_left(self.leaf_slots, start),
+                       bisect_left(self.leaf_slots, end),
+                       out, slow_path)
+        return out
+
+    def get_joint_states_ancestor(self, prefix, slot):
+        """
+        :return: the slot of the joint states subtree that contains prefix, because the objects in it are not fetched
+                 if it gets gathered from arrays, otherwise slot
+        :rtype: int
+        """
+        if self.joint_states_gathers:
+            for i in range(1, len(prefix)):
+                ancestor = self.slots[prefix[:i]]
+                if ancestor in self.joint_states_gathers:
+                    return ancestor
+        return slot
+
+    @staticmethod
+    def merge_subtrees(subtrees):
+        """
+        :param subtrees: (first slot, first slot after the subtree) per subtree
+        :type subtrees: list
+        :return: sorted slot ranges without nested and with adjacent subtrees merged, such that they are fetched
+                 in one go
+        :rtype: list
+        """
+        ranges = []
+        for start, end in sorted(subtrees):
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], max(end, ranges[-1][1]))
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def fetch(self, steps, leaf_start, leaf_end, out, slow_path):
+        """
+        :param steps: consecutive subtrees of self.steps
+        :param leaf_start: index of the first leaf of the subtrees in self.leaves
+        :param leaf_end: index after the last leaf of the subtrees in self.leaves
+        """
+        objects = self.objects
+        joint_states_gathers = self.joint_states_gathers
+        gathered = []
+        skip_end = 0
+        for slot, parent, accessor in steps:
+            if slot < skip_end:
+                continue
+            parent_object = objects[parent]
+            if parent_object is MISSING:
+                objects[slot] = MISSING
+                continue
+            try:
+                objects[slot] = accessor.c(parent_object)
+            except Exception:
+                objects[slot] = MISSING
+                continue
+            if slot in joint_states_gathers and objects[slot].__class__ is JointStates:
+                gathered.append(slot)
+                skip_end = self.subtree_ends[slot]
+        for slot in gathered:
+            subtree_leaf_start, subtree_leaf_end = self.joint_states_leaves[slot]
+            self.fetch_leaves(leaf_start, subtree_leaf_start, out, slow_path)
+            joint_states_gathers[slot].fill(objects[slot], out, slow_path, self.identifiers)
+            leaf_start = subtree_leaf_end
+        self.fetch_leaves(leaf_start, leaf_end, out, slow_path)
+
+    def fetch_leaves(self, leaf_start, leaf_end, out, slow_path):
+        objects = self.objects
+        for slot, i in self.leaves[leaf_start:leaf_end]:
+            value = objects[slot]
+            if value is MISSING:
+                value = slow_path(self.identifiers[i])
+            out[i] = value
+
+
 class GodMap(object):
     """
     Data structure used by plugins to exchange information.
@@ -194,15 +465,108 @@ class GodMap(object):
         self.default_value = default_value
         self.last_expr_values = {}
         self.shortcuts = {}
+        # increased when the shortcuts get invalid, such that gather plans know when to refresh theirs
+        self.cache_version = 0
+        # if True, set_data records which identifiers were set, such that fill_values only fetches what has changed.
+        # objects that are changed without set_data are only noticed, if they are returned by a function call
+        self.track_changes = False
+        # increased by set_data, if changes are tracked
+        self.version = 0
+        # identifier -> version of its last set_data, the last one is the most recent
+        self.changed_identifiers = OrderedDict()
+        # lock is used for set_data and 'with god_map', read_lock for get_data, both are the same lock by default
         self.lock = Lock()
+        self.read_lock = self.lock
+        self.lock_statistics = None
+        # prefixes of identifiers whose dicts and lists belong to this god map since the last fork,
+        # None if the god map was never forked, see fork
+        self.copied_prefixes = None
 
     def __copy__(self):
         god_map_copy = GodMap(self.default_value)
         god_map_copy._data = copy(self._data)
         god_map_copy.key_to_expr = copy(self.key_to_expr)
         god_map_copy.expr_to_key = copy(self.expr_to_key)
+        god_map_copy.track_changes = self.track_changes
         return god_map_copy
 
+    def fork(self):
+        """
+        Creates a god map that shares all data with this one, until either of them sets data.
+        set_data copies the dicts and lists on the path to the identifier, if they are still shared, such that the
+        other god map is not affected, e.g. by the goal parameters of an alternative goal.
+        Other objects, e.g. the world and robot, stay shared and are changed in place, they can be separated by
+        running the fork in another process, see PlanningWorker.
+        Objects returned by get_data must not be changed in place, set a new object with set_data instead.
+        :rtype: GodMap
+        """
+        with self.lock:
+            god_map_fork = copy(self)
+            # all dicts and lists below the root are shared now
+            self.copied_prefixes = set()
+            god_map_fork.copied_prefixes = set()
+        return god_map_fork
+
+    def copy_path(self, identifier):
+        """
+        Replaces the dicts and lists on the path to the object that gets set at identifier with copies, if they
+        were not copied since the last fork.
+        :type identifier: tuple
+        :return: shortest prefix of identifier whose object was copied, None if nothing was copied
+        :rtype: tuple
+        """
+        parent = self._data
+        copied_prefix = None
+        for i in range(1, len(identifier)):
+            member = identifier[i - 1]
+            try:
+                if isinstance(parent, dict):
+                    child = parent[member]
+                else:
+                    child = parent[int(member)]
+            except (KeyError, IndexError, ValueError, TypeError):
+                break
+            if not isinstance(child, (dict, list)):
+                break
+            prefix = identifier[:i]
+            if prefix not in self.copied_prefixes:
+                child = copy(child)
+                if isinstance(parent, dict):
+                    parent[member] = child
+                else:
+                    parent[int(member)] = child
+                self.copied_prefixes.add(prefix)
+                if copied_prefix is None:
+                    copied_prefix = prefix
+            parent = child
+        return copied_prefix
+
+    def set_concurrency(self, read_write_lock=False, lock_statistics=False):
+        """
+        Replaces the locks, has to be called before the god map is used by more than one thread.
+        :param read_write_lock: if True, get_data, get_values and fill_values only wait for set_data and
+                                'with god_map', but not for each other
+        :type read_write_lock: bool
+        :param lock_statistics: if True, records how long each caller waited for the locks in self.lock_statistics
+        :type lock_statistics: bool
+        """
+        if read_write_lock:
+            self.lock = ReadWriteLock()
+            self.read_lock = self.lock.read_lock
+        else:
+            self.lock = Lock()
+            self.read_lock = self.lock
+        if lock_statistics:
+            self.lock_statistics = LockStatistics()
+            write_lock = TimedLock(self.lock, self.lock_statistics, u'write')
+            if read_write_lock:
+                self.read_lock = TimedLock(self.read_lock, self.lock_statistics, u'read')
+            else:
+                self.read_lock = write_lock
+            self.lock = write_lock
+        else:
+            self.lock_statistics = None
+
     def __enter__(self):
         self.lock.acquire()
         return self
@@ -232,13 +596,14 @@ class GodMap(object):
         return self.shortcuts[identifier].c(self._data)
 
     def get_data(self, identifier):
-        with self.lock:
+        with self.read_lock:
             r = self.unsafe_get_data(identifier)
         return r
 
     def clear_cache(self):
         # TODO should be possible without clear cache
         self.shortcuts = {}
+        self.cache_version += 1
 
     def to_symbol(self, identifier):
         """
@@ -263,14 +628,59 @@ class GodMap(object):
         :return: a dict which maps all registered expressions to their values or 0 if there is no number entry
         :rtype: dict
         """
-        # TODO potential speedup by only updating entries that have changed
+        # fill_values only updates the entries that have changed, see track_changes
         # its a trap, this function only looks slow with lineprofiler
-        with self.lock:
+        with self.read_lock:
             # if exprs is None:
             #     exprs = self.expr_to_key.keys()
             # return {expr: self.get_data(self.expr_to_key[expr]) for expr in exprs}
             return [self.unsafe_get_data(self.expr_to_key[expr]) for expr in symbols]
 
+    def make_gather_plan(self, symbols):
+        """
+        :param symbols: symbols created with to_symbol, e.g. CompiledFunction.str_params
+        :type symbols: list
+        :rtype: GatherPlan
+        """
+        return GatherPlan([tuple(self.expr_to_key[str(symbol)]) for symbol in symbols], self.default_value)
+
+    def fill_values(self, plan, out):
+        """
+        Writes the values of the symbols of plan into out, like get_values, but in place.
+        :type plan: GatherPlan
+        :param out: e.g. CompiledFunction.args
+        :type out: np.ndarray
+        :return: out
+        :rtype: np.ndarray
+        """
+        with self.read_lock:
+            return self.unsafe_fill_values(plan, out)
+
+    def unsafe_fill_values(self, plan, out):
+        if plan.cache_version != self.cache_version:
+            plan.reset()
+            plan.cache_version = self.cache_version
+            plan.out = None
+        if self.track_changes and out is plan.out and plan.version <= self.version:
+            plan.fill_changed(self._data, out, self.unsafe_get_data, self.get_changed_identifiers(plan.version))
+        else:
+            plan.fill(self._data, out, self.unsafe_get_data)
+        plan.out = out
+        plan.version = self.version
+        return out
+
+    def get_changed_identifiers(self, version):
+        """
+        :return: identifiers that were set after version
+        :rtype: list
+        """
+        result = []
+        for identifier in reversed(self.changed_identifiers):
+            if self.changed_identifiers[identifier] <= version:
+                break
+            result.append(identifier)
+        return result
+
     def get_registered_symbols(self):
         """
         :rtype: list
@@ -287,6 +697,16 @@ class GodMap(object):
         """
         if len(identifier) == 0:
             raise ValueError(u'key is empty')
+        changed_identifier = tuple(identifier)
+        if self.copied_prefixes is not None:
+            copied_prefix = self.copy_path(changed_identifier)
+            if copied_prefix is not None:
+                # gather plans have to fetch the copies as well
+                changed_identifier = copied_prefix
+        if self.track_changes:
+            self.version += 1
+            self.changed_identifiers.pop(changed_identifier, None)
+            self.changed_identifiers[changed_identifier] = self.version
         namespace = identifier[0]
         if namespace not in self._data:
             if len(identifier) > 1:
@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from threading import Condition, Lock
+from time import time
+import sys
+
+
+class ReadWriteLock(object):
+    """
+    Lock that can be held by many readers or one writer, see GodMap.set_concurrency.
+    Readers that arrive while a writer waits, wait as well, such that a steady stream of readers does not starve the
+    writers. It is not reentrant, like the lock it replaces.
+    Used as lock, e.g. with 'with', it is acquired for writing, read_lock is acquired for reading.
+    """
+
+    def __init__(self):
+        self.condition = Condition(Lock())
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+        self.read_lock = ReadLock(self)
+
+    def acquire_read(self):
+        with self.condition:
+            while self.writer or self.waiting_writers > 0:
+                self.condition.wait()
+            self.readers += 1
+
+    def release_read(self):
+        with self.condition:
+            self.readers -= 1
+            if self.readers == 0:
+                self.condition.notify_all()
+
+    def acquire(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writer or self.readers > 0:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+
+    def release(self):
+        with self.condition:
+            self.writer = False
+            self.condition.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class ReadLock(object):
+    """
+    The read side of a ReadWriteLock with the interface of a lock.
+    """
+
+    def __init__(self, read_write_lock):
+        """
+        :type read_write_lock: ReadWriteLock
+        """
+        self.acquire = read_write_lock.acquire_read
+        self.release = read_write_lock.release_read
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class LockStatistics(object):
+    """
+    Sums up how long each caller waited for the locks of the god map.
+    The caller is the first function on the stack outside of the god map, e.g. a plugin method.
+    """
+    skipped_modules = {__name__, u'giskardpy.god_map', u'giskardpy.plugin'}
+
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # (caller, mode) -> [number of acquisitions, total wait time, max wait time]
+            self.waits = OrderedDict()
+
+    def get_caller(self):
+        """
+        :return: module.function of the first frame outside of the god map
+        :rtype: str
+        """
+        frame = sys._getframe(2)
+        while frame.f_back is not None and frame.f_globals.get(u'__name__') in self.skipped_modules:
+            frame = frame.f_back
+        return u'{}.{}'.format(frame.f_globals.get(u'__name__'), frame.f_code.co_name)
+
+    def add(self, mode, wait_time):
+        """
+        :param mode: u'read' or u'write'
+        :type mode: str
+        :param wait_time: in s
+        :type wait_time: float
+        """
+        key = (self.get_caller(), mode)
+        with self.lock:
+            entry = self.waits.get(key)
+            if entry is None:
+                self.waits[key] = [1, wait_time, wait_time]
+            else:
+                entry[0] += 1
+                entry[1] += wait_time
+                entry[2] = max(entry[2], wait_time)
+
+    def summary(self, number_of_rows=10):
+        """
+        :param number_of_rows: number of callers with the longest total wait time that are listed
+        :rtype: str
+        """
+        with self.lock:
+            rows = sorted(((caller, mode, count, total, maximum)
+                           for (caller, mode), (count, total, maximum) in self.waits.items()),
+                          key=lambda row: row[3], reverse=True)
+        lines = [u'god map lock wait times of {} callers:'.format(len(rows)),
+                 u'  {:70} {:>5} {:>8} {:>10} {:>10} {:>10}'.format(u'caller', u'mode', u'count', u'total [ms]',
+                                                                    u'mean [us]', u'max [ms]')]
+        for caller, mode, count, total, maximum in rows[:number_of_rows]:
+            lines.append(u'  {:70} {:>5} {:>8} {:>10.3f} {:>10.2f} {:>10.3f}'.format(
+                caller, mode, count, total * 1000, total / count * 1e6, maximum * 1000))
+        return u'\n'.join(lines)
+
+
+class TimedLock(object):
+    """
+    Wraps a lock and adds the time each acquire waited for it to LockStatistics.
+    """
+
+    def __init__(self, lock, statistics, mode):
+        """
+        :param lock: anything with acquire and release
+        :type statistics: LockStatistics
+        :param mode: u'read' or u'write'
+        :type mode: str
+        """
+        self.lock = lock
+        self.statistics = statistics
+        self.mode = mode
+
+    def acquire(self):
+        t = time()
+        self.lock.acquire()
+        self.statistics.add(self.mode, time() - t)
+
+    def release(self):
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
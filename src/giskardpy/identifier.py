@@ -14,6 +14,7 @@ closest_point = [u'cpi']
 # collisions = [u'collisions']
 collision_goal = [u'collision_goal']
 soft_constraint_identifier = [u'soft_constraints']
+soft_constraint_blocks_identifier = [u'soft_constraint_blocks']
 joint_constraint_identifier = [u'joint_constraints']
 hard_constraint_identifier = [u'hard_constraints']
 
@@ -24,6 +25,7 @@ cut_off_shaking = [u'cut_off_shaking']
 next_move_goal = [u'next_move_goal']
 cmd_id = [u'cmd_id']
 
+# copies of the qp problem and solution of the last control cycle
 qp_data = [u'qp_data']
 A = qp_data + [u'A']
 H = qp_data + [u'H']
@@ -83,12 +85,57 @@ joint_weight_override = joint_weight + [u'override']
 # qp solver
 qp_solver = rosparam + [u'qp_solver']
 nWSR = qp_solver + [u'nWSR']
+qp_solver_name = qp_solver + [u'name']
+qp_solver_fixed_dimension = qp_solver + [u'fixed_dimension']
+qp_solver_reuse_working_set = qp_solver + [u'reuse_working_set']
+qp_solver_working_set_cache_size = qp_solver + [u'working_set_cache_size']
+qp_solver_time_budget = qp_solver + [u'time_budget']
+qp_solver_budget_fallback_scale = qp_solver + [u'budget_fallback_scale']
+
+# codegen
+codegen_backend = rosparam + [u'codegen', u'backend']
+
+# jacobian
+jacobian_processes = rosparam + [u'jacobian', u'processes']
+jacobian_min_constraints_per_process = rosparam + [u'jacobian', u'min_constraints_per_process']
+
+# controller cache
+controller_cache = rosparam + [u'controller_cache']
+enable_on_disk_controller_cache = controller_cache + [u'on_disk', u'enabled']
+on_disk_controller_cache_max_size = controller_cache + [u'on_disk', u'max_size_in_mb']
+enable_block_cache = controller_cache + [u'blocks', u'enabled']
+block_cache_max_size = controller_cache + [u'blocks', u'max_size']
+enable_in_memory_controller_cache = controller_cache + [u'in_memory', u'enabled']
+in_memory_controller_cache_max_size = controller_cache + [u'in_memory', u'max_size']
+
+# complexity report
+complexity_report = [u'complexity_report']
+complexity_report_config = rosparam + [u'complexity_report']
+enable_complexity_report = complexity_report_config + [u'enabled']
+complexity_report_summary_rows = complexity_report_config + [u'summary_rows']
+
+# prewarm
+prewarm = rosparam + [u'prewarm']
+enable_prewarm = prewarm + [u'enabled']
+prewarm_templates = prewarm + [u'templates']
+prewarm_block_startup = prewarm + [u'block_startup']
+controller_prewarmer = prewarm + [u'controller_prewarmer']
+
+# god map
+god_map_config = rosparam + [u'god_map']
+enable_change_tracking = god_map_config + [u'track_changes']
+enable_read_write_lock = god_map_config + [u'read_write_lock']
+enable_lock_statistics = god_map_config + [u'lock_statistics']
 
 # plugins
 plugins = rosparam + [u'plugins']
 enable_VisualizationBehavior = plugins + [u'VisualizationBehavior', u'enabled']
 enable_CPIMarker = plugins + [u'CPIMarker', u'enabled']
 enable_PlotTrajectory = plugins + [u'PlotTrajectory', u'enabled']
+enable_Timing = plugins + [u'Timing', u'enabled']
+Timing_buffer_size = plugins + [u'Timing', u'buffer_size']
+enable_QPRecorder = plugins + [u'QPRecorder', u'enabled']
+QPRecorder_chunk_size = plugins + [u'QPRecorder', u'chunk_size']
 PlotTrajectory_velocity_threshold = plugins + [u'PlotTrajectory', u'velocity_threshold']
 PlotTrajectory_scaling = plugins + [u'PlotTrajectory', u'scaling']
 PlotTrajectory_normalize_position = plugins + [u'PlotTrajectory', u'normalize_position']
@@ -108,6 +155,7 @@ rc_prismatic_velocity = reachability_check + [u'prismatic_velocity']
 rc_continuous_velocity = reachability_check + [u'continuous_velocity']
 rc_revolute_velocity = reachability_check + [u'revolute_velocity']
 rc_other_velocity = reachability_check + [u'other_velocity']
+rc_batch = reachability_check + [u'batch']
 
 
 # behavior tree
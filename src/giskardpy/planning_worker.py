@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import traceback
+
+import rospy
+
+import giskardpy.identifier as identifier
+import giskardpy.pybullet_wrapper as pbw
+from giskardpy import logging
+from giskardpy.exceptions import PhysicsWorldException, PlanningException
+
+try:
+    # python 3 may spawn processes, which would have to pickle the world
+    process_context = multiprocessing.get_context(u'fork')
+except AttributeError:
+    process_context = multiprocessing
+
+LOG_FUNCTIONS = [u'logdebug', u'loginfo', u'logwarn', u'logerr', u'logfatal']
+
+
+def make_stderr_log_function(level, name):
+    def log(msg, *args, **kwargs):
+        try:
+            if args:
+                msg = msg % args
+            os.write(2, u'[{}] [{}]: {}\n'.format(level, name, msg).encode(u'utf-8'))
+        except Exception:
+            pass
+
+    return log
+
+
+def replace_ros_logging(name):
+    """
+    Replaces the log functions of rospy and giskardpy.logging in a forked process with ones that write directly to
+    stderr, because rospy logs with locks, which other threads of the parent process might have held during the fork,
+    and publishes on rosout, whose threads don't exist in the forked process.
+    :param name: gets added to the messages
+    :type name: str
+    """
+    for function_name in LOG_FUNCTIONS:
+        log = make_stderr_log_function(function_name[3:].upper(), name)
+        setattr(rospy, function_name, log)
+        setattr(logging, function_name, log)
+    if logging.debug.param is None:
+        # modules that imported the log functions of giskardpy.logging would otherwise ask the parameter server
+        logging.debug.param = False
+
+
+class PlanningWorker(object):
+    """
+    Runs a function with a fork of the god map in a forked process, e.g. to plan an alternative goal in parallel.
+    The process gets a copy of the world and of the pybullet DIRECT client, which it clears and reloads the world
+    into, such that the function can change the world and robot without affecting the god map of the parent process.
+    Only the thread that calls start is copied into the process, locks held by other threads stay locked there.
+    Therefore the god map lock is held during the fork and the locks of both god maps are replaced in the process,
+    such that the function can also use plugins, which use the god map of the parent, e.g. to compile a controller
+    with ControllerPlugin.load_controller. Logging is redirected to stderr, see replace_ros_logging.
+    The function must not use other parts of ros, e.g. publishers, services, parameters or tf.
+    Errors are sent to the parent process, which logs them in get_result.
+    """
+
+    def __init__(self, god_map, target, name=u'planning worker'):
+        """
+        :type god_map: giskardpy.god_map.GodMap
+        :param target: gets called with the fork of the god map in the worker process, its result has to be picklable
+        :type target: function
+        :type name: str
+        """
+        if god_map.get_data(identifier.gui) or not pbw.is_direct_client():
+            raise PhysicsWorldException(u'planning workers need a pybullet DIRECT client')
+        self.parent_god_map = god_map
+        self.god_map = god_map.fork()
+        self.target = target
+        self.name = name
+        self.queue = process_context.Queue(1)
+        self.process = None
+
+    def start(self):
+        self.process = process_context.Process(target=self.run, name=self.name)
+        self.process.daemon = True
+        # no other thread may change the god map while it is copied into the process
+        with self.parent_god_map:
+            self.process.start()
+
+    def run(self):
+        try:
+            replace_ros_logging(self.name)
+            # the locks were copied in the state of the parent process
+            self.parent_god_map.set_concurrency()
+            self.god_map.set_concurrency()
+            # the copy of the client only belongs to this process, the objects get new ids after the reset
+            pbw.clear_pybullet()
+            self.god_map.get_data(identifier.world).reload_into_bullet()
+            self.queue.put((True, self.target(self.god_map)))
+        except Exception:
+            self.queue.put((False, traceback.format_exc()))
+
+    def get_result(self, timeout=None):
+        """
+        Waits for the worker process to finish.
+        :param timeout: in s, None waits forever
+        :type timeout: float
+        :return: result of target
+        """
+        success, result = self.queue.get(timeout=timeout)
+        self.process.join()
+        if not success:
+            logging.logerr(u'{} failed:\n{}'.format(self.name, result))
+            raise PlanningException(u'{} failed: {}'.format(self.name, result.strip().splitlines()[-1]))
+        return result
@@ -16,6 +16,11 @@ class CleanUp(GiskardBehavior):
         self.general_options = deepcopy(self.get_god_map().get_data(identifier.general_options))
 
     def initialise(self):
+        prewarmer = self.get_god_map().get_data(identifier.controller_prewarmer)
+        if prewarmer is not None:
+            # the controller plugin must not be used by two threads
+            prewarmer.stop()
+            self.get_god_map().set_data(identifier.controller_prewarmer, None)
         self.get_god_map().clear_cache()
         self.get_god_map().set_data(identifier.closest_point, {})
         # self.get_god_map().safe_set_data(identifier.closest_point, None)
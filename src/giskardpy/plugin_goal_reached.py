@@ -86,7 +86,7 @@ class GoalReachedPlugin(GiskardBehavior):
         p_lbA = pd.DataFrame(np_lbA, lbA).sort_index()
         p_A_dot_x = pd.DataFrame(A_dot_x, lbA).sort_index()
         p_ubA = pd.DataFrame(np_ubA, lbA).sort_index()
-        p_weights = pd.DataFrame(np_H.dot(np.ones(np_H.shape[0])), weights).sort_index()
+        p_weights = pd.DataFrame(np_H, weights).sort_index()
         p_xdot = pd.DataFrame(xdot_full, xdot).sort_index()
         p_A = pd.DataFrame(np_A, lbA, weights).sort_index(1).sort_index(0)
         # self.lbAs.T[[c for c in self.lbAs.T.columns if 'dist' in c]].plot()
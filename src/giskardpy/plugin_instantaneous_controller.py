@@ -1,19 +1,74 @@
+import hashlib
 from copy import copy
+from time import strftime
 
+import numpy as np
+import rospy
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
 from py_trees import Status
 
 import giskardpy.identifier as identifier
+from giskardpy import logging
+from giskardpy.controller_blocks import BlockCache
+from giskardpy.controller_cache import ControllerCache
+from giskardpy.data_types import constraint_to_str
 from giskardpy.plugin import GiskardBehavior
+from giskardpy.qp_recorder import QPRecorder
+from giskardpy.qp_solver import get_qp_solver
+from giskardpy.timing import StageTimer, NullStageTimer
 from giskardpy.symengine_controller import InstantaneousController
 from collections import OrderedDict, namedtuple
 import utils
 
 
 class ControllerPlugin(GiskardBehavior):
+    # number of ticks at the start of a goal, whose working set recalculations are recorded
+    first_ticks = 5
+    timing_percentiles = (50, 90, 99, 100)
+
     def __init__(self, name):
         super(ControllerPlugin, self).__init__(name)
         self.path_to_functions = self.get_god_map().get_data(identifier.data_folder)
         self.nWSR = self.get_god_map().get_data(identifier.nWSR)
+        self.qp_solver_name = self.get_god_map().get_data(identifier.qp_solver_name)
+        self.fixed_dimension = self.get_god_map().get_data(identifier.qp_solver_fixed_dimension)
+        self.time_budget = self.get_god_map().get_data(identifier.qp_solver_time_budget)
+        self.budget_fallback_scale = self.get_god_map().get_data(identifier.qp_solver_budget_fallback_scale)
+        self.reuse_working_set = self.get_god_map().get_data(identifier.qp_solver_reuse_working_set)
+        self.qp_solver_cache_size = self.get_god_map().get_data(identifier.qp_solver_working_set_cache_size)
+        if self.get_god_map().get_data(identifier.enable_on_disk_controller_cache):
+            self.controller_cache = ControllerCache(
+                self.get_god_map().get_data(identifier.on_disk_controller_cache_max_size))
+        else:
+            self.controller_cache = None
+        if self.get_god_map().get_data(identifier.enable_block_cache):
+            self.block_cache = BlockCache(self.get_god_map().get_data(identifier.block_cache_max_size))
+        else:
+            self.block_cache = None
+        self.block_cache_urdf = None
+        if self.get_god_map().get_data(identifier.enable_in_memory_controller_cache):
+            self.controller_lru = utils.LRUCache(
+                self.get_god_map().get_data(identifier.in_memory_controller_cache_max_size))
+        else:
+            self.controller_lru = None
+        self.qp_solver_cache = OrderedDict()  # constraint signature -> qp solver of the last goal with it
+        self.warm_started = False
+        self.first_ticks_iterations = []
+        # warm started -> working set recalculations of the first ticks of previous goals
+        self.first_ticks_history = {True: [], False: []}
+        if self.get_god_map().get_data(identifier.enable_Timing):
+            self.timer = StageTimer([u'get_values', u'evaluate', u'filter', u'solve'],
+                                    self.get_god_map().get_data(identifier.Timing_buffer_size))
+        else:
+            self.timer = NullStageTimer()
+        self.timing_publisher = None
+        self.record_qp_problems = self.get_god_map().get_data(identifier.enable_QPRecorder)
+        self.qp_recorder_chunk_size = self.get_god_map().get_data(identifier.QPRecorder_chunk_size)
+        self.recorder = None
+        self.complexity_report_summary_rows = self.get_god_map().get_data(identifier.complexity_report_summary_rows)
+        self.number_of_goals = 0
+        self.controller = None
+        self.gather_plan = None
         self.soft_constraints = None
         self.joint_constraints = None
         self.hard_constraints = None
@@ -28,31 +83,175 @@ class ControllerPlugin(GiskardBehavior):
         super(ControllerPlugin, self).initialise()
         self.init_controller()
 
+    def terminate(self, new_status):
+        if self.controller is not None and self.controller.qp_problem_builder is not None:
+            num_inits, num_hotstarts, num_budget_hits = self.controller.get_qp_solver_statistics()
+            logging.loginfo(u'qp solver was initialized {} times and hotstarted {} times'.format(num_inits,
+                                                                                                  num_hotstarts))
+            if num_budget_hits > 0:
+                logging.logwarn(u'qp solver ran out of time {} times'.format(num_budget_hits))
+            self.log_first_ticks_iterations()
+        if self.timer.count > 0:
+            logging.loginfo(self.timer.summary(self.timing_percentiles))
+            self.publish_timing()
+        lock_statistics = self.get_god_map().lock_statistics
+        if lock_statistics is not None:
+            logging.loginfo(lock_statistics.summary())
+            lock_statistics.reset()
+        if self.recorder is not None:
+            self.recorder.close()
+            logging.loginfo(u'recorded {} qp problems in {}'.format(self.recorder.number_of_cycles,
+                                                                    self.recorder.path))
+            self.recorder = None
+        super(ControllerPlugin, self).terminate(new_status)
+
+    def log_first_ticks_iterations(self):
+        if not self.first_ticks_iterations:
+            return
+        iterations = sum(self.first_ticks_iterations)
+        self.first_ticks_history[self.warm_started].append(iterations)
+        logging.loginfo(u'first {} ticks needed {} working set recalculations ({})'.format(
+            len(self.first_ticks_iterations), iterations,
+            u'warm started from previous goal' if self.warm_started else u'cold start'))
+        if self.first_ticks_history[True] and self.first_ticks_history[False]:
+            cold = np.mean(self.first_ticks_history[False])
+            warm = np.mean(self.first_ticks_history[True])
+            logging.loginfo(u'reusing working sets saved {:.1f} of {:.1f} working set recalculations on average'.format(
+                cold - warm, cold))
+
+    def create_or_reuse_qp_solver(self):
+        """
+        :return: the qp solver of the last goal with the same constraints, if reuse_working_set is enabled,
+                 otherwise a new one
+        :rtype: giskardpy.qp_solver.BaseQPSolver
+        """
+        if self.reuse_working_set:
+            qp_solver = self.qp_solver_cache.pop(self.controller.get_constraint_signature(), None)
+            if qp_solver is not None:
+                qp_solver.reset_statistics()
+                self.warm_started = True
+                return qp_solver
+        self.warm_started = False
+        return get_qp_solver(self.qp_solver_name, self.time_budget, self.budget_fallback_scale)
+
+    def cache_qp_solver(self):
+        if self.reuse_working_set:
+            self.qp_solver_cache[self.controller.get_constraint_signature()] = self.controller.get_qp_solver()
+            while len(self.qp_solver_cache) > self.qp_solver_cache_size:
+                self.qp_solver_cache.popitem(last=False)
+
+    def get_block_cache(self):
+        """
+        :return: the block cache, which is cleared if the robot has changed, e.g. because an object was attached
+        :rtype: BlockCache
+        """
+        if self.block_cache is not None:
+            urdf = self.get_robot().get_urdf_str()
+            if urdf != self.block_cache_urdf:
+                self.block_cache.clear()
+                self.block_cache_urdf = urdf
+        return self.block_cache
+
+    def init_recorder(self):
+        self.number_of_goals += 1
+        path = u'{}qp_recordings/{}_{}/'.format(self.path_to_functions, strftime(u'%Y-%m-%d_%H-%M-%S'),
+                                               self.number_of_goals)
+        self.recorder = QPRecorder(path,
+                                   self.controller.get_expr(),
+                                   self.qp_data[identifier.xdot_keys[-1]],
+                                   self.qp_data[identifier.bA_keys[-1]],
+                                   self.qp_recorder_chunk_size)
+
+    def record(self, substitutions):
+        builder = self.controller.qp_problem_builder
+        bA_mask, b_mask = builder.get_filter_masks()
+        self.recorder.record(substitutions, builder.np_H, builder.np_A, builder.np_lb, builder.np_ub,
+                             builder.np_lbA, builder.np_ubA, builder.np_g, b_mask, bA_mask,
+                             self.qp_data[identifier.xdot_full[-1]])
+
+    def publish_timing(self):
+        """
+        Publishes the timing percentiles of the last goal, one key per stage and percentile.
+        """
+        status = DiagnosticStatus()
+        status.name = u'giskard controller timing'
+        status.message = u'wall time per control cycle in ms'
+        for stage, times in self.timer.get_percentiles(self.timing_percentiles).items():
+            for percentile, t in zip(self.timing_percentiles, times):
+                status.values.append(KeyValue(u'{} p{}'.format(stage, percentile), u'{:.3f}'.format(t * 1000)))
+        msg = DiagnosticArray()
+        msg.header.stamp = rospy.get_rostime()
+        msg.status.append(status)
+        self.timing_publisher.publish(msg)
+
     def setup(self, timeout=0.0):
+        if isinstance(self.timer, StageTimer):
+            self.timing_publisher = rospy.Publisher(u'~timing', DiagnosticArray, queue_size=1, latch=True)
         return super(ControllerPlugin, self).setup(5.0)
 
     def init_controller(self):
-        new_soft_constraints = self.get_god_map().get_data(identifier.soft_constraint_identifier)
-        new_joint_constraints = self.get_god_map().get_data(identifier.joint_constraint_identifier)
-        new_hard_constraints = self.get_god_map().get_data(identifier.hard_constraint_identifier)
+        self.load_controller(self.get_god_map())
+        self.cache_qp_solver()
+
+        self.qp_data[identifier.weight_keys[-1]], \
+        self.qp_data[identifier.b_keys[-1]], \
+        self.qp_data[identifier.bA_keys[-1]], \
+        self.qp_data[identifier.xdot_keys[-1]] = self.controller.get_qpdata_key_map()
+        self.gather_plan = self.get_god_map().make_gather_plan(self.controller.get_expr())
+        if self.record_qp_problems:
+            self.init_recorder()
 
-        # update = False
-        # if self.soft_constraints is None or set(self.soft_constraints.keys()) != set(new_soft_constraints.keys()):
-        self.soft_constraints = copy(new_soft_constraints)
-            # update = True
+    def load_controller(self, god_map):
+        """
+        Takes the controller of the constraints on god_map from the in memory controller cache or compiles it.
+        :param god_map: the god map of the plugin or a fork with other constraints, see ControllerPrewarmer
+        :type god_map: giskardpy.god_map.GodMap
+        """
+        self.soft_constraints = copy(god_map.get_data(identifier.soft_constraint_identifier))
+        self.joint_constraints = copy(god_map.get_data(identifier.joint_constraint_identifier))
+        self.hard_constraints = copy(god_map.get_data(identifier.hard_constraint_identifier))
 
-        # if self.joint_constraints is None or set(self.joint_constraints.keys()) != set(new_joint_constraints.keys()):
-        self.joint_constraints = copy(new_joint_constraints)
-            # update = True
+        controller_key = self.get_controller_key()
+        if self.controller_lru is not None:
+            self.controller = self.controller_lru.get(controller_key)
+        else:
+            self.controller = None
+        if self.controller is None:
+            self.compile_controller(god_map)
+            if self.controller_lru is not None:
+                self.controller_lru.put(controller_key, self.controller)
+                logging.loginfo(u'compiled new controller, in memory controller cache: {} hits, {} misses'.format(
+                    self.controller_lru.hits, self.controller_lru.misses))
+        else:
+            self.reuse_controller()
+            logging.loginfo(u'reusing compiled controller, in memory controller cache: {} hits, {} misses'.format(
+                self.controller_lru.hits, self.controller_lru.misses))
 
-        # if self.hard_constraints is None or set(self.hard_constraints.keys()) != set(new_hard_constraints.keys()):
-        self.hard_constraints = copy(new_hard_constraints)
-            # update = True
+    def get_controller_key(self):
+        """
+        Constraints are identified by their names and contents, like in InstantaneousController.get_constraint_signature,
+        because the reachability check or a hard and a soft CartesianVelocityLimit use other ones with the same names.
+        :return: identifies the compiled controller of the current constraints, independent of their order,
+                 because a controller keeps its own order of constraints
+        :rtype: tuple
+        """
+        return (tuple(sorted(constraint_to_str(k, v) for k, v in self.joint_constraints.items())),
+                tuple(sorted(constraint_to_str(k, v) for k, v in self.hard_constraints.items())),
+                tuple(sorted(constraint_to_str(k, v) for k, v in self.soft_constraints.items())),
+                hashlib.md5(self.get_robot().get_urdf_str()).hexdigest())
 
-        # if update:
+    def compile_controller(self, god_map):
+        """
+        :param god_map: see load_controller
+        :type god_map: giskardpy.god_map.GodMap
+        """
         self.controller = InstantaneousController(self.get_robot(),
                                                   u'{}/{}/'.format(self.path_to_functions,
-                                                                   self.get_robot().get_name()))
+                                                                   self.get_robot().get_name()),
+                                                  self.qp_solver_name,
+                                                  self.fixed_dimension,
+                                                  self.controller_cache,
+                                                  self.get_block_cache())
 
         controlled_joints = self.get_robot().controlled_joints
         joint_to_symbols_str = OrderedDict(
@@ -62,27 +261,61 @@ class ControllerPlugin(GiskardBehavior):
         self.controller.update_constraints(joint_to_symbols_str,
                                            self.soft_constraints,
                                            self.joint_constraints,
-                                           self.hard_constraints)
-        self.controller.compile()
+                                           self.hard_constraints,
+                                           god_map.get_data(identifier.soft_constraint_blocks_identifier))
+        qp_solver = self.create_or_reuse_qp_solver()
+        self.first_ticks_iterations = []
+        self.timer.reset()
+        complexity_report = god_map.get_data(identifier.complexity_report)
+        self.controller.compile(qp_solver, self.timer, complexity_report)
+        if complexity_report is not None:
+            self.save_complexity_report(complexity_report)
 
-        self.qp_data[identifier.weight_keys[-1]], \
-        self.qp_data[identifier.b_keys[-1]], \
-        self.qp_data[identifier.bA_keys[-1]], \
-        self.qp_data[identifier.xdot_keys[-1]] = self.controller.get_qpdata_key_map()
+    def save_complexity_report(self, complexity_report):
+        """
+        :type complexity_report: giskardpy.complexity_report.ComplexityReport
+        """
+        file_name = u'{}complexity_reports/{}.txt'.format(self.path_to_functions, strftime(u'%Y-%m-%d_%H-%M-%S'))
+        complexity_report.save(file_name)
+        logging.loginfo(complexity_report.summary(self.complexity_report_summary_rows))
+        logging.loginfo(u'saved complexity report in {}'.format(file_name))
+
+    def reuse_controller(self):
+        """
+        Prepares a controller from the in memory controller cache for a new goal. It keeps the qp solver of its last
+        goal, unless reuse_working_set is disabled.
+        """
+        builder = self.controller.qp_problem_builder
+        self.qp_solver_cache.pop(self.controller.get_constraint_signature(), None)
+        if self.reuse_working_set:
+            builder.qp_solver.reset_statistics()
+            self.warm_started = True
+        else:
+            builder.qp_solver = get_qp_solver(self.qp_solver_name, self.time_budget, self.budget_fallback_scale)
+            self.warm_started = False
+        self.first_ticks_iterations = []
+        self.timer.reset()
 
     def update(self):
+        self.timer.start()
+        # writes the symbol values directly into the input of the compiled controller
+        expr = self.god_map.fill_values(self.gather_plan, self.controller.get_input_buffer())
+        self.timer.stage_done(u'get_values')
 
-        expr = self.controller.get_expr()
-        expr = self.god_map.get_values(expr)
-
-        next_cmd, \
-        self.qp_data[identifier.H[-1]], \
-        self.qp_data[identifier.A[-1]], \
-        self.qp_data[identifier.lb[-1]], \
-        self.qp_data[identifier.ub[-1]], \
-        self.qp_data[identifier.lbA[-1]], \
-        self.qp_data[identifier.ubA[-1]], \
-        self.qp_data[identifier.xdot_full[-1]] = self.controller.get_cmd(expr, self.nWSR)
+        next_cmd, np_H, np_A, np_lb, np_ub, np_lbA, np_ubA, xdot_full = self.controller.get_cmd(None, self.nWSR)
+        # the arrays are views on the buffers of the controller, which get overwritten by its next evaluation,
+        # e.g. by another goal that uses the same cached controller, the god map gets copies
+        self.qp_data[identifier.H[-1]] = np_H.copy()
+        self.qp_data[identifier.A[-1]] = np_A.copy()
+        self.qp_data[identifier.lb[-1]] = np_lb.copy()
+        self.qp_data[identifier.ub[-1]] = np_ub.copy()
+        self.qp_data[identifier.lbA[-1]] = np_lbA.copy()
+        self.qp_data[identifier.ubA[-1]] = np_ubA.copy()
+        self.qp_data[identifier.xdot_full[-1]] = xdot_full.copy()
         self.get_god_map().set_data(identifier.cmd, next_cmd)
-
+        if len(self.first_ticks_iterations) < self.first_ticks:
+            self.first_ticks_iterations.append(self.controller.get_qp_solver().iterations)
+        self.timer.stop()
+        if self.recorder is not None:
+            self.record(expr)
         return Status.RUNNING
@@ -1,8 +1,7 @@
-from collections import OrderedDict
-
+import numpy as np
 from py_trees import Status
 
-from giskardpy.data_types import SingleJointState
+from giskardpy.data_types import JointStates
 import giskardpy.identifier as identifier
 from giskardpy.plugin import GiskardBehavior
 
@@ -20,21 +19,41 @@ class KinSimPlugin(GiskardBehavior):
 
     def initialise(self):
         self.sample_period = self.get_god_map().get_data(identifier.sample_period)
+        # indices of the joints of the last motor commands in the joint state arrays
+        self.cmd_joints = None
+        self.cmd_name_to_index = None
+        self.cmd_indices = None
         super(KinSimPlugin, self).initialise()
 
+    def get_cmd_vector(self, joint_states, motor_commands):
+        """
+        :type joint_states: JointStates
+        :param motor_commands: joint name -> position change
+        :type motor_commands: dict
+        :return: position change of each joint in joint_states, 0 for joints without command
+        :rtype: np.ndarray
+        """
+        cmd_joints = list(motor_commands.keys())
+        if cmd_joints != self.cmd_joints or joint_states.name_to_index is not self.cmd_name_to_index:
+            self.cmd_joints = cmd_joints
+            self.cmd_name_to_index = joint_states.name_to_index
+            self.cmd_indices = joint_states.get_indices(cmd_joints)
+        cmd = np.zeros(len(joint_states))
+        cmd[self.cmd_indices] = list(motor_commands.values())
+        return cmd
+
     def update(self):
         motor_commands = self.get_god_map().get_data(identifier.cmd)
         current_js = self.get_god_map().get_data(identifier.joint_states)
         next_js = None
         if motor_commands:
-            next_js = OrderedDict()
-            for joint_name, sjs in current_js.items():
-                if joint_name in motor_commands:
-                    cmd = motor_commands[joint_name]
-                else:
-                    cmd = 0.0
-                next_js[joint_name] = SingleJointState(sjs.name, sjs.position + cmd,
-                                                            velocity=cmd/self.sample_period)
+            if not isinstance(current_js, JointStates):
+                current_js = JointStates.from_dict(current_js)
+            cmd = self.get_cmd_vector(current_js, motor_commands)
+            next_js = current_js.copy()
+            next_js.position += cmd
+            next_js.velocity[:] = cmd / self.sample_period
+            next_js.effort[:] = 0
         if next_js is not None:
             self.get_god_map().set_data(identifier.joint_states, next_js)
         else:
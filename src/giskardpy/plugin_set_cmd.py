@@ -1,10 +1,17 @@
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
+import numpy as np
 from py_trees import Status
 
 import giskardpy.identifier as identifier
-from giskardpy.exceptions import InvalidGoalException
+from giskardpy import logging
+from giskardpy.batch_reachability import BatchReachabilityCheck
+from giskardpy.controller_cache import ControllerCache
+from giskardpy.exceptions import InvalidGoalException, UnreachableException
 from giskardpy.plugin_action_server import GetGoal
+from giskardpy.plugin_goal_reached import make_velocity_threshold
+from giskardpy.plugin_update_constraints import GoalToConstraints
+from giskardpy.symengine_controller import InstantaneousController
 from giskard_msgs.msg import MoveGoal, CollisionEntry, MoveCmd, MoveResult
 
 
@@ -14,6 +21,7 @@ class SetCmd(GetGoal):
         self.goal = None
         self.sample_period_backup = None
         self.rc_sample_period = self.get_god_map().get_data(identifier.rc_sample_period)
+        self.rc_batch = self.get_god_map().get_data(identifier.rc_batch)
 
     def initialise(self):
         if self.goal is None:
@@ -48,6 +56,92 @@ class SetCmd(GetGoal):
             self.get_god_map().set_data(identifier.execute, self.is_execute(self.goal.type))
             self.get_god_map().set_data(identifier.skip_failures, self.is_skip_failures(self.goal.type))
             self.get_god_map().set_data(identifier.cut_off_shaking, self.is_cut_off_shaking(self.goal.type))
+            if self.rc_batch and self.is_check_reachability(self.goal.type) and len(self.goal.cmd_seq) > 1 and \
+                    self.get_blackboard_exception() is None:
+                self.check_reachability_in_batch()
+
+    def check_reachability_in_batch(self):
+        """
+        Checks the reachability of all move commands of the goal with one BatchReachabilityCheck, instead of planning
+        them one after another. The commands are alternatives, e.g. grasp poses, that all start at the current joint
+        state. The controller is compiled for the first command, the others may only differ in their parameters.
+        """
+        move_cmds = self.goal.cmd_seq
+        self.goal.cmd_seq = []
+        result = self.get_god_map().get_data(identifier.result_message)
+        evaluate_result = self.get_god_map().get_data(identifier.tree_manager).get_node(u'evaluate result')
+        goal_to_constraints = GoalToConstraints(u'batch reachability constraints', self.as_name)
+        goal_to_constraints.enable_complexity_report = False
+        candidates = OrderedDict()
+        first_soft_constraints = None
+        for i, move_cmd in enumerate(move_cmds):
+            try:
+                god_map = self.create_constraints(goal_to_constraints, move_cmd)
+                soft_constraints = str(sorted(god_map.get_data(identifier.soft_constraint_identifier).items()))
+                if first_soft_constraints is None:
+                    first_soft_constraints = soft_constraints
+                elif soft_constraints != first_soft_constraints:
+                    raise InvalidGoalException(u'the constraints of move command {} differ from those of the first '
+                                               u'one, they can not be checked in one batch'.format(i))
+                candidates[i] = god_map
+            except Exception as e:
+                result.error_codes[i], result.error_messages[i] = evaluate_result.exception_to_error_code(e)
+        if not candidates:
+            return
+        god_maps = list(candidates.values())
+        controller = self.compile_controller(god_maps[0])
+        check = BatchReachabilityCheck(god_maps[0], controller, make_velocity_threshold(god_maps[0]))
+        substitutions = np.array([god_map.get_values(controller.get_expr()) for god_map in god_maps], dtype=float)
+        for i, reachability in zip(candidates.keys(), check.check_substitutions(substitutions)):
+            if reachability.reachable:
+                result.error_codes[i], result.error_messages[i] = MoveResult.SUCCESS, u''
+            else:
+                result.error_codes[i], result.error_messages[i] = evaluate_result.exception_to_error_code(
+                    UnreachableException(u'goal constraints are not satisfied after {} control cycles; '
+                                         u'largest slack {}'.format(reachability.iterations, reachability.residual)))
+        logging.loginfo(u'checked reachability of {} move commands in one batch'.format(len(move_cmds)))
+
+    def create_constraints(self, goal_to_constraints, move_cmd):
+        """
+        Creates the constraints of move_cmd like GoalToConstraints in a fork of the god map.
+        :type goal_to_constraints: GoalToConstraints
+        :type move_cmd: MoveCmd
+        :rtype: giskardpy.god_map.GodMap
+        """
+        god_map = self.get_god_map().fork()
+        # constraints change this dict in place
+        god_map.set_data(identifier.added_collision_checks, {})
+        goal_to_constraints.god_map = god_map
+        goal_to_constraints.init_constraints(move_cmd)
+        goal_to_constraints.parse_constraints(move_cmd)
+        goal_to_constraints.publish_constraints(move_cmd)
+        return god_map
+
+    def compile_controller(self, god_map):
+        """
+        :param god_map: contains the constraints, see create_constraints
+        :type god_map: giskardpy.god_map.GodMap
+        :rtype: InstantaneousController
+        """
+        robot = self.get_robot()
+        if god_map.get_data(identifier.enable_on_disk_controller_cache):
+            controller_cache = ControllerCache(god_map.get_data(identifier.on_disk_controller_cache_max_size))
+        else:
+            controller_cache = None
+        controller = InstantaneousController(robot,
+                                             u'{}/{}/'.format(god_map.get_data(identifier.data_folder),
+                                                              robot.get_name()),
+                                             god_map.get_data(identifier.qp_solver_name),
+                                             god_map.get_data(identifier.qp_solver_fixed_dimension),
+                                             controller_cache)
+        joint_to_symbols_str = OrderedDict((x, robot.get_joint_position_symbol(x)) for x in robot.controlled_joints)
+        controller.update_constraints(joint_to_symbols_str,
+                                      god_map.get_data(identifier.soft_constraint_identifier),
+                                      god_map.get_data(identifier.joint_constraint_identifier),
+                                      god_map.get_data(identifier.hard_constraint_identifier),
+                                      god_map.get_data(identifier.soft_constraint_blocks_identifier))
+        controller.compile()
+        return controller
 
     def is_plan(self, goal_type, plan_code=1):
         return plan_code in self.get_set_bits(goal_type)
@@ -13,6 +13,7 @@ from rospy_message_converter.message_converter import convert_ros_message_to_dic
 
 import giskardpy.constraints
 import giskardpy.identifier as identifier
+from giskardpy.complexity_report import ComplexityReport
 from giskardpy.constraints import SelfCollisionAvoidance, ExternalCollisionAvoidance
 from giskardpy.data_types import JointConstraint
 from giskardpy.exceptions import ImplementationException, UnknownConstraintException, InvalidGoalException, \
@@ -37,6 +38,8 @@ class GoalToConstraints(GetGoal):
         self.rc_continuous_velocity = self.get_god_map().get_data(identifier.rc_continuous_velocity)
         self.rc_revolute_velocity = self.get_god_map().get_data(identifier.rc_revolute_velocity)
         self.rc_other_velocity = self.get_god_map().get_data(identifier.rc_other_velocity)
+        self.enable_complexity_report = self.get_god_map().get_data(identifier.enable_complexity_report)
+        self.complexity_report = None
 
     def initialise(self):
         self.get_god_map().set_data(identifier.collision_goal, None)
@@ -50,14 +53,7 @@ class GoalToConstraints(GetGoal):
         if not move_cmd:
             return Status.FAILURE
 
-        self.get_god_map().set_data(identifier.constraints_identifier, {})
-
-        self.get_robot()._create_constraints(self.get_god_map())
-
-        self.soft_constraints = {}
-        if not (self.get_god_map().get_data(identifier.check_reachability)):
-            self.get_god_map().set_data(identifier.maximum_collision_threshold, 0)
-            self.add_collision_avoidance_soft_constraints(move_cmd.collisions)
+        self.init_constraints(move_cmd)
 
         try:
             self.parse_constraints(move_cmd)
@@ -70,9 +66,37 @@ class GoalToConstraints(GetGoal):
             traceback.print_exc()
             return Status.SUCCESS
 
+        self.publish_constraints(move_cmd)
+        self.get_blackboard().runtime = time()
+        return Status.SUCCESS
+
+    def init_constraints(self, move_cmd):
+        """
+        Resets the constraints on the god map and adds the collision avoidance constraints.
+        :type move_cmd: MoveCmd
+        """
+        self.get_god_map().set_data(identifier.constraints_identifier, {})
+
+        self.get_robot()._create_constraints(self.get_god_map())
+
+        self.soft_constraints = {}
+        # groups of soft constraints that get compiled together, see QProblemBuilder.compile_blocks
+        self.soft_constraint_blocks = OrderedDict()
+        if self.enable_complexity_report:
+            self.complexity_report = ComplexityReport()
+        if not (self.get_god_map().get_data(identifier.check_reachability)):
+            self.get_god_map().set_data(identifier.maximum_collision_threshold, 0)
+            self.add_collision_avoidance_soft_constraints(move_cmd.collisions)
+
+    def publish_constraints(self, move_cmd):
+        """
+        Saves the soft constraints of the goal and the joint and hard constraints on the god map.
+        :type move_cmd: MoveCmd
+        """
         self.get_god_map().set_data(identifier.collision_goal, move_cmd.collisions)
         self.get_god_map().set_data(identifier.soft_constraint_identifier, self.soft_constraints)
-        self.get_blackboard().runtime = time()
+        self.get_god_map().set_data(identifier.soft_constraint_blocks_identifier, self.soft_constraint_blocks)
+        self.get_god_map().set_data(identifier.complexity_report, self.complexity_report)
 
         controlled_joints = self.get_robot().controlled_joints
 
@@ -117,8 +141,6 @@ class GoalToConstraints(GetGoal):
         self.get_god_map().set_data(identifier.joint_constraint_identifier, joint_constraints)
         self.get_god_map().set_data(identifier.hard_constraint_identifier, hard_constraints)
 
-        return Status.SUCCESS
-
     def parse_constraints(self, cmd):
         """
         :type cmd: MoveCmd
@@ -145,6 +167,7 @@ class GoalToConstraints(GetGoal):
                         u'unknown constraint {}. available constraint types:\n{}'.format(constraint.type,
                                                                                          available_constraints))
 
+            t = time()
             try:
                 if hasattr(constraint, u'parameter_value_pair'):
                     params = json.loads(constraint.parameter_value_pair)
@@ -165,6 +188,9 @@ class GoalToConstraints(GetGoal):
             try:
                 soft_constraints = c.get_constraints()
                 self.soft_constraints.update(soft_constraints)
+                self.soft_constraint_blocks.setdefault(str(c), []).extend(soft_constraints.keys())
+                if self.complexity_report is not None:
+                    self.complexity_report.add_goal(str(c), C.__name__, soft_constraints.keys(), time() - t)
             except Exception as e:
                 traceback.print_exc()
                 if not isinstance(e, GiskardException):
@@ -197,6 +223,7 @@ class GoalToConstraints(GetGoal):
             self.add_self_collision_avoidance_constraints()
 
     def add_external_collision_avoidance_constraints(self, soft_threshold_override=None):
+        t = time()
         soft_constraints = {}
         number_of_repeller = self.get_god_map().get_data(identifier.external_collision_avoidance_repeller)
         number_of_repeller_eef = self.get_god_map().get_data(identifier.external_collision_avoidance_repeller_eef)
@@ -246,9 +273,14 @@ class GoalToConstraints(GetGoal):
         num_external = len(soft_constraints)
         loginfo('adding {} external collision avoidance constraints'.format(num_external))
         self.soft_constraints.update(soft_constraints)
+        self.soft_constraint_blocks[u'external_collision_avoidance'] = list(soft_constraints.keys())
+        if self.complexity_report is not None:
+            self.complexity_report.add_goal(u'external_collision_avoidance', ExternalCollisionAvoidance.__name__,
+                                            soft_constraints.keys(), time() - t)
         self.get_god_map().set_data(identifier.maximum_collision_threshold, maximum_distance)
 
     def add_self_collision_avoidance_constraints(self):
+        t = time()
         counter = defaultdict(int)
         soft_constraints = {}
         number_of_repeller = self.get_god_map().get_data(identifier.self_collision_avoidance_repeller)
@@ -289,4 +321,8 @@ class GoalToConstraints(GetGoal):
                 soft_constraints.update(constraint.get_constraints())
         loginfo('adding {} self collision avoidance constraints'.format(len(soft_constraints)))
         self.soft_constraints.update(soft_constraints)
+        self.soft_constraint_blocks[u'self_collision_avoidance'] = list(soft_constraints.keys())
+        if self.complexity_report is not None:
+            self.complexity_report.add_goal(u'self_collision_avoidance', SelfCollisionAvoidance.__name__,
+                                            soft_constraints.keys(), time() - t)
         self.get_god_map().set_data(identifier.maximum_collision_threshold, maximum_distance)
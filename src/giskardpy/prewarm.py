@@ -0,0 +1,131 @@
+import json
+from collections import OrderedDict
+from threading import Thread
+from time import time
+
+from giskard_msgs.msg import MoveCmd, Constraint, CollisionEntry
+
+import giskardpy.identifier as identifier
+from giskardpy import logging
+from giskardpy.plugin_update_constraints import GoalToConstraints
+
+
+class ControllerPrewarmer(object):
+    """
+    Compiles the controllers of goal templates from the config file at startup and stores them in the caches of the
+    ControllerPlugin, such that the first goal with the same constraints does not have to compile them.
+    A template has a list of constraints, each with a type and parameters, and collision_avoidance, which adds the
+    default collision avoidance. Parameters that only determine the values of the constraints may be left out:
+    a missing goal_state becomes a joint state with all controlled joints and a missing goal a pose in root_link.
+    The constraints of a template are created with a fork of the god map, such that the first goal does not see them.
+    run blocks until all controllers are compiled, start runs it in a background thread, while the tree waits for goals.
+    The lock of the god map is held while the constraints of a template are created, because they change the robot and
+    read the world, but not while they are compiled. stop has to be called before the tree processes a goal, because
+    the ControllerPlugin must not be used by two threads, it waits for the current template and skips the others.
+    """
+
+    def __init__(self, god_map, action_server_name, controller_plugin):
+        """
+        :type god_map: giskardpy.god_map.GodMap
+        :param action_server_name: see GoalToConstraints
+        :type action_server_name: str
+        :param controller_plugin: its in memory controller cache, block cache and on disk controller cache get filled
+        :type controller_plugin: giskardpy.plugin_instantaneous_controller.ControllerPlugin
+        """
+        self.god_map = god_map
+        self.action_server_name = action_server_name
+        self.controller_plugin = controller_plugin
+        self.templates = god_map.get_data(identifier.prewarm_templates)
+        self.durations = OrderedDict()
+        self.thread = None
+        self.stopped = False
+
+    def start(self):
+        self.thread = Thread(target=self.run, name=u'controller prewarmer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+        Waits for the controller of the current template and skips the remaining ones.
+        """
+        self.stopped = True
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        if self.controller_plugin.controller_lru is None and self.controller_plugin.block_cache is None and \
+                self.controller_plugin.controller_cache is None:
+            logging.logwarn(u'prewarming controllers requires at least one controller cache, skipping it')
+            return
+        t = time()
+        for name, template in self.templates.items():
+            if self.stopped:
+                logging.loginfo(u'stopped prewarming controllers, because a goal arrived')
+                break
+            template_t = time()
+            try:
+                number_of_soft_constraints = self.prewarm(template)
+            except Exception as e:
+                logging.logwarn(u'failed to prewarm controller for template \'{}\': {}: {}'.format(
+                    name, e.__class__.__name__, e))
+                continue
+            self.durations[name] = time() - template_t
+            logging.loginfo(u'prewarmed controller for template \'{}\' with {} soft constraints in {:.3f}s'.format(
+                name, number_of_soft_constraints, self.durations[name]))
+        logging.loginfo(u'prewarmed {} of {} controllers in {:.3f}s: {}'.format(
+            len(self.durations), len(self.templates), time() - t,
+            u', '.join(u'{} ({:.3f}s)'.format(name, d) for name, d in self.durations.items())))
+
+    def make_move_cmd(self, template):
+        """
+        :type template: dict
+        :rtype: MoveCmd
+        """
+        robot = self.god_map.get_data(identifier.robot)
+        move_cmd = MoveCmd()
+        for constraint_template in template.get(u'constraints', []):
+            parameters = dict(constraint_template.get(u'parameters', {}))
+            if constraint_template[u'type'] == u'JointPositionList' and u'goal_state' not in parameters:
+                parameters[u'goal_state'] = {u'name': list(robot.controlled_joints),
+                                             u'position': [0.] * len(robot.controlled_joints)}
+            if u'root_link' in parameters and u'goal' not in parameters:
+                parameters[u'goal'] = {u'header': {u'frame_id': parameters[u'root_link']},
+                                       u'pose': {u'orientation': {u'w': 1.}}}
+            constraint = Constraint()
+            constraint.type = constraint_template[u'type']
+            constraint.parameter_value_pair = json.dumps(parameters)
+            move_cmd.constraints.append(constraint)
+        if not template.get(u'collision_avoidance', True):
+            collision_entry = CollisionEntry()
+            collision_entry.type = CollisionEntry.ALLOW_COLLISION
+            collision_entry.robot_links = [CollisionEntry.ALL]
+            collision_entry.body_b = CollisionEntry.ALL
+            collision_entry.link_bs = [CollisionEntry.ALL]
+            move_cmd.collisions.append(collision_entry)
+        return move_cmd
+
+    def prewarm(self, template):
+        """
+        Creates the constraints of template like GoalToConstraints and compiles them with the ControllerPlugin.
+        :type template: dict
+        :return: number of soft constraints
+        :rtype: int
+        """
+        god_map = self.god_map.fork()
+        # the fork gets its own lock, such that the lock of self.god_map can be held while it is used
+        god_map.set_concurrency()
+        # reads the god map of the blackboard
+        goal_to_constraints = GoalToConstraints(u'prewarm constraints', self.action_server_name)
+        goal_to_constraints.god_map = god_map
+        goal_to_constraints.enable_complexity_report = False
+        move_cmd = self.make_move_cmd(template)
+        with self.god_map:
+            # constraints change this dict in place
+            god_map.set_data(identifier.added_collision_checks, {})
+            goal_to_constraints.init_constraints(move_cmd)
+            goal_to_constraints.parse_constraints(move_cmd)
+            goal_to_constraints.publish_constraints(move_cmd)
+        self.controller_plugin.load_controller(god_map)
+        return len(god_map.get_data(identifier.soft_constraint_identifier))
@@ -143,6 +143,16 @@ class PyBulletWorld(World):
             plane.set_name(self.hack_name)
             self.add_object(plane)
 
+    def reload_into_bullet(self):
+        """
+        Loads all objects, including the hidden ones, and the robot into the current pybullet client,
+        see PyBulletWorldObject.reload_into_bullet.
+        """
+        for object_ in self._objects.values():
+            object_.reload_into_bullet()
+        if self._robot is not None:
+            self._robot.reload_into_bullet()
+
     def __move_hack(self, pose):
         self.get_object(self.hack_name).base_pose = pose
 
@@ -137,6 +137,20 @@ class PyBulletWorldObject(WorldObject):
             self.joint_state = joint_state
         activate_rendering()
 
+    def reload_into_bullet(self):
+        """
+        Loads the object with its current base pose and joint state into the current pybullet client, without
+        removing it from the old one, e.g. in a forked process that connected to its own client.
+        """
+        # the lock is shared with the parent process after a fork
+        self.lock = Lock()
+        with self.lock:
+            base_pose = self.base_pose
+            joint_state = self.joint_state
+            self._pybullet_id = load_urdf_string_into_bullet(self.get_urdf_str(), base_pose)
+            self.__sync_with_bullet()
+        self.joint_state = joint_state
+
     def suicide(self):
         if self._pybullet_id is not None:
             p.removeBody(self._pybullet_id)
@@ -91,6 +91,16 @@ def start_pybullet(gui):
     return server_id
 
 
+def is_direct_client():
+    """
+    :return: whether the current client runs the physics server in this process, such that a forked process gets
+             its own copy of it, instead of sharing it with a gui or over shared memory
+    :rtype: bool
+    """
+    connection_info = p.getConnectionInfo()
+    return bool(connection_info[u'isConnected']) and connection_info[u'connectionMethod'] == p.DIRECT
+
+
 def pybullet_pose_to_msg(pose):
     """
     :type pose: tuple
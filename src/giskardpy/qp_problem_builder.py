@@ -4,10 +4,12 @@ from time import time
 import numpy as np
 
 from giskardpy import logging, cas_wrapper as w
+from giskardpy.controller_blocks import ControllerBlock, BlockedBigAssM
 from giskardpy.data_types import SoftConstraint
 from giskardpy.exceptions import QPSolverException, InfeasibleException, OutOfJointLimitsException, \
     HardConstraintsViolatedException
-from giskardpy.qp_solver import QPSolver
+from giskardpy.qp_solver import get_qp_solver
+from giskardpy.timing import NullStageTimer
 from giskardpy.utils import make_filter_masks, create_path
 
 
@@ -15,16 +17,43 @@ class QProblemBuilder(object):
     """
     Wraps around QPOases. Builds the required matrices from constraints.
     """
+    INFTY = 1e20
+    # replaces the weight of relaxed constraints, such that H stays positive definite
+    NEUTRAL_WEIGHT = 1.
 
     def __init__(self, joint_constraints_dict, hard_constraints_dict, soft_constraints_dict, controlled_joint_symbols,
-                 path_to_functions=''):
+                 path_to_functions='', qp_solver_name=u'qpoases', fixed_dimension=False, qp_solver=None,
+                 timer=None, controller_cache=None, soft_constraint_blocks=None, block_cache=None,
+                 complexity_report=None):
         """
         :type joint_constraints_dict: dict
         :type hard_constraints_dict: dict
         :type soft_constraints_dict: dict
         :type controlled_joint_symbols: list
-        :param path_to_functions: location where the compiled functions can be safed.
+        :param path_to_functions: location where the compiled functions can be safed, has to be unique for the names
+                                  and order of the constraints and the robot
         :type path_to_functions: str
+        :param qp_solver_name: name of the qp solver backend, see giskardpy.qp_solver.get_qp_solver
+        :type qp_solver_name: str
+        :param fixed_dimension: if True, constraints with zero weight are relaxed instead of removed, such that the
+                                qp problem keeps its shape and the qp solver can hotstart when constraints turn on/off,
+                                only used by dense qp solvers
+        :type fixed_dimension: bool
+        :param qp_solver: reuse this qp solver instead of creating a new one, e.g. to hotstart from its working set
+        :type qp_solver: giskardpy.qp_solver.BaseQPSolver
+        :param timer: records the time of the stages evaluate, filter and solve of get_cmd
+        :type timer: giskardpy.timing.StageTimer
+        :param controller_cache: if not None, the compiled big_ass_M is loaded from/saved to path_to_functions
+        :type controller_cache: giskardpy.controller_cache.ControllerCache
+        :param soft_constraint_blocks: maps names of blocks to the names of their soft constraints, e.g. one block
+                                       per goal, only used with block_cache
+        :type soft_constraint_blocks: OrderedDict
+        :param block_cache: if not None, big_ass_M is compiled in blocks, which are reused for constraints that
+                            have already been compiled for a previous controller, see compile_blocks
+        :type block_cache: giskardpy.controller_blocks.BlockCache
+        :param complexity_report: if not None, the size of the soft constraints and the compile time of each block
+                                  are added to it
+        :type complexity_report: giskardpy.complexity_report.ComplexityReport
         """
         assert (not len(controlled_joint_symbols) > len(joint_constraints_dict))
         assert (not len(controlled_joint_symbols) < len(joint_constraints_dict))
@@ -34,8 +63,23 @@ class QProblemBuilder(object):
         self.hard_constraints_dict = hard_constraints_dict
         self.soft_constraints_dict = soft_constraints_dict
         self.controlled_joints = controlled_joint_symbols
-        self.construct_big_ass_M()
-        self.compile_big_ass_M()
+        self.fixed_dimension = fixed_dimension
+        if timer is None:
+            timer = NullStageTimer()
+        self.timer = timer
+        self.controller_cache = controller_cache
+        self.soft_constraint_blocks = soft_constraint_blocks
+        self.block_cache = block_cache
+        self.complexity_report = complexity_report
+        if self.complexity_report is not None:
+            self.complexity_report.add_soft_constraints(self.soft_constraints_dict, self.controlled_joints)
+        if not self.load_big_ass_M():
+            if self.block_cache is None:
+                self.construct_big_ass_M()
+                self.compile_big_ass_M()
+            else:
+                self.compile_blocks()
+            self.save_big_ass_M()
 
         self.shape1 = len(self.hard_constraints_dict) + len(self.soft_constraints_dict)
         self.shape2 = len(self.joint_constraints_dict) + len(self.soft_constraints_dict)
@@ -44,12 +88,22 @@ class QProblemBuilder(object):
         self.num_joint_constraints = len(self.joint_constraints_dict)
         self.num_soft_constraints = len(self.soft_constraints_dict)
 
-        self.qp_solver = QPSolver()
+        if qp_solver is None:
+            qp_solver = get_qp_solver(qp_solver_name)
+        self.qp_solver = qp_solver
+        self.init_qp_buffers()
         self.lbAs = None  # for debugging purposes
 
     def get_expr(self):
         return self.compiled_big_ass_M.str_params
 
+    def get_input_buffer(self):
+        """
+        :return: the parameter values of compiled_big_ass_M in the order of get_expr, get_cmd(None) uses them
+        :rtype: np.ndarray
+        """
+        return self.compiled_big_ass_M.args
+
     def construct_big_ass_M(self):
         # TODO cpu intensive
         weights = []
@@ -104,26 +158,190 @@ class QProblemBuilder(object):
         t = time()
         self.free_symbols = w.free_symbols(self.big_ass_M)
         self.compiled_big_ass_M = w.speed_up(self.big_ass_M,
-                                             self.free_symbols)
-        logging.loginfo(u'compiled symbolic expressions in {:.5f}s'.format(time() - t))
+                                             self.free_symbols,
+                                             split=True)
+        if self.complexity_report is not None:
+            self.complexity_report.add_block(u'big_ass_M', self.j + self.h + self.s, time() - t,
+                                             w.number_of_nodes(self.big_ass_M))
+        logging.loginfo(u'compiled symbolic expressions in {:.5f}s; {} of {} entries are not constant'.format(
+            time() - t, len(self.compiled_big_ass_M.indices), self.big_ass_M.shape[0] * self.big_ass_M.shape[1]))
+
+    def get_blocks(self):
+        """
+        :return: one tuple (joint constraint names, hard constraint names, soft constraint names) per block,
+                 the joint and hard constraints form one block and soft constraints that are not part of
+                 soft_constraint_blocks another one
+        :rtype: list
+        """
+        blocks = [(list(self.joint_constraints_dict.keys()), list(self.hard_constraints_dict.keys()), [])]
+        remaining = OrderedDict((name, None) for name in self.soft_constraints_dict)
+        if self.soft_constraint_blocks is not None:
+            for soft_constraint_names in self.soft_constraint_blocks.values():
+                soft_constraint_names = [name for name in soft_constraint_names if name in remaining]
+                for name in soft_constraint_names:
+                    del remaining[name]
+                if soft_constraint_names:
+                    blocks.append(([], [], soft_constraint_names))
+        if remaining:
+            blocks.append(([], [], list(remaining.keys())))
+        return blocks
+
+    def get_block_key(self, joint_constraint_names, hard_constraint_names, soft_constraint_names):
+        """
+        Constraints are identified by their contents, because constraints with the same name can have other
+        expressions or constants, e.g. those of the reachability check or of a hard and a soft
+        CartesianVelocityLimit.
+        :rtype: tuple
+        """
+        return (tuple(str(x) for x in self.controlled_joints),
+                tuple(str(self.joint_constraints_dict[name]) for name in joint_constraint_names),
+                tuple(str(self.hard_constraints_dict[name]) for name in hard_constraint_names),
+                tuple(str(self.soft_constraints_dict[name]) for name in soft_constraint_names))
+
+    def compile_block(self, joint_constraint_names, hard_constraint_names, soft_constraint_names):
+        """
+        :rtype: ControllerBlock
+        """
+        # lbA, ubA, weight, lb, ub, g
+        columns = [[], [], [], [], [], []]
+        expressions = []
+        for name in joint_constraint_names:
+            constraint = self.joint_constraints_dict[name]
+            for column, value in zip(columns, [0, 0, constraint.weight, constraint.lower, constraint.upper,
+                                               constraint.linear_weight]):
+                column.append(value)
+        for name in hard_constraint_names:
+            constraint = self.hard_constraints_dict[name]
+            for column, value in zip(columns, [constraint.lower, constraint.upper, 0, 0, 0, 0]):
+                column.append(value)
+            expressions.append(constraint.expression)
+        for name in soft_constraint_names:
+            constraint = self.soft_constraints_dict[name]
+            for column, value in zip(columns, [constraint.lbA, constraint.ubA, constraint.weight,
+                                               constraint.lower_slack_limit, constraint.upper_slack_limit,
+                                               constraint.linear_weight]):
+                column.append(value)
+            assert not w.is_matrix(constraint.expression), u'Matrices are not allowed as soft constraint expression'
+            expressions.append(constraint.expression)
+
+        local_M = w.zeros(len(columns[0]), self.j + 6)
+        if expressions:
+            jacobian, _, _ = w.parallel_jacobian(w.Matrix(expressions), self.controlled_joints)
+            local_M[len(joint_constraint_names):, :self.j] = jacobian
+            A_nonzeros = w.nonzero_indices(jacobian)
+        else:
+            A_nonzeros = np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        for i, column in enumerate(columns):
+            local_M[:, self.j + i] = w.Matrix(column)
+        compiled = w.speed_up(local_M, w.free_symbols(local_M), split=True)
+        return ControllerBlock(compiled, len(joint_constraint_names), len(hard_constraint_names),
+                               len(soft_constraint_names), A_nonzeros)
+
+    def compile_blocks(self):
+        """
+        Creates compiled_big_ass_M out of independently compiled blocks, see BlockedBigAssM.
+        Only the blocks that are not in the block cache get compiled.
+        """
+        t = time()
+        self.h = len(self.hard_constraints_dict)
+        self.s = len(self.soft_constraints_dict)
+        self.j = len(self.joint_constraints_dict)
+        joint_indices = {name: i for i, name in enumerate(self.joint_constraints_dict)}
+        hard_indices = {name: i for i, name in enumerate(self.hard_constraints_dict)}
+        soft_indices = {name: i for i, name in enumerate(self.soft_constraints_dict)}
+        blocks = []
+        hard_rows, hard_cols, soft_rows, soft_cols = [], [], [], []
+        number_of_compiled_blocks = 0
+        for joint_constraint_names, hard_constraint_names, soft_constraint_names in self.get_blocks():
+            key = self.get_block_key(joint_constraint_names, hard_constraint_names, soft_constraint_names)
+            block = self.block_cache.get(key)
+            if block is None:
+                block_t = time()
+                block = self.compile_block(joint_constraint_names, hard_constraint_names, soft_constraint_names)
+                compile_time = time() - block_t
+                self.block_cache.put(key, block)
+                number_of_compiled_blocks += 1
+            else:
+                compile_time = None
+            if self.complexity_report is not None:
+                self.complexity_report.add_block(
+                    self.complexity_report.get_goal_name(soft_constraint_names),
+                    len(joint_constraint_names) + len(hard_constraint_names) + len(soft_constraint_names),
+                    compile_time, block.compiled.fast_f.n_nodes())
+            hard = np.array([hard_indices[name] for name in hard_constraint_names], dtype=int)
+            soft = np.array([soft_indices[name] for name in soft_constraint_names], dtype=int)
+            blocks.append((block, [joint_indices[name] for name in joint_constraint_names], hard, soft))
+            rows, cols = block.A_nonzeros
+            is_hard = rows < len(hard)
+            hard_rows.append(hard[rows[is_hard]])
+            hard_cols.append(cols[is_hard])
+            soft_rows.append(soft[rows[~is_hard] - len(hard)])
+            soft_cols.append(cols[~is_hard])
+        self.compiled_big_ass_M = BlockedBigAssM.from_blocks(blocks, self.h, self.s, self.j)
+        self.A_hard_nonzeros = np.concatenate(hard_rows), np.concatenate(hard_cols)
+        self.A_soft_nonzeros = np.concatenate(soft_rows), np.concatenate(soft_cols)
+        self.init_A_nonzeros()
+        logging.loginfo(u'compiled {} of {} blocks in {:.5f}s; {} of {} entries are not constant'.format(
+            number_of_compiled_blocks, len(blocks), time() - t, len(self.compiled_big_ass_M.indices),
+            self.compiled_big_ass_M.shape[0] * self.compiled_big_ass_M.shape[1]))
+
+    def load_big_ass_M(self):
+        """
+        Loads the compiled big_ass_M and its meta data from the controller cache.
+        :return: whether a matching entry was found
+        :rtype: bool
+        """
+        if self.controller_cache is None or not self.path_to_functions:
+            return False
+        t = time()
+        data = self.controller_cache.load(self.path_to_functions)
+        if data is None:
+            return False
+        self.h = len(self.hard_constraints_dict)
+        self.s = len(self.soft_constraints_dict)
+        self.j = len(self.joint_constraints_dict)
+        if data[u'shape'] != (self.h, self.s, self.j):
+            logging.logwarn(u'ignoring cached controller {}, because it has a different shape'.format(
+                self.path_to_functions))
+            return False
+        self.compiled_big_ass_M = data[u'compiled_big_ass_M']
+        self.A_hard_nonzeros = data[u'A_hard_nonzeros']
+        self.A_soft_nonzeros = data[u'A_soft_nonzeros']
+        self.init_A_nonzeros()
+        logging.loginfo(u'loaded controller with {} soft constraints from cache in {:.5f}s'.format(self.s,
+                                                                                                 time() - t))
+        return True
+
+    def save_big_ass_M(self):
+        if self.controller_cache is None or not self.path_to_functions:
+            return
+        self.controller_cache.save(self.path_to_functions, {u'shape': (self.h, self.s, self.j),
+                                                            u'compiled_big_ass_M': self.compiled_big_ass_M,
+                                                            u'A_hard_nonzeros': self.A_hard_nonzeros,
+                                                            u'A_soft_nonzeros': self.A_soft_nonzeros})
 
     def init_big_ass_M(self):
         """
-        #        j           s       1      1     1
-        #    |--------------------------------------|
-        # h  | A hard    |   0    |       |     |   |
-        #    | -------------------| lbA   | ubA | 0 |
-        # s  | A soft    |identity|       |     |   |
-        #    |--------------------------------------|
-        # j+s| H                  | lb    | ub  | g |
-        #    | -------------------------------------|
+        #        j           s       1      1
+        #    |-----------------------------------|
+        # h  | A hard    |   0    |       |     |
+        #    | -------------------| lbA   | ubA |
+        # s  | A soft    |identity|       |     |
+        #    |-----------------------------------|
+        # 1  | weights            |   0   |  0  |
+        # 1  | lb                 |   0   |  0  |
+        # 1  | ub                 |   0   |  0  |
+        # 1  | g                  |   0   |  0  |
+        #    |-----------------------------------|
+        H is always diagonal, so only its diagonal, the weights, is part of big_ass_M.
         """
-        self.big_ass_M = w.zeros(self.h + self.s * 2 + self.j,
-                                 self.j + self.s + 3)
+        self.big_ass_M = w.zeros(self.h + self.s + 4,
+                                 self.j + self.s + 2)
 
     def construct_A_hard(self, hard_expressions):
         A_hard = w.Matrix(hard_expressions)
         A_hard = w.jacobian(A_hard, self.controlled_joints)
+        self.A_hard_nonzeros = w.nonzero_indices(A_hard)
         self.set_A_hard(A_hard)
 
     def set_A_hard(self, A_hard):
@@ -132,10 +350,30 @@ class QProblemBuilder(object):
     def construct_A_soft(self, soft_expressions):
         A_soft = w.zeros(self.s, self.j + self.s)
         t = time()
-        A_soft[:, :self.j] = w.jacobian(w.Matrix(soft_expressions), self.controlled_joints)
-        logging.loginfo(u'computed Jacobian in {:.5f}s'.format(time() - t))
+        jacobian, sequential_time, number_of_groups = w.parallel_jacobian(w.Matrix(soft_expressions),
+                                                                          self.controlled_joints)
+        if number_of_groups > 1:
+            logging.loginfo(u'computed Jacobian in {:.5f}s with {} processes; {:.2f} times faster than the {:.5f}s '
+                            u'they needed together'.format(time() - t, number_of_groups,
+                                                           sequential_time / (time() - t), sequential_time))
+        else:
+            logging.loginfo(u'computed Jacobian in {:.5f}s'.format(time() - t))
+        A_soft[:, :self.j] = jacobian
         A_soft[:, self.j:] = w.eye(self.s)
+        self.A_soft_nonzeros = w.nonzero_indices(jacobian)
         self.set_A_soft(A_soft)
+        self.init_A_nonzeros()
+
+    def init_A_nonzeros(self):
+        """
+        Combines the structural non zeros of A hard, A soft and the slack identity,
+        used to build a sparse A for solvers that support it.
+        """
+        soft_rows, soft_cols = self.A_soft_nonzeros
+        slack = np.arange(self.s)
+        rows = np.concatenate((self.A_hard_nonzeros[0], soft_rows + self.h, slack + self.h))
+        cols = np.concatenate((self.A_hard_nonzeros[1], soft_cols, slack + self.j))
+        self.A_nonzeros = rows, cols
 
     def set_A_soft(self, A_soft):
         self.big_ass_M[self.h:self.h + self.s, :self.j + self.s] = A_soft
@@ -147,16 +385,16 @@ class QProblemBuilder(object):
         self.big_ass_M[:self.h + self.s, self.j + self.s + 1] = ubA
 
     def set_lb(self, lb):
-        self.big_ass_M[self.h + self.s:, self.j + self.s] = lb
+        self.big_ass_M[self.h + self.s + 1, :self.j + self.s] = lb.T
 
     def set_ub(self, ub):
-        self.big_ass_M[self.h + self.s:, self.j + self.s + 1] = ub
+        self.big_ass_M[self.h + self.s + 2, :self.j + self.s] = ub.T
 
     def set_linear_weights(self, linear_weights):
-        self.big_ass_M[self.h + self.s:, self.j + self.s + 2] = linear_weights
+        self.big_ass_M[self.h + self.s + 3, :self.j + self.s] = linear_weights.T
 
     def set_weights(self, weights):
-        self.big_ass_M[self.h + self.s:, :-3] = w.diag(*weights)
+        self.big_ass_M[self.h + self.s, :self.j + self.s] = w.Matrix(weights).T
 
     def debug_print(self, unfiltered_H, A, lb, ub, lbA, ubA, g, xdot_full=None, actually_print=False):
         import pandas as pd
@@ -180,22 +418,22 @@ class QProblemBuilder(object):
         b_names = np.array(b_names)
         filtered_b_names = b_names[b_mask]
         filtered_bA_names = np.array(bA_names)[bA_mask]
-        filtered_H = unfiltered_H[b_mask][:,b_mask]
+        filtered_H = unfiltered_H[b_mask]
 
         p_lb = pd.DataFrame(lb, filtered_b_names, [u'data'], dtype=float).sort_index()
         p_ub = pd.DataFrame(ub, filtered_b_names, [u'data'], dtype=float).sort_index()
         p_g = pd.DataFrame(g, filtered_b_names, [u'data'], dtype=float).sort_index()
         p_lbA = pd.DataFrame(lbA, filtered_bA_names, [u'data'], dtype=float).sort_index()
         p_ubA = pd.DataFrame(ubA, filtered_bA_names, [u'data'], dtype=float).sort_index()
-        p_weights = pd.DataFrame(unfiltered_H.dot(np.ones(unfiltered_H.shape[0])), b_names, [u'data'], dtype=float).sort_index()
+        p_weights = pd.DataFrame(unfiltered_H, b_names, [u'data'], dtype=float).sort_index()
         if xdot_full is not None:
             p_xdot = pd.DataFrame(xdot_full, filtered_b_names, [u'data'], dtype=float).sort_index()
             Ax = np.dot(A, xdot_full)
             p_Ax = pd.DataFrame(Ax, filtered_bA_names, [u'data'], dtype=float).sort_index()
-            xH = np.dot((xdot_full**2).T, filtered_H)
+            xH = xdot_full**2 * filtered_H
             p_xH = pd.DataFrame(xH, filtered_b_names, [u'data'], dtype=float).sort_index()
             p_xg = p_g * p_xdot
-            xHx = np.dot(np.dot(xdot_full.T, filtered_H), xdot_full)
+            xHx = np.dot(xdot_full**2, filtered_H)
             x_soft = xdot_full[len(xdot_full) - len(lbA):]
             p_lbA_minus_x = pd.DataFrame(lbA - x_soft, filtered_bA_names, [u'data'], dtype=float).sort_index()
             p_ubA_minus_x = pd.DataFrame(ubA - x_soft, filtered_bA_names, [u'data'], dtype=float).sort_index()
@@ -246,7 +484,18 @@ class QProblemBuilder(object):
             with pd.option_context('display.max_rows', None, 'display.max_columns', None):
                 print(array)
 
+    def get_filter_masks(self):
+        """
+        :return: masks of the rows and columns of A that are not filtered in the last evaluated big_ass_M
+        :rtype: tuple
+        """
+        return make_filter_masks(self.np_H, self.num_joint_constraints, self.num_hard_constraints)
+
     def filter_zero_weight_constraints(self, H, A, lb, ub, lbA, ubA, g):
+        """
+        :param H: diagonal of the weight matrix
+        :type H: np.ndarray
+        """
         bA_mask, b_mask = make_filter_masks(H, self.num_joint_constraints, self.num_hard_constraints)
         A = A[bA_mask][:, b_mask].copy()
         lbA = lbA[bA_mask]
@@ -254,30 +503,194 @@ class QProblemBuilder(object):
         lb = lb[b_mask]
         ub = ub[b_mask]
         g = g[b_mask]
-        H = H[b_mask][:, b_mask]
+        H = H[b_mask]
         return H, A, lb, ub, lbA, ubA, g
 
+    def filter_zero_weight_constraints_sparse(self, H, A, lb, ub, lbA, ubA, g):
+        """
+        Same as filter_zero_weight_constraints, but only copies the structural non zeros of A.
+        :return: A as scipy.sparse.csc_matrix
+        """
+        # scipy is only required by sparse qp solvers, like osqp
+        from scipy import sparse
+        bA_mask, b_mask = make_filter_masks(H, self.num_joint_constraints, self.num_hard_constraints)
+        rows, cols = self.A_nonzeros
+        keep = bA_mask[rows] & b_mask[cols]
+        rows = rows[keep]
+        cols = cols[keep]
+        A = sparse.csc_matrix((A[rows, cols], (np.cumsum(bA_mask)[rows] - 1, np.cumsum(b_mask)[cols] - 1)),
+                              shape=(bA_mask.sum(), b_mask.sum()))
+        return H[b_mask], A, lb[b_mask], ub[b_mask], lbA[bA_mask], ubA[bA_mask], g[b_mask]
+
+    def flat_indices(self, rows, cols):
+        """
+        :return: indices of the entries in the column major flattened evaluated big_ass_M
+        :rtype: np.ndarray
+        """
+        return rows + cols * self.compiled_big_ass_M.shape[0]
+
+    def split_big_ass_M(self, np_big_ass_M):
+        """
+        :param np_big_ass_M: evaluated big_ass_M
+        :type np_big_ass_M: np.ndarray
+        :return: views on H, A, lb, ub, lbA, ubA, g
+        :rtype: tuple
+        """
+        return np_big_ass_M[self.shape1, :self.shape2], \
+               np_big_ass_M[:self.shape1, :self.shape2], \
+               np_big_ass_M[self.shape1 + 1, :self.shape2], \
+               np_big_ass_M[self.shape1 + 2, :self.shape2], \
+               np_big_ass_M[:self.shape1, self.shape2], \
+               np_big_ass_M[:self.shape1, self.shape2 + 1], \
+               np_big_ass_M[self.shape1 + 3, :self.shape2]
+
+    def init_qp_buffers(self):
+        """
+        Creates views on the evaluated big_ass_M and preallocates buffers for the filtered qp problem,
+        which are big enough for the case that no constraint gets filtered.
+        """
+        np_big_ass_M = self.compiled_big_ass_M.out
+        self.np_big_ass_M_flat = np_big_ass_M.reshape(-1, order='F')
+        self.np_H, self.np_A, self.np_lb, self.np_ub, self.np_lbA, self.np_ubA, self.np_g = \
+            self.split_big_ass_M(np_big_ass_M)
+
+        self.H_buffer = np.zeros(self.shape2)
+        self.A_buffer = np.zeros(self.shape1 * self.shape2)
+        self.lb_buffer = np.zeros(self.shape2)
+        self.ub_buffer = np.zeros(self.shape2)
+        self.g_buffer = np.zeros(self.shape2)
+        self.lbA_buffer = np.zeros(self.shape1)
+        self.ubA_buffer = np.zeros(self.shape1)
+        self.b_mask = None
+
+    def update_filter_indices(self, bA_mask, b_mask):
+        """
+        Computes which entries of the evaluated big_ass_M are needed for the filtered qp problem and
+        points the qp arrays to correctly sized views of the buffers.
+        Only called when the set of constraints with non zero weight changes.
+        """
+        self.b_mask = b_mask
+        b = np.where(b_mask)[0]
+        bA = np.where(bA_mask)[0]
+        n = len(b)
+        m = len(bA)
+        self.H_indices = self.flat_indices(self.shape1, b)
+        self.A_indices = self.flat_indices(bA[:, None], b[None, :])
+        self.lb_indices = self.flat_indices(self.shape1 + 1, b)
+        self.ub_indices = self.flat_indices(self.shape1 + 2, b)
+        self.g_indices = self.flat_indices(self.shape1 + 3, b)
+        self.lbA_indices = self.flat_indices(bA, self.shape2)
+        self.ubA_indices = self.flat_indices(bA, self.shape2 + 1)
+        self.H = self.H_buffer[:n]
+        self.A = self.A_buffer[:m * n].reshape(m, n)
+        self.lb = self.lb_buffer[:n]
+        self.ub = self.ub_buffer[:n]
+        self.g = self.g_buffer[:n]
+        self.lbA = self.lbA_buffer[:m]
+        self.ubA = self.ubA_buffer[:m]
+
+    def filter_zero_weight_constraints_inplace(self):
+        """
+        Same as filter_zero_weight_constraints, but writes the result into preallocated buffers,
+        instead of creating new arrays every time.
+        The returned arrays are only valid until the next call.
+        """
+        flat = self.np_big_ass_M_flat
+        bA_mask, b_mask = make_filter_masks(self.np_H, self.num_joint_constraints, self.num_hard_constraints)
+        if self.b_mask is None or not np.array_equal(self.b_mask, b_mask):
+            self.update_filter_indices(bA_mask, b_mask)
+        np.take(flat, self.H_indices, out=self.H, mode='clip')
+        np.take(flat, self.A_indices, out=self.A, mode='clip')
+        np.take(flat, self.lb_indices, out=self.lb, mode='clip')
+        np.take(flat, self.ub_indices, out=self.ub, mode='clip')
+        np.take(flat, self.g_indices, out=self.g, mode='clip')
+        np.take(flat, self.lbA_indices, out=self.lbA, mode='clip')
+        np.take(flat, self.ubA_indices, out=self.ubA, mode='clip')
+        return self.H, self.A, self.lb, self.ub, self.lbA, self.ubA, self.g
+
+    def update_relax_indices(self, bA_mask, b_mask):
+        """
+        Same as update_filter_indices, but for relax_zero_weight_constraints_inplace.
+        """
+        self.b_mask = b_mask
+        self.inactive_b = np.where(~b_mask)[0]
+        self.inactive_bA = np.where(~bA_mask)[0]
+        self.H = self.H_buffer
+        self.A = self.A_buffer.reshape(self.shape1, self.shape2)
+        self.lb = self.lb_buffer
+        self.ub = self.ub_buffer
+        self.g = self.g_buffer
+        self.lbA = self.lbA_buffer
+        self.ubA = self.ubA_buffer
+
+    def relax_zero_weight_constraints_inplace(self):
+        """
+        Alternative to filter_zero_weight_constraints_inplace, which keeps the shape of the qp problem constant.
+        Joint constraints and slack variables with zero weight get a neutral weight and are fixed to 0,
+        rows of soft constraints with zero weight get infinite bounds.
+        The returned arrays are only valid until the next call.
+        """
+        bA_mask, b_mask = make_filter_masks(self.np_H, self.num_joint_constraints, self.num_hard_constraints)
+        if self.b_mask is None or not np.array_equal(self.b_mask, b_mask):
+            self.update_relax_indices(bA_mask, b_mask)
+        inactive_b = self.inactive_b
+        inactive_bA = self.inactive_bA
+        np.copyto(self.H, self.np_H)
+        np.copyto(self.A, self.np_A)
+        np.copyto(self.lb, self.np_lb)
+        np.copyto(self.ub, self.np_ub)
+        np.copyto(self.g, self.np_g)
+        np.copyto(self.lbA, self.np_lbA)
+        np.copyto(self.ubA, self.np_ubA)
+        self.H[inactive_b] = self.NEUTRAL_WEIGHT
+        self.A[inactive_bA] = 0
+        self.A[:, inactive_b] = 0
+        self.lb[inactive_b] = 0
+        self.ub[inactive_b] = 0
+        self.g[inactive_b] = 0
+        self.lbA[inactive_bA] = -self.INFTY
+        self.ubA[inactive_bA] = self.INFTY
+        return self.H, self.A, self.lb, self.ub, self.lbA, self.ubA, self.g
+
     def get_cmd(self, substitutions, nWSR=None):
         """
         Uses substitutions for each symbol to compute the next commands for each joint.
-        :param substitutions:
+        :param substitutions: if None, the values that are already in get_input_buffer() are used
         :type substitutions: list
-        :return: joint name -> joint command
-        :rtype: dict
-        """
-        np_big_ass_M = self.compiled_big_ass_M.call2(substitutions)
-        np_H = np_big_ass_M[self.shape1:, :-3].copy()
-        np_A = np_big_ass_M[:self.shape1, :self.shape2].copy()
-        np_lb = np_big_ass_M[self.shape1:, -3].copy()
-        np_ub = np_big_ass_M[self.shape1:, -2].copy()
-        np_g = np_big_ass_M[self.shape1:, -1].copy()
-        np_lbA = np_big_ass_M[:self.shape1, -3].copy()
-        np_ubA = np_big_ass_M[:self.shape1, -2].copy()
-        H, A, lb, ub, lbA, ubA, g = self.filter_zero_weight_constraints(np_H, np_A, np_lb, np_ub, np_lbA, np_ubA, np_g)
+        :return: joint name -> joint command, H, A, lb, ub, lbA, ubA, xdot_full;
+                 the arrays are views on buffers, which get overwritten by the next call
+        :rtype: tuple
+        """
+        if substitutions is None:
+            self.compiled_big_ass_M.evaluate()
+        else:
+            self.compiled_big_ass_M.call2(substitutions)
+        self.timer.stage_done(u'evaluate')
+        # views on the evaluated big_ass_M, they get overwritten by the next call
+        np_H = self.np_H
+        np_A = self.np_A
+        np_lb = self.np_lb
+        np_ub = self.np_ub
+        np_lbA = self.np_lbA
+        np_ubA = self.np_ubA
+        if self.qp_solver.sparse:
+            H, A, lb, ub, lbA, ubA, g = self.filter_zero_weight_constraints_sparse(np_H, np_A, np_lb, np_ub, np_lbA,
+                                                                                   np_ubA, self.np_g)
+        elif self.fixed_dimension:
+            H, A, lb, ub, lbA, ubA, g = self.relax_zero_weight_constraints_inplace()
+        else:
+            H, A, lb, ub, lbA, ubA, g = self.filter_zero_weight_constraints_inplace()
+        self.timer.stage_done(u'filter')
         # self.debug_print(np_H, A, lb, ub, lbA, ubA)
         try:
             xdot_full = self.qp_solver.solve(H, g, A, lb, ub, lbA, ubA, nWSR)
+            self.timer.stage_done(u'solve')
         except QPSolverException as e:
+            if self.qp_solver.sparse:
+                A = A.toarray()
+            elif self.fixed_dimension:
+                H, A, lb, ub, lbA, ubA, g = self.filter_zero_weight_constraints(np_H, np_A, np_lb, np_ub, np_lbA,
+                                                                                np_ubA, self.np_g)
             p_weights, p_A, p_lbA, p_ubA, p_lb, p_ub = self.debug_print(np_H, A, lb, ub, lbA, ubA, g, actually_print=True)
             if isinstance(e, InfeasibleException):
                 if self.are_joint_limits_violated(p_lb, p_ub):
@@ -298,6 +711,9 @@ class QProblemBuilder(object):
             raise e
         if xdot_full is None:
             return None
+        if self.fixed_dimension and not self.qp_solver.sparse:
+            # everyone else expects the solution of the filtered qp problem
+            xdot_full = xdot_full[self.b_mask]
         # TODO enable debug print in an elegant way, preferably without slowing anything down
         # self.debug_print(np_H, A, lb, ub, lbA, ubA, g, xdot_full)
         return OrderedDict((observable, xdot_full[i]) for i, observable in enumerate(self.controlled_joints)), \
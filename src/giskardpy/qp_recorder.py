@@ -0,0 +1,119 @@
+import os
+from glob import glob
+
+import numpy as np
+
+RECORDING_VERSION = 1
+
+
+class QPRecorder(object):
+    """
+    Records the unfiltered qp problem of every control cycle of a goal into chunked npz files in a folder,
+    see scripts/replay_qp_problems.py.
+    Every chunk contains the arrays of chunk_size cycles, stacked along the first axis:
+    substitutions, H (weights), A, lb, ub, lbA, ubA, g, b_mask, bA_mask and xdot_full,
+    where xdot_full is 0 for constraints that have been filtered.
+    meta.npz contains the names of the symbols, constraints and joints.
+    """
+
+    def __init__(self, path, str_params, b_names, bA_names, chunk_size=100):
+        """
+        :param path: folder for the recording, gets created
+        :type path: str
+        :param str_params: names of the symbols in the substitution vectors
+        :type str_params: list
+        :param b_names: names of the columns of A
+        :type b_names: list
+        :param bA_names: names of the rows of A
+        :type bA_names: list
+        :param chunk_size: number of control cycles per file
+        :type chunk_size: int
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        if not os.path.exists(path):
+            os.makedirs(path)
+        np.savez(os.path.join(path, u'meta.npz'),
+                 version=RECORDING_VERSION,
+                 str_params=np.array([str(x) for x in str_params]),
+                 b_names=np.array([str(x) for x in b_names]),
+                 bA_names=np.array([str(x) for x in bA_names]))
+        self.number_of_chunks = 0
+        self.number_of_cycles = 0
+        self.chunk = None
+        self.row = 0
+
+    def new_chunk(self, arrays):
+        self.chunk = {name: np.zeros((self.chunk_size,) + np.shape(array), dtype=np.asarray(array).dtype)
+                      for name, array in arrays.items()}
+        self.row = 0
+
+    def record(self, substitutions, H, A, lb, ub, lbA, ubA, g, b_mask, bA_mask, xdot_full):
+        """
+        :param xdot_full: solution of the filtered qp problem
+        """
+        xdot_unfiltered = np.zeros(len(b_mask))
+        xdot_unfiltered[b_mask] = xdot_full
+        arrays = {u'substitutions': np.asarray(substitutions, dtype=float),
+                  u'H': H, u'A': A, u'lb': lb, u'ub': ub, u'lbA': lbA, u'ubA': ubA, u'g': g,
+                  u'b_mask': b_mask, u'bA_mask': bA_mask, u'xdot_full': xdot_unfiltered}
+        if self.chunk is None:
+            self.new_chunk(arrays)
+        for name, array in arrays.items():
+            self.chunk[name][self.row] = array
+        self.row += 1
+        self.number_of_cycles += 1
+        if self.row == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.chunk is None or self.row == 0:
+            return
+        np.savez_compressed(os.path.join(self.path, u'chunk_{:05d}.npz'.format(self.number_of_chunks)),
+                            **{name: array[:self.row] for name, array in self.chunk.items()})
+        self.number_of_chunks += 1
+        self.row = 0
+
+    def close(self):
+        self.flush()
+        self.chunk = None
+
+
+def load_recording(path):
+    """
+    :param path: folder of a recording of QPRecorder
+    :type path: str
+    :return: meta data, generator of one dict per control cycle with the same keys as the chunks
+    :rtype: tuple
+    """
+    meta = dict(np.load(os.path.join(path, u'meta.npz')))
+    if int(meta[u'version']) != RECORDING_VERSION:
+        raise ValueError(u'{} has version {}, expected {}'.format(path, meta[u'version'], RECORDING_VERSION))
+
+    def cycles():
+        for chunk_path in sorted(glob(os.path.join(path, u'chunk_*.npz'))):
+            chunk = np.load(chunk_path)
+            arrays = {name: chunk[name] for name in chunk.files}
+            for i in range(len(arrays[u'H'])):
+                yield {name: array[i] for name, array in arrays.items()}
+
+    return meta, cycles()
+
+
+def filter_recorded_problem(cycle):
+    """
+    Removes the constraints with zero weight, like QProblemBuilder.filter_zero_weight_constraints.
+    :param cycle: one control cycle of load_recording
+    :type cycle: dict
+    :return: H, g, A, lb, ub, lbA, ubA in the order of BaseQPSolver.solve
+    :rtype: tuple
+    """
+    b_mask = cycle[u'b_mask']
+    bA_mask = cycle[u'bA_mask']
+    return cycle[u'H'][b_mask], \
+           cycle[u'g'][b_mask], \
+           cycle[u'A'][bA_mask][:, b_mask], \
+           cycle[u'lb'][b_mask], \
+           cycle[u'ub'][b_mask], \
+           cycle[u'lbA'][bA_mask], \
+           cycle[u'ubA'][bA_mask]
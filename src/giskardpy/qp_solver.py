@@ -1,3 +1,6 @@
+from collections import deque
+from time import time
+
 import numpy as np
 
 import qpoases
@@ -7,21 +10,98 @@ from giskardpy.exceptions import MAX_NWSR_REACHEDException, QPSolverException, I
 from giskardpy import logging
 
 
-class QPSolver(object):
+class BaseQPSolver(object):
+    """
+    Interface for qp solver backends.
+    x^T*H*x + x^T*g
+    s.t.: lbA < A*x < ubA
+    and    lb <  x  < ub
+    """
+    # if True, QProblemBuilder passes A as scipy.sparse.csc_matrix
+    sparse = False
+    # number of cold starts and warm starts since the last reset_statistics
+    num_inits = 0
+    num_hotstarts = 0
+    # number of working set recalculations or iterations needed by the last solve
+    iterations = 0
+    # number of solves that ran out of time since the last reset_statistics
+    num_budget_hits = 0
+    # when a solve runs out of time, the last solution is scaled by this factor and returned instead
+    fallback_scale = 0.5
+    xdot_full = None
+    # last solution that was returned by solve, kept separately, because a cold start resets xdot_full
+    last_solution = None
+
+    def reset_statistics(self):
+        self.num_inits = 0
+        self.num_hotstarts = 0
+        self.num_budget_hits = 0
+
+    def budget_exceeded(self, dim):
+        """
+        Graceful degradation for solves that ran out of time.
+        :param dim: number of variables of the current qp problem
+        :return: the last solution scaled by fallback_scale or zeros, if the number of variables has changed
+        :rtype: np.array
+        """
+        self.num_budget_hits += 1
+        if self.last_solution is None or len(self.last_solution) != dim:
+            self.last_solution = np.zeros(dim)
+        else:
+            # not in place, the caller may still use the last solution
+            self.last_solution = self.last_solution * self.fallback_scale
+        return self.last_solution
+
+    def solve(self, H, g, A, lb, ub, lbA, ubA, nWSR=None):
+        """
+        H is passed as 1d vector containing the diagonal of the weight matrix.
+        :return: x according to the equations above, len = joint constraints + soft constraints
+        :rtype: np.array
+        """
+        raise NotImplementedError()
+
+
+def get_qp_solver(name=u'qpoases', time_budget=None, fallback_scale=0.5):
+    """
+    :param name: name of the qp solver backend, see config file
+    :type name: str
+    :param time_budget: time in s a single solve may take, None for no limit
+    :type time_budget: float
+    :param fallback_scale: see BaseQPSolver.fallback_scale
+    :type fallback_scale: float
+    :rtype: BaseQPSolver
+    """
+    if name == u'qpoases':
+        return QPSolver(time_budget, fallback_scale)
+    if name == u'osqp':
+        from giskardpy.qp_solver_osqp import QPSolverOSQP
+        return QPSolverOSQP(time_budget=time_budget, fallback_scale=fallback_scale)
+    raise QPSolverException(u'unknown qp solver "{}"'.format(name))
+
+
+class QPSolver(BaseQPSolver):
     RETURN_VALUE_DICT = {value: name for name, value in vars(PyReturnValue).items()}
 
-    def __init__(self):
+    def __init__(self, time_budget=None, fallback_scale=0.5, nWSR_history_length=50):
         """
-        :param dim_a: number of joint constraints + number of soft constraints
-        :type int
-        :param dim_b: number of hard constraints + number of soft constraints
-        :type int
+        :param time_budget: cpu time in s qpoases may use per solve, including retries, None for no limit.
+                            If it runs out, no exception is raised, see BaseQPSolver.budget_exceeded.
+        :type time_budget: float
+        :param fallback_scale: see BaseQPSolver.fallback_scale
+        :type fallback_scale: float
+        :param nWSR_history_length: with a time budget, nWSR of hotstarts is estimated from this many previous ones
+        :type nWSR_history_length: int
         """
+        self.time_budget = time_budget
+        self.fallback_scale = fallback_scale
+        self.nWSR_history = deque(maxlen=nWSR_history_length)
         self.started = False
         self.shape = (0,0)
+        self.hessian_type = qpoases.PyHessianType.UNKNOWN
+        self.H = np.zeros((0, 0))
 
     def init(self, dim_a, dim_b):
-        self.qpProblem = qpoases.PySQProblem(dim_a, dim_b)
+        self.qpProblem = qpoases.PySQProblem(dim_a, dim_b, self.hessian_type)
         options = qpoases.PyOptions()
         options.setToMPC()
         options.printLevel = qpoases.PyPrintLevel.NONE
@@ -30,12 +110,63 @@ class QPSolver(object):
 
         self.started = False
 
+    def estimate_nWSR(self, A, use_history=True):
+        """
+        :param use_history: if False, the nWSR of previous hotstarts is not used to limit it
+        :type use_history: bool
+        :return: max number of working set recalculations for the next solve
+        :rtype: int
+        """
+        nWSR = sum(A.shape) * 2
+        if use_history and self.time_budget is not None and self.started and self.nWSR_history:
+            # hotstarts usually need a lot less than cold starts
+            nWSR = min(nWSR, max(self.nWSR_history) * 2 + 10)
+        return nWSR
+
+    def out_of_time(self, deadline, nWSR, max_nWSR):
+        """
+        Tells whether qpoases returned MAX_NWSR_REACHED, because it used up its cputime and not its nWSR.
+        :param nWSR: working set recalculations qpoases did, it overwrites the nWSR argument with it
+        :type nWSR: np.array
+        :param max_nWSR: working set recalculations qpoases was allowed to do
+        :type max_nWSR: int
+        :rtype: bool
+        """
+        if deadline is None:
+            return False
+        # qpoases stops early, if the next working set recalculation would exceed its cputime
+        return nWSR[0] < max_nWSR or time() >= deadline
+
+    def get_cputime(self, deadline):
+        """
+        :return: remaining cpu time for qpoases, or None if there is no time budget
+        :rtype: np.array
+        """
+        if deadline is None:
+            return None
+        return np.array([deadline - time()])
+
+    def diagonal_hessian(self, weights):
+        """
+        Writes the weights onto the diagonal of a reused weight matrix.
+        :type weights: np.ndarray
+        :return: weight matrix, qpoases.PyHessianType that tells qpoases whether it can skip the matrix
+        :rtype: tuple
+        """
+        if self.H.shape[0] != len(weights):
+            self.H = np.zeros((len(weights), len(weights)))
+        np.fill_diagonal(self.H, weights)
+        if (weights == 1).all():
+            return self.H, qpoases.PyHessianType.IDENTITY
+        return self.H, qpoases.PyHessianType.POSDEF
+
     def solve(self, H, g, A, lb, ub, lbA, ubA, nWSR=None):
         """
         x^T*H*x + x^T*g
         s.t.: lbA < A*x < ubA
         and    lb <  x  < ub
-        :param H: 2d diagonal weight matrix, shape = (jc (joint constraints) + sc (soft constraints)) * (jc + sc)
+        :param H: 1d vector containing the diagonal of the weight matrix, len = jc (joint constraints) + sc (soft
+                  constraints), or 2d weight matrix, shape = (jc + sc) * (jc + sc)
         :type np.array
         :param g: 1d zero vector of len joint constraints + soft constraints
         :type np.array
@@ -54,30 +185,71 @@ class QPSolver(object):
         :return: x according to the equations above, len = joint constraints + soft constraints
         :type np.array
         """
-        if A.shape != self.shape:
+        if H.ndim == 1:
+            H, hessian_type = self.diagonal_hessian(H)
+        else:
+            hessian_type = qpoases.PyHessianType.UNKNOWN
+        if A.shape != self.shape or hessian_type != self.hessian_type:
             self.started = False
             self.shape = A.shape
+            self.hessian_type = hessian_type
+
+        deadline = None
+        if self.time_budget is not None:
+            deadline = time() + self.time_budget
 
         number_of_retries = 2
+        use_nWSR_history = True
         while number_of_retries > 0:
-            if nWSR is None:
-                nWSR = np.array([sum(A.shape) * 2])
+            nWSR_estimated = nWSR is None
+            if nWSR_estimated:
+                nWSR = np.array([self.estimate_nWSR(A, use_nWSR_history)])
             else:
                 nWSR = np.array([nWSR])
+            max_nWSR = nWSR[0]
+            cputime = self.get_cputime(deadline)
+            if cputime is not None and cputime[0] <= 0:
+                self.started = False
+                return self.budget_exceeded(A.shape[1])
             number_of_retries -= 1
             if not self.started:
                 self.init(A.shape[1], A.shape[0])
-                success = self.qpProblem.init(H, g, A, lb, ub, lbA, ubA, nWSR)
+                self.num_inits += 1
+                hotstart = False
+                if cputime is None:
+                    success = self.qpProblem.init(H, g, A, lb, ub, lbA, ubA, nWSR)
+                else:
+                    success = self.qpProblem.init(H, g, A, lb, ub, lbA, ubA, nWSR, cputime)
                 if success == PyReturnValue.MAX_NWSR_REACHED:
                     self.started = False
+                    if self.out_of_time(deadline, nWSR, max_nWSR):
+                        return self.budget_exceeded(A.shape[1])
                     raise MAX_NWSR_REACHEDException(u'Failed to initialize QP-problem.')
             else:
-                success = self.qpProblem.hotstart(H, g, A, lb, ub, lbA, ubA, nWSR)
+                self.num_hotstarts += 1
+                hotstart = True
+                if cputime is None:
+                    success = self.qpProblem.hotstart(H, g, A, lb, ub, lbA, ubA, nWSR)
+                else:
+                    success = self.qpProblem.hotstart(H, g, A, lb, ub, lbA, ubA, nWSR, cputime)
                 if success == PyReturnValue.MAX_NWSR_REACHED:
+                    # qpoases can continue an interrupted hotstart with the next one
+                    if self.out_of_time(deadline, nWSR, max_nWSR):
+                        return self.budget_exceeded(A.shape[1])
+                    if nWSR_estimated and use_nWSR_history:
+                        # the nWSR estimated from previous hotstarts was too small, continue without the limit
+                        use_nWSR_history = False
+                        nWSR = None
+                        number_of_retries += 1
+                        continue
                     self.started = False
                     raise MAX_NWSR_REACHEDException(u'Failed to hot start QP-problem.')
             if success == PyReturnValue.SUCCESSFUL_RETURN:
                 self.started = True
+                # qpoases overwrites nWSR with the number of working set recalculations it actually needed
+                self.iterations = nWSR[0]
+                if hotstart:
+                    self.nWSR_history.append(self.iterations)
                 break
             elif success == PyReturnValue.NAN_IN_LB:
                 # TODO nans get replaced with 0 document this somewhere
@@ -123,4 +295,5 @@ class QPSolver(object):
             raise QPSolverException(message)
 
         self.qpProblem.getPrimalSolution(self.xdot_full)
+        self.last_solution = self.xdot_full
         return self.xdot_full
@@ -0,0 +1,107 @@
+import numpy as np
+import osqp
+from scipy import sparse
+
+from giskardpy.exceptions import MAX_NWSR_REACHEDException, QPSolverException, InfeasibleException
+from giskardpy.qp_solver import BaseQPSolver
+
+
+class QPSolverOSQP(BaseQPSolver):
+    """
+    Sparse qp solver backend using osqp.
+    A is expected as scipy.sparse.csc_matrix, H as 1d vector containing the diagonal of the weight matrix.
+    The bounds of x are added as identity rows below A, because osqp only supports l <= A*x <= u.
+    """
+    sparse = True
+    INFTY = 1e20
+
+    def __init__(self, eps_abs=1e-6, eps_rel=1e-6, max_iter=4000, time_budget=None, fallback_scale=0.5):
+        """
+        :param time_budget: time in s osqp may use per solve, None for no limit.
+                            If it runs out, no exception is raised, see BaseQPSolver.budget_exceeded.
+        :type time_budget: float
+        """
+        self.settings = {u'verbose': False,
+                         u'warm_start': True,
+                         u'polish': True,
+                         u'eps_abs': eps_abs,
+                         u'eps_rel': eps_rel,
+                         u'max_iter': max_iter}
+        if time_budget is not None:
+            self.settings[u'time_limit'] = time_budget
+        self.fallback_scale = fallback_scale
+        self.started = False
+        self.shape = (0, 0)
+        self.P_pattern = None
+        self.A_pattern = None
+        self.solved = (osqp.constant(u'OSQP_SOLVED'),
+                       osqp.constant(u'OSQP_SOLVED_INACCURATE'))
+        self.infeasible = (osqp.constant(u'OSQP_PRIMAL_INFEASIBLE'),
+                           osqp.constant(u'OSQP_PRIMAL_INFEASIBLE_INACCURATE'))
+        self.max_iter_reached = osqp.constant(u'OSQP_MAX_ITER_REACHED')
+        self.time_limit_reached = osqp.constant(u'OSQP_TIME_LIMIT_REACHED')
+
+    def init(self, P, q, A, l, u):
+        self.qpProblem = osqp.OSQP()
+        self.qpProblem.setup(P=P, q=q, A=A, l=l, u=u, **self.settings)
+        self.P_pattern = (P.indptr.copy(), P.indices.copy())
+        self.A_pattern = (A.indptr.copy(), A.indices.copy())
+        self.started = True
+
+    def same_pattern(self, pattern, m):
+        return pattern is not None and \
+               np.array_equal(pattern[0], m.indptr) and \
+               np.array_equal(pattern[1], m.indices)
+
+    def solve(self, H, g, A, lb, ub, lbA, ubA, nWSR=None):
+        """
+        x^T*H*x + x^T*g
+        s.t.: lbA < A*x < ubA
+        and    lb <  x  < ub
+        :param H: 1d vector containing the diagonal of the weight matrix or 2d weight matrix
+        :type H: np.array
+        :param A: 2d jacobi matrix of hc (hard constraints) and sc
+        :type A: Union[scipy.sparse.csc_matrix, np.array]
+        :param nWSR: ignored, osqp has no working set
+        :return: x according to the equations above, len = joint constraints + soft constraints
+        :rtype: np.array
+        """
+        if H.ndim == 1:
+            P = sparse.diags(H, format=u'csc')
+        else:
+            P = sparse.triu(sparse.csc_matrix(H), format=u'csc')
+        A = sparse.csc_matrix(A)
+        dim_b, dim_a = A.shape
+        A = sparse.vstack([A, sparse.identity(dim_a, format=u'csc')], format=u'csc')
+        l = np.nan_to_num(np.concatenate((lbA, lb)))
+        u = np.nan_to_num(np.concatenate((ubA, ub)))
+        np.clip(l, -self.INFTY, self.INFTY, out=l)
+        np.clip(u, -self.INFTY, self.INFTY, out=u)
+
+        if (dim_b, dim_a) != self.shape:
+            self.started = False
+            self.shape = (dim_b, dim_a)
+
+        if self.started and self.same_pattern(self.P_pattern, P) and self.same_pattern(self.A_pattern, A):
+            self.qpProblem.update(q=g, l=l, u=u, Px=P.data, Ax=A.data)
+            self.num_hotstarts += 1
+        else:
+            self.init(P, g, A, l, u)
+            self.num_inits += 1
+
+        result = self.qpProblem.solve()
+        status = result.info.status_val
+        self.iterations = result.info.iter
+        if status in self.solved:
+            self.xdot_full = result.x
+            self.last_solution = self.xdot_full
+            return self.xdot_full
+        if status == self.time_limit_reached:
+            return self.budget_exceeded(dim_a)
+        self.started = False
+        message = u'osqp: {}'.format(result.info.status)
+        if status == self.max_iter_reached:
+            raise MAX_NWSR_REACHEDException(message)
+        if status in self.infeasible:
+            raise InfeasibleException(message)
+        raise QPSolverException(message)
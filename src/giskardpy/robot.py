@@ -1,17 +1,18 @@
 from __future__ import division
 import traceback
 from collections import namedtuple, OrderedDict, defaultdict
-from copy import deepcopy
 from itertools import combinations
+
+import numpy as np
 from giskardpy import identifier
 from geometry_msgs.msg import PoseStamped
 
 from giskardpy import WORLD_IMPLEMENTATION, cas_wrapper as w
-from giskardpy.data_types import SingleJointState, HardConstraint, JointConstraint
+from giskardpy.data_types import SingleJointState, HardConstraint, JointConstraint, JointStates
 from giskardpy.god_map import GodMap
 from giskardpy.pybullet_world_object import PyBulletWorldObject
 from giskardpy.utils import KeyDefaultDict, \
-    homo_matrix_to_pose, memoize
+    homo_matrix_to_pose, memoize, inverse_frame_np
 from giskardpy.world_object import WorldObject
 
 if WORLD_IMPLEMENTATION == u'pybullet':
@@ -33,6 +34,8 @@ class Robot(Backend):
         self._fk_expressions = {}
         self._fks = {}
         self._evaluated_fks = {}
+        self._all_fks = None
+        self._all_fks_evaluated = False
         self._joint_to_frame = {}
         self._joint_position_symbols = KeyDefaultDict(lambda x: w.Symbol(x))  # don't iterate over this map!!
         self._joint_velocity_symbols = KeyDefaultDict(lambda x: 0)  # don't iterate over this map!!
@@ -60,9 +63,16 @@ class Robot(Backend):
         :return:
         """
         Backend.joint_state.fset(self, value)
-        self.__joint_state_positions = {str(self._joint_position_symbols[k]): v.position for k, v in
-                                        self.joint_state.items()}
+        joint_state = self.joint_state
+        if isinstance(joint_state, JointStates):
+            positions = joint_state.position.tolist()
+            self.__joint_state_positions = {str(self._joint_position_symbols[k]): positions[i] for k, i in
+                                            joint_state.name_to_index.items()}
+        else:
+            self.__joint_state_positions = {str(self._joint_position_symbols[k]): v.position for k, v in
+                                            joint_state.items()}
         # self._evaluated_fks.clear()
+        self._all_fks_evaluated = False
         self.get_fk_np.memo.clear()
 
     @memoize
@@ -224,19 +234,33 @@ class Robot(Backend):
 
     def get_fk_expression(self, root_link, tip_link):
         """
+        The expressions are cached and composed out of the cached transformations along the chain, such that all
+        expressions that share a part of their chain share the same subexpressions.
         :type root_link: str
         :type tip_link: str
         :return: 4d matrix describing the transformation from root_link to tip_link
         :rtype: spw.Matrix
         """
-        fk = w.eye(4)
-        root_chain, _, tip_chain = self.get_split_chain(root_link, tip_link, links=False)
-        for joint_name in root_chain:
-            fk = w.dot(fk, w.inverse_frame(self.get_joint_frame(joint_name)))
-        for joint_name in tip_chain:
-            fk = w.dot(fk, self.get_joint_frame(joint_name))
-        # FIXME there is some reference fuckup going on, but i don't know where; deepcopy is just a quick fix
-        return deepcopy(fk)
+        key = root_link, tip_link
+        if key not in self._fk_expressions:
+            if root_link == tip_link:
+                fk = w.eye(4)
+            else:
+                connection = self.get_connecting_link(root_link, tip_link)
+                if connection == root_link:
+                    joint_name = self.get_parent_joint_of_link(tip_link)
+                    parent_link = self.get_parent_link_of_joint(joint_name)
+                    fk = self.get_joint_frame(joint_name)
+                    if parent_link != root_link:
+                        fk = w.dot(self.get_fk_expression(root_link, parent_link), fk)
+                elif connection == tip_link:
+                    fk = w.inverse_frame(self.get_fk_expression(tip_link, root_link))
+                else:
+                    fk = w.dot(self.get_fk_expression(root_link, connection),
+                               self.get_fk_expression(connection, tip_link))
+            self._fk_expressions[key] = fk
+        # new matrix with the same subexpressions, such that changing its entries doesn't change the cache
+        return w.Matrix(self._fk_expressions[key])
 
     def get_fk_pose(self, root, tip):
         try:
@@ -252,8 +276,49 @@ class Robot(Backend):
 
     @memoize
     def get_fk_np(self, root, tip):
+        """
+        Composed out of the transformations of get_all_fks_np, unless root or tip is not a link of the robot.
+        :type root: str
+        :type tip: str
+        :return: 4x4 transformation from root to tip
+        :rtype: np.ndarray
+        """
+        link_to_index = self._all_fks_link_index
+        if root in link_to_index and tip in link_to_index:
+            fks = self.get_all_fks_np()
+            root_T_tip = fks[link_to_index[tip]]
+            if root == self.get_root():
+                return root_T_tip.copy()
+            return np.dot(inverse_frame_np(fks[link_to_index[root]]), root_T_tip)
         return self._fks[root, tip](**self.get_joint_state_positions())
 
+    def get_all_fks_np(self):
+        """
+        Evaluates the transformations from the root to all links at most once per joint state.
+        :return: array of shape (number of links, 4, 4), the index of a link is in self._all_fks_link_index,
+                 gets overwritten by the next evaluation
+        :rtype: np.ndarray
+        """
+        if self._all_fks is None:
+            self.compile_all_fks()
+        if not self._all_fks_evaluated:
+            self._all_fks(**self.get_joint_state_positions())
+            self._all_fks_evaluated = True
+        return self._all_fks_array
+
+    def compile_all_fks(self):
+        """
+        Compiles one function, which computes the transformations from the root to all links.
+        """
+        root = self.get_root()
+        links = self.get_link_names()
+        # the transposed transformations are stacked horizontally, such that the column major output of the
+        # compiled function is a row major (number of links, 4, 4) array
+        fks = w.horzcat(*[self.get_fk_expression(root, link).T for link in links])
+        self._all_fks = w.speed_up(fks, w.free_symbols(fks))
+        self._all_fks_array = self._all_fks.out.T.reshape(len(links), 4, 4)
+        self._all_fks_evaluated = False
+
     def init_fast_fks(self):
         def f(key):
             root, tip = key
@@ -262,6 +327,9 @@ class Robot(Backend):
             return m
 
         self._fks = KeyDefaultDict(f)
+        # compiled lazily by get_all_fks_np
+        self._all_fks = None
+        self._all_fks_link_index = {link: i for i, link in enumerate(self.get_link_names())}
 
     # JOINT FUNCTIONS
 
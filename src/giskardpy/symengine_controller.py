@@ -2,6 +2,7 @@ import hashlib
 import warnings
 from collections import OrderedDict
 from itertools import chain
+from giskardpy.data_types import constraint_to_str
 from giskardpy.qp_problem_builder import QProblemBuilder
 from giskardpy.robot import Robot
 
@@ -14,13 +15,27 @@ class InstantaneousController(object):
     # TODO should anybody who uses this class know about constraints?
 
 
-    def __init__(self, robot, path_to_functions):
+    def __init__(self, robot, path_to_functions, qp_solver_name=u'qpoases', fixed_dimension=False,
+                 controller_cache=None, block_cache=None):
         """
         :type robot: Robot
         :param path_to_functions: location where compiled functions are stored
         :type: str
+        :param qp_solver_name: name of the qp solver backend
+        :type qp_solver_name: str
+        :param fixed_dimension: see QProblemBuilder
+        :type fixed_dimension: bool
+        :param controller_cache: stores compiled controllers in path_to_functions, see QProblemBuilder
+        :type controller_cache: giskardpy.controller_cache.ControllerCache
+        :param block_cache: reuses compiled blocks of constraints of previous controllers, see QProblemBuilder
+        :type block_cache: giskardpy.controller_blocks.BlockCache
         """
         self.path_to_functions = path_to_functions
+        self.controller_cache = controller_cache
+        self.block_cache = block_cache
+        self.soft_constraint_blocks = None
+        self.qp_solver_name = qp_solver_name
+        self.fixed_dimension = fixed_dimension
         self.robot = robot
         self.controlled_joints = []
         self.hard_constraints = {}
@@ -28,6 +43,7 @@ class InstantaneousController(object):
         self.soft_constraints = {}
         self.free_symbols = None
         self.qp_problem_builder = None
+        self.constraint_signature = None
 
 
     def get_qpdata_key_map(self):
@@ -52,12 +68,16 @@ class InstantaneousController(object):
             xdot_keys.append(key)
         return weights_keys, b_keys, bA_keys, xdot_keys
 
-    def update_constraints(self, joint_to_symbols_str, soft_constraints, joint_constraints, hard_constraints):
+    def update_constraints(self, joint_to_symbols_str, soft_constraints, joint_constraints, hard_constraints,
+                           soft_constraint_blocks=None):
         """
         Triggers a recompile if the number of soft constraints has changed.
         :type soft_constraints: dict
         :type free_symbols: set
+        :param soft_constraint_blocks: see QProblemBuilder
+        :type soft_constraint_blocks: OrderedDict
         """
+        self.soft_constraint_blocks = soft_constraint_blocks
         # TODO bug if soft constraints get replaced, actual amount does not change.
         last_number_of_constraints = len(self.soft_constraints)
         self.soft_constraints.update(soft_constraints)
@@ -67,25 +87,53 @@ class InstantaneousController(object):
         self.joint_to_symbols_str = joint_to_symbols_str
         self.joint_constraints = joint_constraints
         self.hard_constraints = hard_constraints
+        self.constraint_signature = None
 
 
-    def compile(self):
-        a = ''.join(str(x) for x in sorted(chain(self.soft_constraints.keys(),
-                                                 self.hard_constraints.keys(),
-                                                 self.joint_constraints.keys())))
-        function_hash = hashlib.md5(a + self.robot.get_urdf_str()).hexdigest()
-        path_to_functions = self.path_to_functions + function_hash
+    def get_constraint_signature(self):
+        """
+        Constraints are identified by their names and contents, see constraint_to_str.
+        :return: identifies the structure of the qp problem, if two controllers have the same signature,
+                 the working set of one is a good initial guess for the other
+        :rtype: str
+        """
+        if self.constraint_signature is None:
+            a = '|'.join(chain((constraint_to_str(k, v) for k, v in self.joint_constraints.items()),
+                               (constraint_to_str(k, v) for k, v in self.hard_constraints.items()),
+                               (constraint_to_str(k, v) for k, v in self.soft_constraints.items())))
+            self.constraint_signature = hashlib.md5(a + self.robot.get_urdf_str()).hexdigest()
+        return self.constraint_signature
+
+    def compile(self, qp_solver=None, timer=None, complexity_report=None):
+        """
+        :param qp_solver: see QProblemBuilder
+        :type qp_solver: giskardpy.qp_solver.BaseQPSolver
+        :param timer: see QProblemBuilder
+        :type timer: giskardpy.timing.StageTimer
+        :param complexity_report: see QProblemBuilder
+        :type complexity_report: giskardpy.complexity_report.ComplexityReport
+        """
+        # the order of the constraints determines the layout of the compiled function, so it is part of the hash
+        path_to_functions = self.path_to_functions + self.get_constraint_signature()
         self.qp_problem_builder = QProblemBuilder(self.joint_constraints,
                                                   self.hard_constraints,
                                                   self.soft_constraints,
                                                   self.joint_to_symbols_str.values(),
-                                                  path_to_functions)
+                                                  path_to_functions,
+                                                  self.qp_solver_name,
+                                                  self.fixed_dimension,
+                                                  qp_solver,
+                                                  timer,
+                                                  self.controller_cache,
+                                                  self.soft_constraint_blocks,
+                                                  self.block_cache,
+                                                  complexity_report)
 
     def get_cmd(self, substitutions, nWSR=None):
         """
         Computes joint commands that satisfy constrains given substitutions.
-        :param substitutions: maps symbol names as str to floats.
-        :type substitutions: dict
+        :param substitutions: values of the symbols in the order of get_expr or None, to use get_input_buffer()
+        :type substitutions: list
         :param nWSR: magic number, if None throws errors, increase this until it stops.
         :type nWSR: int
         :return: maps joint names to command
@@ -100,3 +148,23 @@ class InstantaneousController(object):
     def get_expr(self):
         return self.qp_problem_builder.get_expr()
 
+    def get_input_buffer(self):
+        """
+        :rtype: np.ndarray
+        """
+        return self.qp_problem_builder.get_input_buffer()
+
+    def get_qp_solver(self):
+        """
+        :rtype: giskardpy.qp_solver.BaseQPSolver
+        """
+        return self.qp_problem_builder.qp_solver
+
+    def get_qp_solver_statistics(self):
+        """
+        :return: number of cold starts, hotstarts and solves that ran out of time of the qp solver
+        :rtype: tuple
+        """
+        qp_solver = self.qp_problem_builder.qp_solver
+        return qp_solver.num_inits, qp_solver.num_hotstarts, qp_solver.num_budget_hits
+
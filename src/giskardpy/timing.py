@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from time import time
+
+import numpy as np
+
+
+class StageTimer(object):
+    """
+    Records the wall time of the stages of a control cycle into a fixed size ring buffer.
+    Usage per cycle: start(), stage_done(stage) after each stage, stop().
+    """
+
+    def __init__(self, stages, size=1000):
+        """
+        :param stages: names of the stages in the order in which they are executed
+        :type stages: list
+        :param size: number of cycles that are kept, older ones get overwritten
+        :type size: int
+        """
+        self.stages = list(stages)
+        self.stage_index = {stage: i for i, stage in enumerate(self.stages)}
+        self.size = size
+        self.buffer = np.zeros((size, len(self.stages) + 1))
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.row = self.buffer[0]
+        self.row[:] = 0
+        self.t_start = self.t_last = 0.
+
+    def start(self):
+        self.row = self.buffer[self.count % self.size]
+        self.row[:] = 0
+        self.t_start = self.t_last = time()
+
+    def stage_done(self, stage):
+        t = time()
+        self.row[self.stage_index[stage]] += t - self.t_last
+        self.t_last = t
+
+    def stop(self):
+        self.row[-1] = time() - self.t_start
+        self.count += 1
+
+    def get_percentiles(self, percentiles=(50, 90, 99, 100)):
+        """
+        :return: stage -> times in s at the requested percentiles of all recorded cycles, including u'total'
+        :rtype: OrderedDict
+        """
+        data = self.buffer[:min(self.count, self.size)]
+        result = OrderedDict()
+        if len(data) == 0:
+            return result
+        for i, stage in enumerate(self.stages + [u'total']):
+            result[stage] = np.percentile(data[:, i], percentiles)
+        return result
+
+    def summary(self, percentiles=(50, 90, 99, 100)):
+        """
+        :rtype: str
+        """
+        lines = [u'timing of the last {} cycles in ms (percentiles {}):'.format(min(self.count, self.size),
+                                                                              u'/'.join(str(p) for p in percentiles))]
+        for stage, times in self.get_percentiles(percentiles).items():
+            lines.append(u'  {:>12}: {}'.format(stage, u' / '.join(u'{:.3f}'.format(t * 1000) for t in times)))
+        return u'\n'.join(lines)
+
+
+class NullStageTimer(object):
+    """
+    Used instead of StageTimer, when timing is disabled.
+    """
+    count = 0
+
+    def reset(self):
+        pass
+
+    def start(self):
+        pass
+
+    def stage_done(self, stage):
+        pass
+
+    def stop(self):
+        pass
+
+    def get_percentiles(self, percentiles=(50, 90, 99, 100)):
+        return OrderedDict()
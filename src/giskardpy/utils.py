@@ -690,6 +690,18 @@ def homo_matrix_to_pose(m):
     return kdl_to_pose(np_to_kdl(m))
 
 
+def inverse_frame_np(frame):
+    """
+    :param frame: 4x4 homogeneous transformation
+    :type frame: np.ndarray
+    :rtype: np.ndarray
+    """
+    inv = np.eye(4)
+    inv[:3, :3] = frame[:3, :3].T
+    inv[:3, 3] = -np.dot(inv[:3, :3], frame[:3, 3])
+    return inv
+
+
 def compare_version(version1, operator, version2):
     """
     compares two version numbers by means of the given operator
@@ -860,6 +872,13 @@ def traj_to_msg(sample_period, trajectory, controlled_joints, fill_velocity_valu
     return trajectory_msg
 
 def make_filter_b_mask(H):
+    """
+    :param H: diagonal weight matrix or vector containing its diagonal
+    :type H: np.ndarray
+    :rtype: np.ndarray
+    """
+    if H.ndim == 1:
+        return H != 0
     return H.sum(axis=1) != 0
 
 def make_filter_masks(H, num_joint_constraints, num_hard_constraints):
@@ -965,3 +984,46 @@ class FIFOSet(set):
     def remove(self, item):
         self.remove(item)
         self._data_queue.remove(item)
+
+
+class LRUCache(object):
+    """
+    Dict like cache, that deletes its least recently used entries, when it has more than max_size entries.
+    """
+
+    def __init__(self, max_size):
+        """
+        :type max_size: int
+        """
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        :return: the entry of key or default, counts as use of the entry
+        """
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
@@ -10,7 +10,7 @@ from geometry_msgs.msg import Pose, Quaternion
 from tf.transformations import euler_from_quaternion, rotation_from_matrix, quaternion_matrix
 
 from giskardpy import logging
-from giskardpy.data_types import SingleJointState
+from giskardpy.data_types import SingleJointState, JointStates
 from giskardpy.tfwrapper import msg_to_kdl
 from giskardpy.urdf_object import URDFObject
 
@@ -45,10 +45,19 @@ class WorldObject(URDFObject):
 
     @joint_state.setter
     def joint_state(self, value):
+        if isinstance(value, JointStates) and set(self._js).issubset(value.name_to_index):
+            # joint states that are stored in arrays are kept as they are, such that they can be updated as vector
+            self._js = value
+            return
         new_js = {}
-        new_js.update(self._js)
+        for joint_states in [self._js, value]:
+            if isinstance(joint_states, JointStates):
+                # the views change with the arrays of joint_states, therefore their values are copied
+                for joint_name, sjs in joint_states.items():
+                    new_js[joint_name] = SingleJointState(joint_name, sjs.position, sjs.velocity, sjs.effort)
+            else:
+                new_js.update(joint_states)
         self._js = new_js
-        self._js.update(value)
 
     @property
     def base_pose(self):
@@ -0,0 +1,80 @@
+import giskardpy
+
+giskardpy.WORLD_IMPLEMENTATION = None
+
+from collections import OrderedDict
+
+import numpy as np
+
+import giskardpy.identifier as identifier
+from giskardpy import cas_wrapper as w
+from giskardpy.batch_reachability import BatchReachabilityCheck
+from giskardpy.data_types import JointConstraint, SoftConstraint, SingleJointState
+from giskardpy.god_map import GodMap
+from giskardpy.robot import Robot
+from giskardpy.symengine_controller import InstantaneousController
+from giskardpy.utils import KeyDefaultDict
+from utils_for_tests import base_bot_urdf
+
+goal_identifier = (u'goal', u'x')
+
+
+def make_batch_reachability_check(path_to_functions):
+    """
+    :return: a check for a controller that moves joint_x of the base bot to a goal, its joint limits are -3 and 3,
+             its velocity is limited to 0.5 and may only increase by 0.2 per control cycle
+    :rtype: BatchReachabilityCheck
+    """
+    god_map = GodMap()
+    robot = Robot(base_bot_urdf())
+    robot.set_joint_position_symbols(
+        KeyDefaultDict(lambda joint_name: god_map.to_symbol(identifier.joint_states + [joint_name, u'position'])))
+    robot.set_joint_velocity_symbols(
+        KeyDefaultDict(lambda joint_name: god_map.to_symbol(identifier.joint_states + [joint_name, u'velocity'])))
+    joint_states = {joint_name: SingleJointState(joint_name, 0., 0.) for joint_name in robot.get_movable_joints()}
+    god_map.set_data(identifier.world, {u'robot': {u'joint_state': joint_states}})
+    god_map.set_data(identifier.rosparam, {u'general_options': {u'sample_period': 0.5}})
+    god_map.set_data(identifier.time, 1)
+    god_map.set_data([goal_identifier[0]], {goal_identifier[1]: 0.})
+
+    controlled_joints = [u'joint_x', u'joint_y']
+    joint_to_symbols_str = OrderedDict((x, robot.get_joint_position_symbol(x)) for x in controlled_joints)
+    sample_period = god_map.to_symbol(identifier.sample_period)
+    joint_constraints = OrderedDict()
+    for joint_name, symbol in joint_to_symbols_str.items():
+        velocity = robot.get_joint_velocity_symbol(joint_name)
+        joint_constraints[joint_name] = JointConstraint(w.Max(-0.25, -3 - symbol),
+                                                        w.Min(w.Min(0.25, (velocity + 0.2) * sample_period),
+                                                              3 - symbol),
+                                                        0.01, 0)
+    joint_x = robot.get_joint_position_symbol(u'joint_x')
+    goal = god_map.to_symbol(goal_identifier)
+    soft_constraints = OrderedDict([(u'goal', SoftConstraint(goal - joint_x, goal - joint_x, 1, joint_x, True,
+                                                             -1e9, 1e9, 0))])
+    controller = InstantaneousController(robot, path_to_functions)
+    controller.update_constraints(joint_to_symbols_str, soft_constraints, joint_constraints, OrderedDict())
+    controller.compile()
+    return BatchReachabilityCheck(god_map, controller, np.ones(len(controlled_joints)) * 0.001)
+
+
+def test_check(tmpdir):
+    check = make_batch_reachability_check(str(tmpdir) + u'/')
+    results = check.check([{goal_identifier: 1.}, {goal_identifier: 4.}, {goal_identifier: -2.}])
+    assert [result.reachable for result in results] == [True, False, True]
+    # joint_x gets stuck at its upper limit
+    np.testing.assert_almost_equal(results[1].residual, 1., decimal=2)
+    # it needs more than 5 control cycles to accelerate and cover the distance,
+    # but less than 10, which it would need if it could not accelerate beyond 0.2
+    assert 5 < results[0].iterations < 10
+    assert results[1].iterations < check.max_iterations
+
+
+def test_integrate(tmpdir):
+    check = make_batch_reachability_check(str(tmpdir) + u'/')
+    substitutions = check.get_substitutions([{goal_identifier: 1.}])[0]
+    xdot_full = np.zeros(len(check.controlled_joints) + 1)
+    xdot_full[0] = 0.25
+    check.integrate(substitutions, xdot_full)
+    values = dict(zip(check.str_params, substitutions))
+    assert values[str(check.god_map.to_symbol(identifier.joint_states + [u'joint_x', u'position']))] == 0.25
+    assert values[str(check.god_map.to_symbol(identifier.joint_states + [u'joint_x', u'velocity']))] == 0.5
@@ -35,6 +35,64 @@ class TestCASWrapper(unittest.TestCase):
 
                 assert w.equivalent(jac[i,j], expected[i,j])
 
+    def test_parallel_jacobian(self):
+        joints = [w.Symbol('j{}'.format(i)) for i in range(5)]
+        goal = w.Symbol('goal')
+        m = w.Matrix([w.sin(joints[i % 5]) * joints[(i + 1) % 5] * goal for i in range(8)])
+        w.set_jacobian_options(processes=2, min_expressions=2)
+        try:
+            jac, _, number_of_groups = w.parallel_jacobian(m, joints)
+        finally:
+            w.set_jacobian_options(processes=1)
+        self.assertEqual(number_of_groups, 2)
+        expected = w.jacobian(m, joints)
+        f = w.speed_up(jac, joints + [goal])
+        f_expected = w.speed_up(expected, joints + [goal])
+        args = np.arange(6) / 6.
+        np.testing.assert_array_almost_equal(f.call2(args), f_expected.call2(args))
+
+    @given(float_no_nan_no_inf(),
+           float_no_nan_no_inf())
+    def test_speed_up_split(self, f1, f2):
+        a = w.Symbol('a')
+        b = w.Symbol('b')
+        m = w.zeros(4, 5)
+        m[0, 0] = a
+        m[1, 1] = 2
+        m[2, 2:4] = w.Matrix([[b, -1]])
+        m[3, 4] = a * b
+        f = w.speed_up(m, [a, b])
+        f_split = w.speed_up(m, [a, b], split=True)
+        self.assertEqual(len(f_split.indices), 3)
+        np.testing.assert_array_equal(f.call2([f1, f2]), f_split.call2([f1, f2]))
+
+    @given(lists_of_same_length([float_no_nan_no_inf(), float_no_nan_no_inf()], min_length=1, max_length=5))
+    def test_call_batch(self, args):
+        a = w.Symbol('a')
+        b = w.Symbol('b')
+        m = w.Matrix([[a, 1, b],
+                      [a * b, 0, 2]])
+        args = np.array(args).T
+        for split in [False, True]:
+            f = w.speed_up(m, [a, b], split=split)
+            results = f.call_batch(args)
+            self.assertEqual(results.shape, (len(args), 2, 3))
+            for result, arg in zip(results, args):
+                np.testing.assert_array_equal(result, f.call2(arg))
+
+    def test_speed_up_backends(self):
+        a = w.Symbol('a')
+        b = w.Symbol('b')
+        m = w.Matrix([[w.sin(a) * b, 1],
+                      [a + b, 2]])
+        args = np.array([[0.5, -2.], [1., 3.]])
+        for split in [False, True]:
+            vm = w.speed_up(m, [a, b], backend=u'vm', split=split)
+            for backend in [u'gcc', u'compiler_that_does_not_exist']:
+                f = w.speed_up(m, [a, b], backend=backend, split=split)
+                np.testing.assert_array_almost_equal(f.call2(args[0]), vm.call2(args[0]))
+                np.testing.assert_array_almost_equal(f.call_batch(args), vm.call_batch(args))
+
     @given(float_no_nan_no_inf())
     def test_abs(self, f1):
         self.assertAlmostEqual(w.compile_and_execute(w.Abs, [f1]), abs(f1), places=7)
@@ -5,12 +5,14 @@ import giskardpy
 giskardpy.WORLD_IMPLEMENTATION = None
 import unittest
 from collections import namedtuple
+from threading import Thread
 
 from geometry_msgs.msg import PoseStamped
 from hypothesis import given, assume
 import hypothesis.strategies as st
 from giskardpy import identifier
 from giskardpy import cas_wrapper as w
+from giskardpy.data_types import JointStates, SingleJointState
 from giskardpy.god_map import GodMap
 from utils_for_tests import variable_name, keys_values, lists_of_same_length, pr2_urdf
 from giskardpy.world import World
@@ -305,6 +307,159 @@ class TestGodMap(unittest.TestCase):
             gm.to_symbol([key])
         self.assertEqual(len(gm.get_values(keys)), len(keys))
 
+    def test_fill_values(self):
+        gm = GodMap()
+        gm.set_data([u'a'], {u'b': 1.0, u'c': [2.0, 3.0]})
+        symbols = [gm.to_symbol([u'a', u'b']), gm.to_symbol([u'a', u'c', 1]), gm.to_symbol([u'a', u'd'])]
+        plan = gm.make_gather_plan(symbols)
+        out = np.zeros(len(plan))
+        gm.fill_values(plan, out)
+        np.testing.assert_array_equal(out, [1.0, 3.0, 0.0])
+        gm.set_data([u'a', u'b'], 4.0)
+        gm.fill_values(plan, out)
+        np.testing.assert_array_equal(out, [4.0, 3.0, 0.0])
+        gm.clear_cache()
+        gm.set_data([u'a'], {u'b': 5.0, u'c': [6.0, 7.0], u'd': 8.0})
+        gm.fill_values(plan, out)
+        np.testing.assert_array_equal(out, [5.0, 7.0, 8.0])
+        self.assertEqual(list(out), gm.get_values([str(s) for s in symbols]))
+
+    def test_fill_values_shared_prefix(self):
+        gm = GodMap()
+
+        class Collisions(object):
+            calls = 0
+
+            def get_collisions(self, link):
+                self.calls += 1
+                return [[1.0, 2.0], [3.0, 4.0]]
+
+        collisions = Collisions()
+        gm.set_data([u'cpi'], collisions)
+        symbols = [gm.to_symbol([u'cpi', u'get_collisions', (u'a',), i, j]) for i in range(2) for j in range(2)]
+        plan = gm.make_gather_plan(symbols)
+        out = np.zeros(len(plan))
+        gm.fill_values(plan, out)
+        np.testing.assert_array_equal(out, [1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(collisions.calls, 1)
+        self.assertEqual(len(plan.steps), 9)
+
+    def test_fill_values_track_changes(self):
+        gm = GodMap()
+        gm.track_changes = True
+
+        class Params(object):
+            reads = 0
+
+            @property
+            def weight(self):
+                self.reads += 1
+                return 2.0
+
+        params = Params()
+        gm.set_data([u'params'], params)
+        gm.set_data([u'js'], {u'a': 1.0, u'b': 2.0})
+        gm.set_data([u'f'], lambda x: x * 2)
+        symbols = [gm.to_symbol([u'params', u'weight']), gm.to_symbol([u'js', u'b']), gm.to_symbol([u'f', (3.0,)])]
+        plan = gm.make_gather_plan(symbols)
+        out = np.zeros(len(plan))
+        np.testing.assert_array_equal(gm.fill_values(plan, out), [2.0, 2.0, 6.0])
+        gm.set_data([u'js', u'b'], 3.0)
+        np.testing.assert_array_equal(gm.fill_values(plan, out), [2.0, 3.0, 6.0])
+        gm.set_data([u'js'], {u'b': 4.0})
+        gm.set_data([u'f'], lambda x: x * 3)
+        np.testing.assert_array_equal(gm.fill_values(plan, out), [2.0, 4.0, 9.0])
+        self.assertEqual(params.reads, 1)
+        # another output array has to be filled completely
+        np.testing.assert_array_equal(gm.fill_values(plan, np.zeros(len(plan))), [2.0, 4.0, 9.0])
+        self.assertEqual(params.reads, 2)
+
+    def test_fork(self):
+        gm = GodMap()
+        gm.track_changes = True
+        world = JointStates([u'a'], [1.0])
+        gm.set_data([u'world'], world)
+        gm.set_data([u'rosparam'], {u'weights': {u'a': 1.0, u'b': 2.0}, u'limits': [1.0, 2.0]})
+        symbols = [gm.to_symbol([u'rosparam', u'weights', u'a']), gm.to_symbol([u'rosparam', u'limits', 1])]
+        fork = gm.fork()
+        plan = fork.make_gather_plan(symbols)
+        out = np.zeros(len(plan))
+        np.testing.assert_array_equal(fork.fill_values(plan, out), [1.0, 2.0])
+        fork.set_data([u'rosparam', u'weights', u'a'], 3.0)
+        fork.set_data([u'rosparam', u'limits', 1], 4.0)
+        np.testing.assert_array_equal(fork.fill_values(plan, out), [3.0, 4.0])
+        self.assertEqual(gm.get_data([u'rosparam', u'weights', u'a']), 1.0)
+        self.assertEqual(gm.get_data([u'rosparam', u'limits', 1]), 2.0)
+        # only the paths to the changed values are copied
+        self.assertEqual(fork.get_data([u'rosparam', u'weights', u'b']), 2.0)
+        self.assertIs(fork.get_data([u'world']), world)
+        gm.set_data([u'rosparam', u'weights', u'b'], 5.0)
+        self.assertEqual(fork.get_data([u'rosparam', u'weights', u'b']), 2.0)
+        self.assertEqual(gm.get_data([u'rosparam', u'weights', u'b']), 5.0)
+
+    def test_read_write_lock(self):
+        gm = GodMap()
+        gm.set_concurrency(read_write_lock=True, lock_statistics=True)
+        gm.set_data([u'a'], 1)
+        with gm.read_lock:
+            reader = Thread(target=gm.get_data, args=([u'a'],))
+            reader.start()
+            reader.join(1)
+            self.assertFalse(reader.is_alive())
+            writer = Thread(target=gm.set_data, args=([u'a'], 2))
+            writer.start()
+            writer.join(0.1)
+            self.assertTrue(writer.is_alive())
+        writer.join(1)
+        self.assertFalse(writer.is_alive())
+        self.assertEqual(gm.get_data([u'a']), 2)
+        write_waits = [wait for (caller, mode), wait in gm.lock_statistics.waits.items() if mode == u'write']
+        self.assertGreaterEqual(max(maximum for _, _, maximum in write_waits), 0.1)
+
+    def test_joint_states(self):
+        gm = GodMap()
+        js = JointStates([u'a', u'b'], position=[1.0, 2.0])
+        gm.set_data([u'js'], js)
+        symbols = [gm.to_symbol([u'js', u'b', u'position']), gm.to_symbol([u'js', u'a', u'velocity'])]
+        plan = gm.make_gather_plan(symbols)
+        out = np.zeros(len(plan))
+        np.testing.assert_array_equal(gm.fill_values(plan, out), [2.0, 0.0])
+        next_js = js.copy()
+        next_js.position += [0.5, 0.5]
+        next_js.velocity[:] = 1.0
+        gm.set_data([u'js'], next_js)
+        np.testing.assert_array_equal(gm.fill_values(plan, out), [2.5, 1.0])
+        self.assertEqual(js[u'b'].position, 2.0)
+        self.assertEqual(gm.get_data([u'js', u'b', u'position']), 2.5)
+
+    def test_joint_states_gather(self):
+        gm = GodMap()
+        js = JointStates([u'a', u'b', u'c'], position=[1.0, 2.0, 3.0], velocity=[4.0, 5.0, 6.0])
+        gm.set_data([u'js'], js)
+        gm.set_data([u'x'], 7.0)
+        symbols = [gm.to_symbol([u'js', u'c', u'position']),
+                   gm.to_symbol([u'x']),
+                   gm.to_symbol([u'js', u'a', u'position']),
+                   gm.to_symbol([u'js', u'b', u'velocity']),
+                   gm.to_symbol([u'js', u'd', u'position'])]
+        plan = gm.make_gather_plan(symbols)
+        self.assertEqual(len(plan.joint_states_gathers), 1)
+        out = np.zeros(len(plan))
+        np.testing.assert_array_equal(gm.fill_values(plan, out), [3.0, 7.0, 1.0, 5.0, 0.0])
+        # the values are read from the arrays, not through views of the joints
+        self.assertEqual(js._views, {})
+        next_js = js.copy()
+        next_js.position += 1.0
+        gm.set_data([u'js'], next_js)
+        np.testing.assert_array_equal(gm.fill_values(plan, out), [4.0, 7.0, 2.0, 5.0, 0.0])
+        gm.set_data([u'js', u'a', u'position'], 10.0)
+        np.testing.assert_array_equal(gm.fill_values(plan, out), [4.0, 7.0, 10.0, 5.0, 0.0])
+        gm.set_data([u'js'], JointStates([u'd', u'c'], position=[8.0, 9.0]))
+        np.testing.assert_array_equal(gm.fill_values(plan, out), [9.0, 7.0, 0.0, 0.0, 8.0])
+        # dicts of SingleJointStates are fetched joint by joint
+        gm.set_data([u'js'], {u'a': SingleJointState(u'a', 11.0), u'c': SingleJointState(u'c', 12.0)})
+        np.testing.assert_array_equal(gm.fill_values(plan, out), [12.0, 7.0, 11.0, 0.0, 0.0])
+
     def test_god_map_with_world(self):
         gm = GodMap()
         w = World()
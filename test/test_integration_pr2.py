@@ -19,6 +19,7 @@ import giskardpy.tfwrapper as tf
 from giskardpy import logging, identifier
 from giskardpy.constraints import WEIGHT_ABOVE_CA, WEIGHT_BELOW_CA, WEIGHT_COLLISION_AVOIDANCE
 from giskardpy.identifier import fk_pose
+from giskardpy.prewarm import ControllerPrewarmer
 from giskardpy.robot import Robot
 from giskardpy.tfwrapper import init as tf_init
 from giskardpy.utils import to_joint_state_position_dict, publish_marker_vector
@@ -259,6 +260,26 @@ class TestInitialization(object):
         np.testing.assert_almost_equal(odom_z_lb, -0.6)
         np.testing.assert_almost_equal(odom_z_ub, 0.6)
 
+    def test_prewarm(self, zero_pose):
+        """
+        :type zero_pose: PR2
+        """
+        controller_plugin = zero_pose.get_god_map().get_data(identifier.tree_manager).get_node(
+            u'planning III').get_plugins()[u'controller']
+        prewarmer = ControllerPrewarmer(zero_pose.get_god_map(), u'~command', controller_plugin)
+        prewarmer.templates = {u'joint goal': {u'collision_avoidance': False,
+                                               u'constraints': [{u'type': u'JointPositionList'}]}}
+        prewarmer.run()
+        assert list(prewarmer.durations.keys()) == [u'joint goal']
+        hits = controller_plugin.controller_lru.hits
+        # only the structure of the goal has to match the template
+        robot = zero_pose.get_robot()
+        zero_pose.set_joint_goal({joint_name: robot.joint_state[joint_name].position
+                                  for joint_name in zero_pose.get_controlled_joint_names()})
+        zero_pose.allow_all_collisions()
+        zero_pose.send_and_check_goal(goal_type=MoveGoal.PLAN_ONLY)
+        assert controller_plugin.controller_lru.hits == hits + 1
+
 
 class TestFk(object):
     def test_fk1(self, zero_pose):
@@ -7599,3 +7620,65 @@ class TestReachability():
         zero_pose.check_reachability()
         zero_pose.set_joint_goal(js)
         zero_pose.send_and_check_goal(goal_type=MoveGoal.PLAN_ONLY)
+
+    def test_in_memory_controller_cache(self, zero_pose):
+        """
+        :type zero_pose: PR2
+        """
+        controller_plugin = zero_pose.get_god_map().get_data(identifier.tree_manager).get_node(
+            u'planning III').get_plugins()[u'controller']
+        controller_lru = controller_plugin.controller_lru
+        js = {u'r_shoulder_lift_joint': 0.2,
+              u'r_elbow_flex_joint': -0.2,
+              u'torso_lift_joint': 0.15}
+
+        def plan(check_reachability=False):
+            zero_pose.set_joint_goal(js)
+            zero_pose.allow_all_collisions()
+            if check_reachability:
+                zero_pose.check_reachability()
+            else:
+                zero_pose.send_and_check_goal(goal_type=MoveGoal.PLAN_ONLY)
+            return controller_plugin.controller
+
+        normal = plan()
+        hits, misses = controller_lru.hits, controller_lru.misses
+        assert plan() is normal
+        assert controller_lru.hits == hits + 1
+        # the joint constraints of the reachability check have the same names, but other expressions
+        reachability_check = plan(check_reachability=True)
+        assert reachability_check is not normal
+        assert controller_lru.misses == misses + 1
+        assert plan() is normal
+        assert plan(check_reachability=True) is reachability_check
+        assert controller_lru.hits == hits + 3
+        # attaching an object changes the urdf
+        zero_pose.attach_box(size=[0.1, 0.02, 0.02], frame_id=zero_pose.r_tip, position=[0.05, 0, 0])
+        assert plan() is not normal
+        assert controller_lru.misses == misses + 2
+
+    def test_in_memory_controller_cache_with_velocity_limit(self, zero_pose):
+        """
+        :type zero_pose: PR2
+        """
+        controller_plugin = zero_pose.get_god_map().get_data(identifier.tree_manager).get_node(
+            u'planning III').get_plugins()[u'controller']
+        controller_lru = controller_plugin.controller_lru
+
+        def plan(hard):
+            zero_pose.wrapper.limit_cartesian_velocity(root_link=zero_pose.default_root,
+                                                       tip_link=u'base_footprint',
+                                                       hard=hard)
+            zero_pose.set_joint_goal({u'torso_lift_joint': 0.15})
+            zero_pose.allow_all_collisions()
+            zero_pose.send_and_check_goal(goal_type=MoveGoal.PLAN_ONLY)
+            return controller_plugin.controller
+
+        hard = plan(True)
+        misses = controller_lru.misses
+        # the soft constraints of both limits have the same names, but other slack limits
+        soft = plan(False)
+        assert soft is not hard
+        assert controller_lru.misses == misses + 1
+        assert plan(True) is hard
+        assert plan(False) is soft
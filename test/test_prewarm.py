@@ -0,0 +1,83 @@
+import giskardpy
+
+giskardpy.WORLD_IMPLEMENTATION = None
+
+import json
+from collections import OrderedDict
+from threading import Event, Timer
+
+from giskard_msgs.msg import CollisionEntry
+
+import giskardpy.identifier as identifier
+from giskardpy.god_map import GodMap
+from giskardpy.prewarm import ControllerPrewarmer
+from giskardpy.robot import Robot
+from utils_for_tests import base_bot_urdf
+
+
+def make_prewarmer(templates):
+    god_map = GodMap()
+    robot = Robot(base_bot_urdf(), controlled_joints=[u'joint_x', u'joint_y', u'rot_z'])
+    god_map.set_data(identifier.world, {u'robot': robot})
+    god_map.set_data(identifier.rosparam, {u'prewarm': {u'templates': templates}})
+    return ControllerPrewarmer(god_map, u'~command', None)
+
+
+def test_make_move_cmd():
+    template = {u'collision_avoidance': False,
+                u'constraints': [{u'type': u'JointPositionList'},
+                                 {u'type': u'CartesianPose',
+                                  u'parameters': {u'root_link': u'base_link',
+                                                  u'tip_link': u'eef'}}]}
+    prewarmer = make_prewarmer({u'template': template})
+    move_cmd = prewarmer.make_move_cmd(prewarmer.templates[u'template'])
+    assert [constraint.type for constraint in move_cmd.constraints] == [u'JointPositionList', u'CartesianPose']
+    joint_goal = json.loads(move_cmd.constraints[0].parameter_value_pair)
+    assert joint_goal[u'goal_state'] == {u'name': [u'joint_x', u'joint_y', u'rot_z'],
+                                         u'position': [0., 0., 0.]}
+    cartesian_goal = json.loads(move_cmd.constraints[1].parameter_value_pair)
+    assert cartesian_goal[u'tip_link'] == u'eef'
+    assert cartesian_goal[u'goal'][u'header'][u'frame_id'] == u'base_link'
+    assert cartesian_goal[u'goal'][u'pose'][u'orientation'][u'w'] == 1.
+    assert len(move_cmd.collisions) == 1
+    assert move_cmd.collisions[0].type == CollisionEntry.ALLOW_COLLISION
+    assert move_cmd.collisions[0].robot_links == [CollisionEntry.ALL]
+
+
+def test_make_move_cmd_with_collision_avoidance():
+    goal_state = {u'name': [u'joint_x'], u'position': [1.]}
+    template = {u'constraints': [{u'type': u'JointPositionList',
+                                  u'parameters': {u'goal_state': goal_state}}]}
+    prewarmer = make_prewarmer({u'template': template})
+    move_cmd = prewarmer.make_move_cmd(template)
+    # given parameters are kept and the default collision avoidance needs no collision entries
+    assert json.loads(move_cmd.constraints[0].parameter_value_pair) == {u'goal_state': goal_state}
+    assert len(move_cmd.collisions) == 0
+
+
+class ControllerPluginWithCache(object):
+    controller_lru = {}
+    block_cache = None
+    controller_cache = None
+
+
+def test_stop_prewarming_in_background():
+    prewarmer = make_prewarmer(OrderedDict([(u'first', {}), (u'second', {})]))
+    prewarmer.controller_plugin = ControllerPluginWithCache()
+    started = Event()
+    finish = Event()
+
+    def prewarm(template):
+        started.set()
+        finish.wait()
+        return 0
+
+    prewarmer.prewarm = prewarm
+    prewarmer.start()
+    # start returns while the first controller gets compiled
+    assert started.wait(10)
+    assert prewarmer.thread.is_alive()
+    Timer(0.1, finish.set).start()
+    prewarmer.stop()
+    assert prewarmer.thread is None
+    assert list(prewarmer.durations.keys()) == [u'first']
@@ -1,17 +1,24 @@
 import shutil
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from functools import partial
 from itertools import product
 
 import pybullet as p
 import pytest
 from geometry_msgs.msg import Pose, Point, Quaternion
 
+import giskardpy.identifier as identifier
 import giskardpy.pybullet_wrapper as pbw
 from giskardpy import logging
+from giskardpy.data_types import JointConstraint, SoftConstraint
+from giskardpy.exceptions import PlanningException
+from giskardpy.god_map import GodMap
+from giskardpy.planning_worker import PlanningWorker
 from giskardpy.pybullet_world import PyBulletWorld
 from giskardpy.pybullet_world_object import PyBulletWorldObject
 from giskardpy.robot import Robot
-from giskardpy.utils import make_world_body_box, make_world_body_sphere, make_world_body_cylinder
+from giskardpy.symengine_controller import InstantaneousController
+from giskardpy.utils import make_world_body_box, make_world_body_sphere, make_world_body_cylinder, KeyDefaultDict
 from giskardpy.world_object import WorldObject
 from utils_for_tests import pr2_urdf, base_bot_urdf, donbot_urdf
 
@@ -87,6 +94,40 @@ def assert_num_pybullet_objects(num):
     assert p.getNumBodies() == num, pbw.print_body_names()
 
 
+def move_box_in_worker(god_map):
+    box = god_map.get_data(identifier.world).get_object(u'box1')
+    num_bodies = p.getNumBodies()
+    pose = Pose()
+    pose.position = Point(1, 0, 0)
+    pose.orientation.w = 1
+    box.base_pose = pose
+    return num_bodies, p.getBasePositionAndOrientation(box.get_pybullet_id())[0]
+
+
+def fail_in_worker(god_map):
+    raise KeyError(u'muh')
+
+
+def compile_controller_in_worker(god_map, parent_god_map, path_to_functions):
+    """
+    Compiles a controller that moves joint_x to 2, like ControllerPlugin, which uses the god map of the parent process.
+    :return: command for joint_x
+    :rtype: float
+    """
+    robot = parent_god_map.get_data(identifier.robot)
+    robot.set_joint_position_symbols(
+        KeyDefaultDict(lambda joint_name: god_map.to_symbol(identifier.joint_states + [joint_name, u'position'])))
+    joint_x = robot.get_joint_position_symbol(u'joint_x')
+    joint_constraints = OrderedDict([(u'joint_x', JointConstraint(-0.25, 0.25, 0.01, 0))])
+    soft_constraints = OrderedDict([(u'goal', SoftConstraint(2 - joint_x, 2 - joint_x, 1, joint_x, True,
+                                                             -1e9, 1e9, 0))])
+    controller = InstantaneousController(robot, path_to_functions)
+    controller.update_constraints(OrderedDict([(u'joint_x', joint_x)]), soft_constraints, joint_constraints,
+                                  OrderedDict())
+    controller.compile()
+    return controller.get_cmd(god_map.get_values(controller.get_expr()))[0][u'joint_x']
+
+
 class TestPyBulletWorldObject(test_world.TestWorldObj):
     cls = PyBulletWorldObject
 
@@ -222,6 +263,47 @@ class TestPyBulletWorld(test_world.TestWorld):
         w = super(TestPyBulletWorld, self).test_attach_existing_obj_to_robot1(function_setup)
         assert_num_pybullet_objects(3)
 
+    def make_god_map_with_world(self):
+        world = self.make_world_with_robot(base_bot_urdf(), None)
+        world.add_object(PyBulletWorldObject.from_world_body(make_world_body_box(u'box1')))
+        world.add_object(PyBulletWorldObject.from_world_body(make_world_body_box(u'box2')))
+        god_map = GodMap()
+        god_map.set_data(identifier.world, world)
+        god_map.set_data(identifier.rosparam, {u'enable_gui': False})
+        return god_map
+
+    def test_planning_worker(self, function_setup):
+        god_map = self.make_god_map_with_world()
+        box = god_map.get_data(identifier.world).get_object(u'box1')
+        assert_num_pybullet_objects(5)
+        worker = PlanningWorker(god_map, move_box_in_worker)
+        worker.start()
+        num_bodies, position = worker.get_result(timeout=60)
+        # the worker reloaded the ground plane, hack, boxes and robot into its own client
+        assert num_bodies == 5
+        assert position == (1, 0, 0)
+        # the world and client of this process are unaffected
+        assert box.base_pose.position.x == 0
+        assert p.getBasePositionAndOrientation(box.get_pybullet_id())[0] == (0, 0, 0)
+        assert_num_pybullet_objects(5)
+
+    def test_planning_worker_compiles_controller(self, function_setup, tmpdir):
+        god_map = self.make_god_map_with_world()
+        worker = PlanningWorker(god_map, partial(compile_controller_in_worker,
+                                                 parent_god_map=god_map,
+                                                 path_to_functions=str(tmpdir) + u'/'))
+        worker.start()
+        # compiling logs, which uses rospy, and reads the god map of the parent, whose lock was held during the fork
+        assert abs(worker.get_result(timeout=120) - 0.25) < 1e-3
+        # the parent can still use its god map
+        assert god_map.get_data(identifier.robot) is not None
+
+    def test_planning_worker_failure(self, function_setup):
+        worker = PlanningWorker(self.make_god_map_with_world(), fail_in_worker)
+        worker.start()
+        with pytest.raises(PlanningException):
+            worker.get_result(timeout=60)
+
     def test_collision_goals_to_collision_matrix1(self, test_folder):
         world_with_donbot = self.make_world_with_donbot(test_folder)
         min_dist = defaultdict(lambda: {u'zero_weight_distance': 0.05})
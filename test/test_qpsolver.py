@@ -1,6 +1,7 @@
 import numpy as np
+import pytest
 
-from giskardpy.qp_solver import QPSolver
+from giskardpy.qp_solver import QPSolver, get_qp_solver
 
 
 def test_simple_problem():
@@ -16,6 +17,71 @@ def test_simple_problem():
     np.testing.assert_array_almost_equal(x, np.array([5, 5]), decimal=4)
 
 
+def test_diagonal_H():
+    A = np.ones((1, 2))
+    g = np.zeros(2)
+    lba = np.array([10.])
+    lb = np.array([-10., -10.])
+    ub = np.array([10., 10.])
+
+    qp = QPSolver()
+    x = qp.solve(np.ones(2), g, A, lb, ub, lba, lba)
+    np.testing.assert_array_almost_equal(x, np.array([5, 5]), decimal=4)
+    x = qp.solve(np.array([1., 4.]), g, A, lb, ub, lba, lba)
+    np.testing.assert_array_almost_equal(x, np.array([8, 2]), decimal=4)
+    assert qp.num_inits == 2
+
+
+def test_time_budget():
+    A = np.ones((1, 2))
+    g = np.zeros(2)
+    lba = np.array([10.])
+    lb = np.array([-10., -10.])
+    ub = np.array([10., 10.])
+
+    qp = QPSolver(time_budget=1.)
+    x = qp.solve(np.ones(2), g, A, lb, ub, lba, lba)
+    np.testing.assert_array_almost_equal(x, np.array([5, 5]), decimal=4)
+    qp.time_budget = 0
+    x_fallback = qp.solve(np.ones(2), g, A, lb, ub, lba, lba)
+    np.testing.assert_array_almost_equal(x_fallback, np.array([2.5, 2.5]), decimal=4)
+    # the solution of the previous solve is not changed
+    np.testing.assert_array_almost_equal(x, np.array([5, 5]), decimal=4)
+    assert qp.num_budget_hits == 1
+
+
+def make_active_set_problem():
+    """
+    :return: H, g, A, lb, ub, lbA, ubA of a qp problem that needs several working set recalculations
+    """
+    number_of_variables = 10
+    return (np.ones(number_of_variables), -10. * np.arange(number_of_variables), np.ones((1, number_of_variables)),
+            -np.ones(number_of_variables), np.ones(number_of_variables), np.array([-100.]), np.array([3.]))
+
+
+def test_time_budget_cold_start(monkeypatch):
+    from itertools import count
+    H, g, A, lb, ub, lbA, ubA = make_active_set_problem()
+    qp = QPSolver(time_budget=1.)
+    x = qp.solve(H, g, A, lb, ub, lbA, ubA).copy()
+    # another hessian type causes a cold start, the clock runs out during it
+    monkeypatch.setattr(u'giskardpy.qp_solver.time', lambda clock=count(0., 0.5): next(clock))
+    x_fallback = qp.solve(H * 2, g, A, lb, ub, lbA, ubA, nWSR=1)
+    assert qp.num_inits == 2
+    assert qp.num_budget_hits == 1
+    np.testing.assert_array_almost_equal(x_fallback, x * 0.5)
+
+
+def test_max_nWSR_with_time_budget():
+    from giskardpy.exceptions import MAX_NWSR_REACHEDException
+    H, g, A, lb, ub, lbA, ubA = make_active_set_problem()
+    qp = QPSolver(time_budget=10.)
+    # running out of working set recalculations with time left is not a budget hit
+    with pytest.raises(MAX_NWSR_REACHEDException):
+        qp.solve(H, g, A, lb, ub, lbA, ubA, nWSR=1)
+    assert qp.num_budget_hits == 0
+
+
 def test_simple_problem_split():
     cw1 = 10.
     cw2 = 1000.
@@ -101,3 +167,281 @@ def test_non_diagonal_H():
     print(x)
     print(qp.qpProblem.getObjVal())
     # np.testing.assert_array_almost_equal(x, np.array([5,5]), decimal=4)
+
+
+def test_simple_problem_osqp():
+    pytest.importorskip(u'osqp')
+    from scipy import sparse
+    H = np.ones(2) * 2
+    A = sparse.csc_matrix(np.ones((1, 2)))
+    g = np.zeros(2)
+    lba = np.array([10.])
+    lb = np.array([-10., -10.])
+    ub = np.array([10., 10.])
+
+    qp = get_qp_solver(u'osqp')
+    x = qp.solve(H, g, A, lb, ub, lba, lba)
+    np.testing.assert_array_almost_equal(x, np.array([5, 5]), decimal=4)
+
+
+def test_dense_and_sparse_agree():
+    pytest.importorskip(u'osqp')
+    from scipy import sparse
+    H = np.array([1., 1, 10, 1000])
+    A = np.array([[1., 1, 1, 0],
+                  [1, 1, 0, 1]])
+    g = np.zeros(4)
+    lba = np.array([10., 5.])
+    lb = np.array([-10., -10., -1e9, -1e9])
+    ub = np.array([10., 10., 1e9, 1e9])
+
+    x_dense = get_qp_solver(u'qpoases').solve(np.diag(H), g, A, lb, ub, lba, lba)
+    x_sparse = get_qp_solver(u'osqp').solve(H, g, sparse.csc_matrix(A), lb, ub, lba, lba)
+    np.testing.assert_array_almost_equal(x_dense, x_sparse, decimal=3)
+
+
+def make_qp_problem_builder(fixed_dimension, qp_solver=None, path_to_functions='', controller_cache=None):
+    from collections import OrderedDict
+    from giskardpy import cas_wrapper as w
+    from giskardpy.data_types import JointConstraint, SoftConstraint
+    from giskardpy.qp_problem_builder import QProblemBuilder
+    j1, j2 = w.Symbol(u'j1'), w.Symbol(u'j2')
+    joint_constraints = OrderedDict([(u'j1', JointConstraint(-1, 1, 0.01, 0)),
+                                     (u'j2', JointConstraint(-1, 1, 0.01, 0))])
+    soft_constraints = OrderedDict([(u's1', SoftConstraint(0.5, 0.5, w.Symbol(u'w1'), j1 + j2, False, -1e9, 1e9, 0)),
+                                    (u's2', SoftConstraint(0.2, 0.2, w.Symbol(u'w2'), j2, False, -1e9, 1e9, 0))])
+    return QProblemBuilder(joint_constraints, OrderedDict(), soft_constraints, [j1, j2],
+                           path_to_functions=path_to_functions, fixed_dimension=fixed_dimension,
+                           qp_solver=qp_solver, controller_cache=controller_cache)
+
+
+def test_fixed_dimension():
+    filtered = make_qp_problem_builder(False)
+    fixed = make_qp_problem_builder(True)
+    for w2 in [1., 0., 0., 1.]:
+        substitutions = [{u'j1': 0, u'j2': 0, u'w1': 1., u'w2': w2}[str(s)] for s in filtered.get_expr()]
+        expected = filtered.get_cmd(substitutions)[-1]
+        actual = fixed.get_cmd(substitutions)[-1]
+        np.testing.assert_array_almost_equal(actual, expected, decimal=4)
+    assert filtered.qp_solver.num_inits == 3
+    assert fixed.qp_solver.num_inits == 1
+    assert fixed.qp_solver.num_hotstarts == 3
+
+
+def test_reuse_qp_solver():
+    first_goal = make_qp_problem_builder(False)
+    substitutions = [{u'w1': 1., u'w2': 1.}[str(s)] for s in first_goal.get_expr()]
+    expected = first_goal.get_cmd(substitutions)[-1].copy()
+    assert first_goal.qp_solver.iterations > 0
+    qp_solver = first_goal.qp_solver
+    qp_solver.reset_statistics()
+    second_goal = make_qp_problem_builder(False, qp_solver)
+    actual = second_goal.get_cmd(substitutions)[-1]
+    np.testing.assert_array_almost_equal(actual, expected, decimal=4)
+    assert qp_solver.num_inits == 0
+    assert qp_solver.num_hotstarts == 1
+
+
+def test_controller_cache(tmpdir):
+    from giskardpy.controller_cache import ControllerCache
+    path = str(tmpdir.join(u'robot', u'hash'))
+    cache = ControllerCache()
+    compiled = make_qp_problem_builder(False, path_to_functions=path, controller_cache=cache)
+    loaded = make_qp_problem_builder(False, path_to_functions=path, controller_cache=cache)
+    assert cache.misses == 1
+    assert cache.hits == 1
+    assert loaded.get_expr() == compiled.get_expr()
+    np.testing.assert_array_equal(loaded.A_nonzeros, compiled.A_nonzeros)
+    for w2 in [1., 0.]:
+        substitutions = [{u'j1': 0, u'j2': 0, u'w1': 1., u'w2': w2}[str(s)] for s in compiled.get_expr()]
+        expected = compiled.get_cmd(substitutions)[-1].copy()
+        actual = loaded.get_cmd(substitutions)[-1]
+        np.testing.assert_array_almost_equal(actual, expected)
+
+
+def test_controller_cache_eviction(tmpdir):
+    from giskardpy.controller_cache import ControllerCache
+    cache = ControllerCache(max_size_in_mb=0)
+    path = str(tmpdir.join(u'hash'))
+    cache.save(path, {u'data': np.zeros(10)})
+    assert tmpdir.listdir() == []
+    assert cache.load(path) is None
+
+
+def test_controller_cache_code_version(tmpdir, monkeypatch):
+    from giskardpy import controller_cache
+    cache = controller_cache.ControllerCache()
+    path = str(tmpdir.join(u'hash'))
+    cache.save(path, {u'data': np.zeros(10)})
+    assert cache.load(path) is not None
+    # entries that were compiled by other code are ignored and deleted
+    monkeypatch.setattr(controller_cache.get_code_hash, u'code_hash', u'other')
+    assert cache.load(path) is None
+    cache.save(path, {u'data': np.ones(10)})
+    assert len(tmpdir.listdir()) == 1
+    np.testing.assert_array_equal(cache.load(path)[u'data'], np.ones(10))
+
+
+def test_compile_blocks():
+    from collections import OrderedDict
+    from giskardpy import cas_wrapper as w
+    from giskardpy.controller_blocks import BlockCache
+    from giskardpy.data_types import JointConstraint, SoftConstraint, HardConstraint
+    from giskardpy.qp_problem_builder import QProblemBuilder
+    joints = [w.Symbol(u'j{}'.format(i)) for i in range(4)]
+    weight = w.Symbol(u'weight')
+    joint_constraints = OrderedDict((u'j{}'.format(i), JointConstraint(w.Max(-0.1, -1 - joint), w.Min(0.1, 1 - joint),
+                                                                       weight, 0))
+                                    for i, joint in enumerate(joints))
+    hard_constraints = OrderedDict([(u'h', HardConstraint(-1 - joints[0], 1 - joints[0], joints[0] + joints[1]))])
+
+    def soft_constraints(prefix, number):
+        goal = w.Symbol(u'goal_{}'.format(prefix))
+        return OrderedDict((u'{}{}'.format(prefix, i),
+                            SoftConstraint(goal - joints[i], goal, weight, w.sin(joints[i]) * joints[i + 1], False,
+                                           -1e9, 1e9, 0.1)) for i in range(number))
+
+    blocks = OrderedDict([(u'a', [u'a0', u'a1']), (u'b', [u'b0', u'b1', u'b2'])])
+    block_cache = BlockCache()
+    for soft in [[(u'a', 2), (u'b', 3)], [(u'c', 1), (u'b', 3), (u'a', 2)]]:
+        soft_constraints_dict = OrderedDict()
+        for prefix, number in soft:
+            soft_constraints_dict.update(soft_constraints(prefix, number))
+        expected = QProblemBuilder(joint_constraints, hard_constraints, soft_constraints_dict, joints)
+        actual = QProblemBuilder(joint_constraints, hard_constraints, soft_constraints_dict, joints,
+                                 soft_constraint_blocks=blocks, block_cache=block_cache)
+        assert set(actual.get_expr()) == set(expected.get_expr())
+        values = {str_param: i / 10. for i, str_param in enumerate(expected.get_expr())}
+        np.testing.assert_array_almost_equal(actual.compiled_big_ass_M.call2([values[x] for x in actual.get_expr()]),
+                                             expected.compiled_big_ass_M.call2([values[x] for x in expected.get_expr()]))
+        assert set(zip(*actual.A_nonzeros)) == set(zip(*expected.A_nonzeros))
+    # the joint constraints and the blocks a and b are reused
+    assert block_cache.hits == 3
+    assert block_cache.misses == 4
+
+
+def test_complexity_report():
+    from collections import OrderedDict
+    from giskardpy import cas_wrapper as w
+    from giskardpy.complexity_report import ComplexityReport
+    from giskardpy.controller_blocks import BlockCache
+    from giskardpy.data_types import JointConstraint, SoftConstraint
+    from giskardpy.qp_problem_builder import QProblemBuilder
+    joints = [w.Symbol(u'j{}'.format(i)) for i in range(3)]
+    joint_constraints = OrderedDict((u'j{}'.format(i), JointConstraint(-1, 1, 0.01, 0)) for i in range(3))
+    soft_constraints = OrderedDict([(u'simple', SoftConstraint(0.5, 0.5, 1, joints[0], False, -1e9, 1e9, 0)),
+                                    (u'complex', SoftConstraint(0.5, 0.5, 1, w.sin(joints[1]) * w.cos(joints[2]),
+                                                                False, -1e9, 1e9, 0))])
+    report = ComplexityReport()
+    report.add_goal(u'goal_a', u'A', [u'simple'], 0.)
+    report.add_goal(u'goal_b', u'B', [u'complex'], 0.)
+    QProblemBuilder(joint_constraints, OrderedDict(), soft_constraints, joints,
+                    soft_constraint_blocks=OrderedDict([(u'goal_a', [u'simple']), (u'goal_b', [u'complex'])]),
+                    block_cache=BlockCache(), complexity_report=report)
+    constraints = {c.name: c for c in report.constraints}
+    assert constraints[u'complex'].goal == u'goal_b'
+    assert constraints[u'complex'].nodes > constraints[u'simple'].nodes
+    assert constraints[u'simple'].jacobian_nonzeros == 1
+    assert constraints[u'complex'].jacobian_nonzeros == 2
+    assert report.get_goal_table()[0][0] == u'goal_b'
+    assert set(block.name for block in report.blocks) == {u'goal_a', u'goal_b',
+                                                          ComplexityReport.joint_and_hard_constraints}
+    assert u'goal_b' in report.to_table()
+
+
+def test_qp_recorder(tmpdir):
+    from giskardpy.qp_recorder import QPRecorder, load_recording, filter_recorded_problem
+    path = str(tmpdir.join(u'recording'))
+    recorder = QPRecorder(path, [u'j1', u'j2'], [u'j1', u'j2', u's1'], [u's1'], chunk_size=2)
+    A = np.array([[1., 1., 1.]])
+    lb = np.array([-10., -10., -1e9])
+    ub = np.array([10., 10., 1e9])
+    lbA = np.array([10.])
+    g = np.zeros(3)
+    bA_mask = np.array([True])
+    weights = [np.array([1., 1., 1.]), np.array([1., 4., 1.]), np.array([1., 1., 0.])]
+    qp = QPSolver()
+    solutions = []
+    for i, H in enumerate(weights):
+        b_mask = H != 0
+        # the recorder gets the filtered solution, like QProblemBuilder
+        xdot_full = qp.solve(H[b_mask], g[b_mask], A[bA_mask][:, b_mask], lb[b_mask], ub[b_mask], lbA, lbA)
+        solutions.append(xdot_full)
+        recorder.record([i, 0.], H, A, lb, ub, lbA, lbA, g, b_mask, bA_mask, xdot_full)
+    # the first chunk got written when it was full, close writes the rest
+    assert recorder.number_of_chunks == 1
+    recorder.close()
+    assert recorder.number_of_chunks == 2
+    assert recorder.number_of_cycles == 3
+
+    meta, cycles = load_recording(path)
+    assert list(meta[u'b_names']) == [u'j1', u'j2', u's1']
+    assert list(meta[u'bA_names']) == [u's1']
+    cycles = list(cycles)
+    assert len(cycles) == 3
+    for i, (cycle, H, xdot_full) in enumerate(zip(cycles, weights, solutions)):
+        np.testing.assert_array_equal(cycle[u'substitutions'], [i, 0.])
+        np.testing.assert_array_equal(cycle[u'H'], H)
+        problem = filter_recorded_problem(cycle)
+        # the filtered constraints are 0 in the recording, but not in the replayed problem
+        assert len(problem[0]) == np.count_nonzero(H)
+        np.testing.assert_array_equal(cycle[u'xdot_full'][cycle[u'b_mask']], xdot_full)
+        np.testing.assert_array_almost_equal(QPSolver().solve(*problem), xdot_full, decimal=4)
+    assert cycles[2][u'xdot_full'][2] == 0
+
+
+def test_compile_blocks_with_hard_and_soft_velocity_limit():
+    from collections import OrderedDict
+    import giskardpy.identifier as identifier
+    from giskardpy.constraints import CartesianVelocityLimit
+    from giskardpy.controller_blocks import BlockCache
+    from giskardpy.data_types import JointConstraint
+    from giskardpy.god_map import GodMap
+    from giskardpy.qp_problem_builder import QProblemBuilder
+    from giskardpy.robot import Robot
+    from giskardpy.utils import KeyDefaultDict
+    from utils_for_tests import base_bot_urdf
+    god_map = GodMap()
+    robot = Robot(base_bot_urdf())
+    robot.set_joint_position_symbols(
+        KeyDefaultDict(lambda joint_name: god_map.to_symbol(identifier.joint_states + [joint_name, u'position'])))
+    god_map.set_data(identifier.world, {u'robot': robot})
+    god_map.set_data(identifier.constraints_identifier, {})
+    joints = [robot.get_joint_position_symbol(x) for x in [u'joint_x', u'joint_y', u'rot_z']]
+    joint_constraints = OrderedDict((str(joint), JointConstraint(-1, 1, 0.01, 0)) for joint in joints)
+    block_cache = BlockCache()
+    for hard in [True, False, True]:
+        # the soft constraints have the same names, but other slack limits
+        soft_constraints = CartesianVelocityLimit(god_map, u'root_link', u'eef', hard=hard).get_constraints()
+        blocks = OrderedDict([(u'limit', list(soft_constraints.keys()))])
+        expected = QProblemBuilder(joint_constraints, OrderedDict(), soft_constraints, joints)
+        actual = QProblemBuilder(joint_constraints, OrderedDict(), soft_constraints, joints,
+                                 soft_constraint_blocks=blocks, block_cache=block_cache)
+        values = {str_param: 0.1 + i / 10. for i, str_param in enumerate(expected.get_expr())}
+        M = actual.compiled_big_ass_M.call2([values[x] for x in actual.get_expr()])
+        np.testing.assert_array_almost_equal(M,
+                                             expected.compiled_big_ass_M.call2([values[x] for x in expected.get_expr()]))
+        ub = actual.split_big_ass_M(M)[3]
+        assert np.all(ub[-len(soft_constraints):] == (0 if hard else 1e9))
+    # the joint constraints and the hard limit are reused
+    assert block_cache.hits == 3
+    assert block_cache.misses == 3
+
+
+def test_inplace_filter_matches_allocating_filter():
+    builder = make_qp_problem_builder(False)
+    qp_solver = get_qp_solver(u'qpoases')
+    previous = None
+    for j1, w2 in [(0.1, 1.), (0.2, 0.), (0.3, 0.), (0.4, 1.)]:
+        substitutions = [{u'j1': j1, u'j2': -0.2, u'w1': 1., u'w2': w2}[str(s)] for s in builder.get_expr()]
+        result = builder.get_cmd(substitutions)
+        H, A, lb, ub, lbA, ubA, g = builder.filter_zero_weight_constraints(builder.np_H, builder.np_A, builder.np_lb,
+                                                                           builder.np_ub, builder.np_lbA,
+                                                                           builder.np_ubA, builder.np_g)
+        for actual, expected in zip(builder.filter_zero_weight_constraints_inplace(), (H, A, lb, ub, lbA, ubA, g)):
+            np.testing.assert_array_equal(actual, expected)
+        np.testing.assert_array_almost_equal(result[-1], qp_solver.solve(H, g, A, lb, ub, lbA, ubA), decimal=4)
+        if previous is not None:
+            # the arrays of the previous call are views on the same buffers
+            assert np.shares_memory(previous[1], result[1])
+        previous = result
@@ -12,6 +12,7 @@ import PyKDL
 import pytest
 from urdf_parser_py.urdf import URDF
 
+from giskardpy import cas_wrapper as w
 from giskardpy.robot import Robot
 from utils_for_tests import rnd_joint_state, pr2_urdf, donbot_urdf, boxy_urdf, base_bot_urdf, compare_poses
 from giskardpy.urdf_object import hacky_urdf_parser_fix
@@ -214,6 +215,55 @@ class TestSymengineController(object):
             symengine_fk = parsed_boxy.get_fk_pose(root, tip).pose
             compare_poses(kdl_fk, symengine_fk)
 
+    @given(rnd_joint_state(pr2_joint_limits))
+    def test_pr2_all_fks(self, parsed_pr2, js):
+        """
+        :type parsed_pr2: Robot
+        """
+        parsed_pr2.joint_state = {joint_name: SingleJointState(joint_name, position)
+                                  for joint_name, position in js.items()}
+        pairs = [(u'odom_combined', u'r_gripper_tool_frame'),
+                 (u'base_link', u'l_gripper_tool_frame'),
+                 (u'l_gripper_tool_frame', u'r_gripper_tool_frame'),
+                 (u'r_forearm_link', u'torso_lift_link')]
+        for root, tip in pairs:
+            expected = parsed_pr2._fks[root, tip](**parsed_pr2.get_joint_state_positions())
+            np.testing.assert_array_almost_equal(parsed_pr2.get_fk_np(root, tip), expected)
+
+    @given(rnd_joint_state(pr2_joint_limits))
+    def test_pr2_fk_expression(self, parsed_pr2, js):
+        """
+        Compares the composed fk expressions with the product of the joint frames along the chain.
+        :type parsed_pr2: Robot
+        """
+        pairs = [(u'base_link', u'base_link'),
+                 (u'odom_combined', u'r_gripper_tool_frame'),
+                 (u'r_gripper_tool_frame', u'torso_lift_link'),
+                 (u'r_gripper_tool_frame', u'odom_combined'),
+                 (u'l_gripper_tool_frame', u'r_gripper_tool_frame'),
+                 (u'r_forearm_link', u'head_mount_kinect_rgb_optical_frame')]
+        joint_names = list(js.keys())
+        symbols = [parsed_pr2.get_joint_position_symbol(joint_name) for joint_name in joint_names]
+        values = [js[joint_name] for joint_name in joint_names]
+        for root, tip in pairs:
+            expected = w.eye(4)
+            root_chain, _, tip_chain = parsed_pr2.get_split_chain(root, tip, links=False)
+            for joint_name in root_chain:
+                expected = w.dot(expected, w.inverse_frame(parsed_pr2.get_joint_frame(joint_name)))
+            for joint_name in tip_chain:
+                expected = w.dot(expected, parsed_pr2.get_joint_frame(joint_name))
+            actual = parsed_pr2.get_fk_expression(root, tip)
+            np.testing.assert_array_almost_equal(w.speed_up(actual, symbols).call2(values),
+                                                 w.speed_up(expected, symbols).call2(values))
+            # changing the returned matrix doesn't change the cache
+            actual[0, 3] = 23
+            np.testing.assert_array_almost_equal(
+                w.speed_up(parsed_pr2.get_fk_expression(root, tip), symbols).call2(values),
+                w.speed_up(expected, symbols).call2(values))
+        np.testing.assert_array_equal(w.speed_up(parsed_pr2.get_fk_expression(u'base_link', u'base_link'),
+                                                 symbols).call2(values),
+                                      np.eye(4))
+
 
     def test_get_controllable_joint_names_pr2(self, parsed_pr2):
         expected = {u'l_shoulder_pan_joint', u'br_caster_l_wheel_joint', u'r_gripper_l_finger_tip_joint',
@@ -0,0 +1,99 @@
+import giskardpy
+
+giskardpy.WORLD_IMPLEMENTATION = None
+
+from collections import OrderedDict
+
+import numpy as np
+
+import giskardpy.identifier as identifier
+from giskardpy import cas_wrapper as w
+from giskardpy.controller_cache import ControllerCache
+from giskardpy.data_types import JointConstraint, SoftConstraint, SingleJointState
+from giskardpy.god_map import GodMap
+from giskardpy.robot import Robot
+from giskardpy.symengine_controller import InstantaneousController
+from giskardpy.utils import KeyDefaultDict
+from utils_for_tests import base_bot_urdf
+
+
+def make_god_map_and_robot():
+    """
+    :return: a god map with the joint states of the base bot, whose joints are at 0
+    :rtype: tuple
+    """
+    god_map = GodMap()
+    robot = Robot(base_bot_urdf())
+    robot.set_joint_position_symbols(
+        KeyDefaultDict(lambda joint_name: god_map.to_symbol(identifier.joint_states + [joint_name, u'position'])))
+    joint_states = {joint_name: SingleJointState(joint_name, 0., 0.) for joint_name in robot.get_movable_joints()}
+    god_map.set_data(identifier.world, {u'robot': {u'joint_state': joint_states}})
+    god_map.set_data(identifier.rosparam, {u'general_options': {u'sample_period': 0.5}})
+    return god_map, robot
+
+
+def make_controller(god_map, robot, path_to_functions, controller_cache, velocity_limit, slack_limit=1e9):
+    """
+    :param velocity_limit: of the joint constraints, the reachability check uses other limits than normal goals
+    :type velocity_limit: float
+    :param slack_limit: of the soft constraint, like the constant ones of CartesianVelocityLimit
+    :type slack_limit: float
+    :return: a compiled controller that moves joint_x to 2
+    :rtype: InstantaneousController
+    """
+    sample_period = god_map.to_symbol(identifier.sample_period)
+    joint_to_symbols_str = OrderedDict((x, robot.get_joint_position_symbol(x)) for x in [u'joint_x', u'joint_y'])
+    joint_constraints = OrderedDict(((robot.get_name(), joint_name),
+                                     JointConstraint(w.Max(-velocity_limit * sample_period, -3 - symbol),
+                                                     w.Min(velocity_limit * sample_period, 3 - symbol),
+                                                     0.01, 0))
+                                    for joint_name, symbol in joint_to_symbols_str.items())
+    joint_x = robot.get_joint_position_symbol(u'joint_x')
+    soft_constraints = OrderedDict([(u'goal', SoftConstraint(2 - joint_x, 2 - joint_x, 1, joint_x, True,
+                                                             -slack_limit, slack_limit, 0))])
+    controller = InstantaneousController(robot, path_to_functions, controller_cache=controller_cache)
+    controller.update_constraints(joint_to_symbols_str, soft_constraints, joint_constraints, OrderedDict())
+    controller.compile()
+    return controller
+
+
+def get_joint_x_cmd(god_map, controller):
+    return controller.get_cmd(god_map.get_values(controller.get_expr()))[0][u'joint_x']
+
+
+def test_on_disk_cache_with_reachability_check(tmpdir):
+    god_map, robot = make_god_map_and_robot()
+    path = str(tmpdir) + u'/'
+    cache = ControllerCache()
+    # the joint constraints of the reachability check have the same names, but other velocity limits
+    reachability_check = make_controller(god_map, robot, path, cache, 1.)
+    normal = make_controller(god_map, robot, path, cache, 0.5)
+    assert reachability_check.get_constraint_signature() != normal.get_constraint_signature()
+    assert cache.misses == 2
+    assert cache.hits == 0
+    assert abs(get_joint_x_cmd(god_map, reachability_check) - 0.5) < 1e-3
+    assert abs(get_joint_x_cmd(god_map, normal) - 0.25) < 1e-3
+    loaded = make_controller(god_map, robot, path, cache, 0.5)
+    assert loaded.get_constraint_signature() == normal.get_constraint_signature()
+    assert cache.hits == 1
+    assert abs(get_joint_x_cmd(god_map, loaded) - 0.25) < 1e-3
+
+
+def test_on_disk_cache_with_slack_limits(tmpdir):
+    god_map, robot = make_god_map_and_robot()
+    path = str(tmpdir) + u'/'
+    cache = ControllerCache()
+    # the soft constraints have the same names, but other constant slack limits
+    unlimited = make_controller(god_map, robot, path, cache, 0.5)
+    limited = make_controller(god_map, robot, path, cache, 0.5, slack_limit=2)
+    assert unlimited.get_constraint_signature() != limited.get_constraint_signature()
+    assert cache.misses == 2
+    assert cache.hits == 0
+    loaded = make_controller(god_map, robot, path, cache, 0.5, slack_limit=2)
+    assert cache.hits == 1
+    assert loaded.get_constraint_signature() == limited.get_constraint_signature()
+    for controller in [unlimited, limited, loaded]:
+        get_joint_x_cmd(god_map, controller)
+    assert unlimited.qp_problem_builder.np_ub[-1] == 1e9
+    assert limited.qp_problem_builder.np_ub[-1] == 2
+    assert loaded.qp_problem_builder.np_ub[-1] == 2
@@ -0,0 +1,83 @@
+import numpy as np
+
+import giskardpy.timing as timing
+from giskardpy.timing import StageTimer
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.t = 0.
+
+    def __call__(self):
+        return self.t
+
+
+def run_cycle(stage_timer, clock, durations):
+    """
+    :param durations: (stage, time in s) in the order in which the stages are executed
+    :type durations: list
+    """
+    stage_timer.start()
+    for stage, duration in durations:
+        clock.t += duration
+        stage_timer.stage_done(stage)
+    stage_timer.stop()
+
+
+def make_stage_timer(monkeypatch, size):
+    clock = FakeClock()
+    monkeypatch.setattr(timing, u'time', clock)
+    return StageTimer([u'a', u'b'], size=size), clock
+
+
+def test_percentiles(monkeypatch):
+    stage_timer, clock = make_stage_timer(monkeypatch, 10)
+    assert stage_timer.get_percentiles() == {}
+    for i in range(1, 6):
+        run_cycle(stage_timer, clock, [(u'a', i * 0.001), (u'b', 0.002)])
+    percentiles = stage_timer.get_percentiles((0, 50, 100))
+    assert list(percentiles.keys()) == [u'a', u'b', u'total']
+    np.testing.assert_array_almost_equal(percentiles[u'a'], [0.001, 0.003, 0.005])
+    np.testing.assert_array_almost_equal(percentiles[u'b'], [0.002, 0.002, 0.002])
+    np.testing.assert_array_almost_equal(percentiles[u'total'], [0.003, 0.005, 0.007])
+
+
+def test_stage_done_twice(monkeypatch):
+    stage_timer, clock = make_stage_timer(monkeypatch, 10)
+    run_cycle(stage_timer, clock, [(u'a', 0.001), (u'b', 0.002), (u'a', 0.004)])
+    percentiles = stage_timer.get_percentiles((100,))
+    np.testing.assert_array_almost_equal(percentiles[u'a'], [0.005])
+    np.testing.assert_array_almost_equal(percentiles[u'total'], [0.007])
+
+
+def test_wraparound(monkeypatch):
+    stage_timer, clock = make_stage_timer(monkeypatch, 3)
+    for i in range(1, 6):
+        run_cycle(stage_timer, clock, [(u'a', i * 0.001), (u'b', 0.)])
+    assert stage_timer.count == 5
+    # only the last 3 cycles are kept
+    percentiles = stage_timer.get_percentiles((0, 100))
+    np.testing.assert_array_almost_equal(percentiles[u'a'], [0.003, 0.005])
+    assert stage_timer.summary().startswith(u'timing of the last 3 cycles')
+
+
+def test_reset(monkeypatch):
+    stage_timer, clock = make_stage_timer(monkeypatch, 3)
+    for i in range(1, 5):
+        run_cycle(stage_timer, clock, [(u'a', 0.1), (u'b', 0.1)])
+    stage_timer.reset()
+    assert stage_timer.get_percentiles() == {}
+    run_cycle(stage_timer, clock, [(u'a', 0.001), (u'b', 0.002)])
+    percentiles = stage_timer.get_percentiles((0, 100))
+    np.testing.assert_array_almost_equal(percentiles[u'a'], [0.001, 0.001])
+    np.testing.assert_array_almost_equal(percentiles[u'total'], [0.003, 0.003])
+
+
+def test_summary(monkeypatch):
+    stage_timer, clock = make_stage_timer(monkeypatch, 10)
+    run_cycle(stage_timer, clock, [(u'a', 0.001), (u'b', 0.0025)])
+    run_cycle(stage_timer, clock, [(u'a', 0.001), (u'b', 0.0025)])
+    assert stage_timer.summary((50, 100)) == u'\n'.join([u'timing of the last 2 cycles in ms (percentiles 50/100):',
+                                                         u'             a: 1.000 / 1.000',
+                                                         u'             b: 2.500 / 2.500',
+                                                         u'         total: 3.500 / 3.500'])
@@ -10,6 +10,7 @@ import pytest
 from geometry_msgs.msg import Pose, Point, Quaternion
 from giskard_msgs.msg import CollisionEntry
 import test_urdf_object
+from giskardpy.data_types import JointStates, SingleJointState
 from giskardpy.exceptions import DuplicateNameException, PhysicsWorldException, UnknownBodyException
 from utils_for_tests import pr2_urdf, donbot_urdf, compare_poses, pr2_without_base_urdf
 from giskardpy.utils import make_world_body_box
@@ -147,6 +148,15 @@ class TestWorldObj(test_urdf_object.TestUrdfObject):
         parsed_pr2.joint_state = js
         assert parsed_pr2.joint_state == js
 
+    def test_joint_state_merge(self, function_setup):
+        parsed_pr2 = self.cls(pr2_urdf())
+        js = JointStates.from_dict(parsed_pr2.get_zero_joint_state())
+        parsed_pr2.joint_state = js
+        parsed_pr2.joint_state = {u'new_joint': SingleJointState(u'new_joint', 1.0)}
+        js.position[:] = 2.0
+        assert parsed_pr2.joint_state[u'torso_lift_joint'].position == 0
+        assert parsed_pr2.joint_state[u'new_joint'].position == 1.0
+
     def test_controlled_joints(self, function_setup):
         controlled_joints = [u'torso_lift_joint']
         wo = self.cls(pr2_urdf(), controlled_joints=controlled_joints)